@@ -0,0 +1,219 @@
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import asyncio
+import json
+import time
+import zipfile
+
+from content_parser import Section, candidate_keywords, iter_sections
+
+# Files of a zip archive that are imported as chapters
+DOCUMENT_SUFFIXES = (".md", ".markdown", ".txt")
+# Subject of zip entries that are not inside a folder
+DEFAULT_SUBJECT = "general"
+# Failures listed in the report; the rest are only counted
+MAX_REPORTED_FAILURES = 100
+# Largest uncompressed zip member that is read, so one archive cannot exhaust a worker's memory
+MAX_FILE_SIZE = 16 * 1024 * 1024
+
+
+class ImportItem(NamedTuple):
+    name: str  # line number or archive path, for the report
+    document: Any
+    error: Optional[str] = None  # why the item could not be read
+
+
+class ParsedDocument(NamedTuple):
+    name: str
+    document: Dict[str, Any]
+    sections: List[Tuple[Section, List[str]]]  # each section with its candidate keywords
+
+
+def is_zip(path: Path) -> bool:
+    return zipfile.is_zipfile(path)
+
+
+def count_items(path: Path) -> int:
+    """Number of items read_items will yield, counted without parsing them"""
+    if is_zip(path):
+        with zipfile.ZipFile(path) as archive:
+            return sum(1 for info in archive.infolist() if _is_document(info))
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _is_document(info: zipfile.ZipInfo) -> bool:
+    return not info.is_dir() and info.filename.lower().endswith(DOCUMENT_SUFFIXES) \
+        and not Path(info.filename).name.startswith(".")
+
+
+def read_items(path: Path, max_file_size: int = MAX_FILE_SIZE) -> Iterator[ImportItem]:
+    """Yield the documents of an NDJSON file or zip archive one at a time.
+
+    NDJSON lines are objects with title, subject, content and an optional
+    description. In a zip archive every .md/.markdown/.txt file is one
+    chapter, titled after the file name, with the folder it sits in as
+    its subject. A line that is not valid JSON, or a file that unpacks to
+    more than `max_file_size` bytes, is yielded with its error, so it is
+    reported like any other failure.
+    """
+    if is_zip(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not _is_document(info):
+                    continue
+                # zipfile stops decompressing at file_size, so a forged header cannot inflate past it
+                if info.file_size > max_file_size:
+                    yield ImportItem(info.filename, None, f"File is larger than {max_file_size} bytes uncompressed")
+                    continue
+                entry = Path(info.filename)
+                yield ImportItem(info.filename, {
+                    "title": entry.stem.replace("_", " ").replace("-", " ").strip() or entry.stem,
+                    "subject": entry.parent.name or DEFAULT_SUBJECT,
+                    "content": archive.read(info).decode("utf-8-sig", errors="replace")
+                })
+        return
+
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                document = json.loads(line)
+            except ValueError as e:
+                yield ImportItem(f"line {number}", None, f"Invalid JSON: {str(e)}")
+            else:
+                yield ImportItem(f"line {number}", document)
+
+
+def parse_item(item: ImportItem) -> ParsedDocument:
+    """Validate and scan one document (runs in a worker process)"""
+    if item.error:
+        raise ValueError(item.error)
+    document = item.document
+    if not isinstance(document, dict):
+        raise ValueError("Expected a JSON object")
+    for field in ("title", "subject", "content"):
+        if not isinstance(document.get(field), str) or not document[field].strip():
+            raise ValueError(f"Missing {field}")
+    if document.get("description") is not None and not isinstance(document["description"], str):
+        raise ValueError("description must be a string")
+
+    sections = [(section, candidate_keywords(section.content)) for section in iter_sections(document["content"])]
+    return ParsedDocument(item.name, document, sections)
+
+
+class ImportReport:
+    """Counters of a bulk import, with per-item failures"""
+
+    def __init__(self, total: int = 0):
+        self.total = total
+        self.imported = 0
+        self.failed = 0
+        self.failures: List[Dict[str, str]] = []
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    def fail(self, name: str, error: Exception):
+        self.failed += 1
+        if len(self.failures) < MAX_REPORTED_FAILURES:
+            self.failures.append({"item": name, "error": str(error)})
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            "total": self.total,
+            "imported": self.imported,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 3),
+            "chapters_per_second": round(self.imported / elapsed, 2) if elapsed > 0 else 0.0,
+            "failures": self.failures
+        }
+
+
+async def run_import(items: Iterator[ImportItem], executor: Executor,
+                     build: Callable[[ParsedDocument], Any],
+                     save: Callable[[List[Any]], Awaitable[None]],
+                     report: ImportReport, batch_size: int = 50, max_pending: int = 16,
+                     on_item: Optional[Callable[[bool], None]] = None) -> ImportReport:
+    """Parse `items` on `executor` and save them in batches.
+
+    At most `max_pending` documents are being parsed and at most one batch
+    is waiting to be saved, so memory stays bounded however large the input
+    is. Items are read (zip decompression, file I/O) and built in worker
+    threads so the event loop keeps serving requests. `build` turns a
+    parsed document into whatever `save` writes; if a batch fails to save,
+    its items are saved one by one so a single bad document only fails
+    itself.
+    """
+    loop = asyncio.get_running_loop()
+    items = iter(items)
+    pending: "set[asyncio.Future]" = set()
+    names: Dict[asyncio.Future, str] = {}
+    batch: List[Tuple[str, Any]] = []
+
+    def finish(name: str, error: Optional[Exception] = None):
+        if error is None:
+            report.imported += 1
+        else:
+            report.fail(name, error)
+        if on_item:
+            on_item(error is None)
+
+    async def flush():
+        saving = batch[:]
+        batch.clear()
+        if not saving:
+            return
+        try:
+            await save([built for _, built in saving])
+        except Exception:
+            for name, built in saving:
+                try:
+                    await save([built])
+                except Exception as e:
+                    finish(name, e)
+                else:
+                    finish(name)
+        else:
+            for name, _ in saving:
+                finish(name)
+
+    async def collect(wait_for_all: bool):
+        nonlocal pending
+        if not pending:
+            return
+        done, pending = await asyncio.wait(
+            pending, return_when=asyncio.ALL_COMPLETED if wait_for_all else asyncio.FIRST_COMPLETED
+        )
+        for future in done:
+            name = names.pop(future)
+            try:
+                batch.append((name, await asyncio.to_thread(build, future.result())))
+            except Exception as e:
+                finish(name, e)
+            if len(batch) >= batch_size:
+                await flush()
+
+    try:
+        while True:
+            item = await asyncio.to_thread(next, items, None)
+            if item is None:
+                break
+            future = loop.run_in_executor(executor, parse_item, item)
+            names[future] = item.name
+            pending.add(future)
+            if len(pending) >= max_pending:
+                await collect(wait_for_all=False)
+        await collect(wait_for_all=True)
+        await flush()
+    finally:
+        for future in pending:
+            future.cancel()
+        close = getattr(items, "close", None)
+        if close:
+            # Releases the archive or file read_items holds open
+            close()
+        report.finished = time.monotonic()
+    return report
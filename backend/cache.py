@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import time
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded LRU mapping with optional per-entry TTL and hit/miss/eviction counters"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING:
+            value, expires_at = entry
+            if expires_at is None or expires_at > self.clock():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (value, self.clock() + ttl if ttl is not None else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key, _MISSING)
+        return entry is not _MISSING and (entry[1] is None or entry[1] > self.clock())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight call.
+
+    The shared call runs as its own task, so a caller that is cancelled does
+    not cancel the work other callers are waiting on.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    def _finished(self, key: Hashable, future: asyncio.Future):
+        self._calls.pop(key, None)
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not future.cancelled():
+            future.exception()
+
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,119 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from cache import LRUCache
+from shared_cache import SharedCache
+
+ChapterLoader = Callable[[str], Awaitable[Optional[Dict[str, Any]]]]
+ChapterTreeLoader = Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]
+
+KEY_PREFIX = "chapter:"
+
+
+class ChapterCache:
+    """Read-through cache of assembled chapter documents keyed by chapter id.
+
+    Lookups go to the in-process LRU first, then to the optional shared tier
+    used by all workers, and only then to the loader. Write handlers call
+    invalidate() for the chapter they touched; other workers drop their copy
+    when the shared tier broadcasts the invalidation. A load that was already
+    running when its chapter was invalidated returns its result to the
+    caller but does not store it, so a read racing a write can never put the
+    pre-write document back. Cached documents are shared between requests
+    and must not be mutated.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = 300.0, shared: Optional[SharedCache] = None):
+        self.docs = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.shared = shared
+        self.invalidations = 0
+        self._epoch = 0
+        self._loads_in_flight = 0
+        # Epoch at which each id was last invalidated, kept only while loads are running
+        self._invalidated: Dict[str, int] = {}
+        if shared is not None:
+            shared.subscribe(self._on_shared_invalidation)
+
+    def _drop(self, chapter_id: str):
+        self.docs.pop(chapter_id)
+        self._epoch += 1
+        if self._loads_in_flight:
+            self._invalidated[chapter_id] = self._epoch
+
+    def _on_shared_invalidation(self, key: str):
+        if key.startswith(KEY_PREFIX):
+            self._drop(key[len(KEY_PREFIX):])
+
+    async def invalidate(self, chapter_id: str):
+        self.invalidations += 1
+        self._drop(chapter_id)
+        if self.shared is not None:
+            await self.shared.invalidate([KEY_PREFIX + chapter_id])
+            # A local read may have picked up the shared copy before it was deleted
+            self._drop(chapter_id)
+
+    def _begin(self) -> int:
+        self._loads_in_flight += 1
+        return self._epoch
+
+    def _end(self):
+        self._loads_in_flight -= 1
+        if not self._loads_in_flight:
+            self._invalidated.clear()
+
+    def _store(self, doc: Dict[str, Any], started: int):
+        if self._invalidated.get(doc["id"], -1) <= started:
+            self.docs.set(doc["id"], doc)
+
+    async def get(self, chapter_id: str, load: ChapterLoader) -> Optional[Dict[str, Any]]:
+        """Return the chapter document, calling `load(chapter_id)` on a miss"""
+        doc = self.docs.get(chapter_id)
+        if doc is not None:
+            return doc
+
+        async def load_one(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            doc = await load(chapter_id)
+            return [doc] if doc is not None else []
+
+        docs = await self._load([{"id": chapter_id}], load_one)
+        return docs.get(chapter_id)
+
+    async def get_many(self, chapter_rows: List[Dict[str, Any]], load: ChapterTreeLoader) -> List[Dict[str, Any]]:
+        """Return documents for `chapter_rows` in order, loading only the uncached ones in one batch"""
+        docs = {row["id"]: self.docs.get(row["id"]) for row in chapter_rows}
+        missing = [row for row in chapter_rows if docs[row["id"]] is None]
+
+        if missing:
+            docs.update(await self._load(missing, load))
+
+        return [docs[row["id"]] for row in chapter_rows]
+
+    async def _load(self, rows: List[Dict[str, Any]], load: ChapterTreeLoader) -> Dict[str, Dict[str, Any]]:
+        started = self._begin()
+        try:
+            docs: Dict[str, Dict[str, Any]] = {}
+            position = None
+            if self.shared is not None:
+                found, position = await self.shared.lookup([KEY_PREFIX + row["id"] for row in rows])
+                docs = {key[len(KEY_PREFIX):]: doc for key, doc in found.items()}
+                for doc in docs.values():
+                    self._store(doc, started)
+                rows = [row for row in rows if row["id"] not in docs]
+
+            if rows:
+                loaded = {doc["id"]: doc for doc in await load(rows)}
+                for doc in loaded.values():
+                    self._store(doc, started)
+                if self.shared is not None and loaded:
+                    await self.shared.store(
+                        {KEY_PREFIX + chapter_id: doc for chapter_id, doc in loaded.items()},
+                        ttl=self.ttl,
+                        since=position
+                    )
+                docs.update(loaded)
+            return docs
+        finally:
+            self._end()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.docs.stats(), "invalidations": self.invalidations}
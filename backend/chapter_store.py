@@ -0,0 +1,295 @@
+from datetime import datetime
+from typing import List, Dict, Any, AsyncIterator, Iterable, Optional, Tuple
+import asyncio
+import base64
+import json
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# PostgREST puts in.(...) filters in the query string, so very long id lists
+# are split into chunks to stay well under proxy URL limits (~36 chars per uuid).
+IN_CHUNK_SIZE = 200
+# Chunked lookups for one table are issued concurrently, at most this many at a time
+MAX_PARALLEL_CHUNKS = 4
+# Rows per bulk insert request, keeps request bodies at a few hundred KB
+INSERT_CHUNK_SIZE = 500
+
+# Server-side function from CREATE_TABLES_SQL that writes a chapter tree in one transaction
+CHAPTER_TREE_RPC = "create_chapter_tree"
+_chapter_tree_rpc_available = True
+
+# Rows per page when scanning a whole table
+SCAN_PAGE_SIZE = 1000
+
+# Columns of the chapters table that list projections may ask for
+CHAPTER_COLUMNS = ("id", "title", "subject", "description", "favorite", "created_at", "updated_at")
+
+
+def _chunks(values: List[Any], size: int = IN_CHUNK_SIZE) -> Iterable[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+async def select_in(db, table: str, column: str, values: List[str], order: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Fetch every row of `table` whose `column` is in `values` using bulk in.(...) lookups"""
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_CHUNKS)
+
+    async def fetch(chunk: List[str]) -> List[Dict[str, Any]]:
+        query = db.table(table).select("*").in_(column, chunk)
+        if order:
+            query = query.order(order)
+        async with semaphore:
+            result = await db.execute(query)
+        return result.data or []
+
+    results = await asyncio.gather(*(fetch(chunk) for chunk in _chunks(list(dict.fromkeys(values)))))
+    return [row for rows in results for row in rows]
+
+
+def _group_by(rows: List[Dict[str, Any]], key: str) -> Dict[str, List[Dict[str, Any]]]:
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        grouped.setdefault(row[key], []).append(row)
+    return grouped
+
+
+async def load_topic_subtrees(db, topic_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Attach hotspots and annotations to topic rows, fetching both tables concurrently"""
+    topic_ids = [topic["id"] for topic in topic_rows]
+    if not topic_ids:
+        return []
+
+    hotspot_rows, annotation_rows = await asyncio.gather(
+        select_in(db, "hotspots", "topic_id", topic_ids),
+        select_in(db, "annotations", "topic_id", topic_ids)
+    )
+    hotspots_by_topic = _group_by(hotspot_rows, "topic_id")
+    annotations_by_topic = _group_by(annotation_rows, "topic_id")
+
+    return [
+        {
+            **topic,
+            "hotspots": hotspots_by_topic.get(topic["id"], []),
+            "annotations": annotations_by_topic.get(topic["id"], [])
+        }
+        for topic in topic_rows
+    ]
+
+
+async def load_chapter_trees(db, chapter_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Attach topics, hotspots and annotations to chapter rows.
+
+    Issues one query per table (per id chunk) instead of one per chapter and
+    two per topic, then stitches the tree together in memory.
+    """
+    if not chapter_rows:
+        return []
+
+    topic_rows = await select_in(db, "topics", "chapter_id", [ch["id"] for ch in chapter_rows], order="order_index")
+
+    topics_by_chapter = _group_by(await load_topic_subtrees(db, topic_rows), "chapter_id")
+
+    return [
+        {**ch, "topics": topics_by_chapter.get(ch["id"], [])}
+        for ch in chapter_rows
+    ]
+
+
+def encode_cursor(chapter_row: Dict[str, Any]) -> str:
+    """Opaque keyset cursor pointing just after `chapter_row` in created_at, id order"""
+    raw = json.dumps([chapter_row["created_at"], chapter_row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce"""
+    try:
+        created_at, chapter_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(created_at, str) or not isinstance(chapter_id, str):
+        raise ValueError("Invalid cursor")
+    # Both values are spliced into a PostgREST filter string, so only well-formed ones get through
+    try:
+        datetime.fromisoformat(created_at)
+        chapter_id = str(uuid.UUID(chapter_id))
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+    return created_at, chapter_id
+
+
+async def list_chapters(db, columns: Optional[List[str]] = None, limit: Optional[int] = None,
+                        after: Optional[Tuple[str, str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of chapter rows, newest first, and the cursor of the next page.
+
+    Pages are keyed on (created_at, id) rather than offsets, so every page
+    is an index range scan no matter how deep into the library it is. Only
+    chapter rows are read; attach topics with load_chapter_trees if needed.
+    """
+    if columns:
+        # The cursor and the topic lookup need these even if the caller does not
+        columns = list(dict.fromkeys(["id", "created_at", *columns]))
+    query = db.table("chapters").select(",".join(columns) if columns else "*")
+    if after:
+        created_at, chapter_id = after
+        query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{chapter_id})')
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if limit:
+        # One extra row tells whether another page exists
+        query = query.limit(limit + 1)
+
+    rows = (await db.execute(query)).data or []
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+async def scan_rows(db, table: str, columns: str = "*", page_size: int = SCAN_PAGE_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield every row of `table` in pages, keyed on id so each page is an index range scan"""
+    last_id = None
+    while True:
+        query = db.table(table).select(columns)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = (await db.execute(query.order("id").limit(page_size))).data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+async def load_chapter(db, chapter_id: str) -> Optional[Dict[str, Any]]:
+    """Load one chapter tree in two concurrent rounds of queries.
+
+    The chapter row and its topics are both keyed by chapter_id, so they are
+    fetched together; hotspots and annotations for all topics follow in one
+    bulk query each. Returns None if the chapter does not exist.
+    """
+    chapter_result, topics_result = await asyncio.gather(
+        db.execute(db.table("chapters").select("*").eq("id", chapter_id)),
+        db.execute(db.table("topics").select("*").eq("chapter_id", chapter_id).order("order_index"))
+    )
+
+    if not chapter_result.data:
+        return None
+
+    return {
+        **chapter_result.data[0],
+        "topics": await load_topic_subtrees(db, topics_result.data or [])
+    }
+
+
+async def insert_rows(db, table: str, rows: List[Dict[str, Any]]):
+    """Insert rows as array payloads, one request per INSERT_CHUNK_SIZE rows"""
+    for chunk in _chunks(rows, INSERT_CHUNK_SIZE):
+        await db.execute(db.table(table).insert(chunk))
+
+
+async def upsert_rows(db, table: str, rows: List[Dict[str, Any]]):
+    """Insert-or-update complete rows by id, one request per INSERT_CHUNK_SIZE rows"""
+    for chunk in _chunks(rows, INSERT_CHUNK_SIZE):
+        await db.execute(db.table(table).upsert(chunk, on_conflict="id"))
+
+
+def _is_missing_function(error: Exception) -> bool:
+    # PostgREST (and SQLiteDatabase) answer PGRST202 when the function is not in the schema cache;
+    # errors raised inside the function mention its name too, so the message is not a signal
+    return getattr(error, "code", None) == "PGRST202"
+
+
+async def _insert_chapter_row(db, chapter_doc: Dict[str, Any]):
+    try:
+        result = await db.execute(db.table("chapters").insert(chapter_doc))
+    except Exception as insert_error:
+        error_message = str(insert_error)
+        if "favorite" in error_message.lower():
+            logger.warning("Favorite column missing in chapters table. Retrying insert without favorite.")
+            chapter_doc = {k: v for k, v in chapter_doc.items() if k != "favorite"}
+            result = await db.execute(db.table("chapters").insert(chapter_doc))
+        else:
+            raise
+
+    if not result.data:
+        raise RuntimeError("Failed to create chapter")
+
+
+async def insert_chapter_tree(db, chapter_doc: Dict[str, Any], topic_docs: List[Dict[str, Any]],
+                              hotspot_docs: List[Dict[str, Any]]):
+    """Persist a new chapter with its topics and hotspots.
+
+    Uses the create_chapter_tree function so the whole tree is written in one
+    round trip and one transaction. If the function has not been installed,
+    falls back to bulk array inserts per table and deletes the chapter again
+    (cascading to its children) if a later insert fails.
+    """
+    global _chapter_tree_rpc_available
+
+    if _chapter_tree_rpc_available:
+        try:
+            await db.execute(db.rpc(CHAPTER_TREE_RPC, {
+                "chapter": chapter_doc,
+                "topics": topic_docs,
+                "hotspots": hotspot_docs
+            }))
+            return
+        except Exception as e:
+            if not _is_missing_function(e):
+                raise
+            logger.warning(f"{CHAPTER_TREE_RPC} function not found, falling back to bulk inserts. "
+                           "Run CREATE_TABLES_SQL to enable atomic chapter creation.")
+            _chapter_tree_rpc_available = False
+
+    await _insert_chapter_row(db, chapter_doc)
+    try:
+        await insert_rows(db, "topics", topic_docs)
+        await insert_rows(db, "hotspots", hotspot_docs)
+    except Exception:
+        await db.execute(db.table("chapters").delete().eq("id", chapter_doc["id"]))
+        raise
+
+
+async def insert_chapter_trees(db, chapter_docs: List[Dict[str, Any]], topic_docs: List[Dict[str, Any]],
+                               hotspot_docs: List[Dict[str, Any]]):
+    """Persist many new chapters with one bulk insert per table (per INSERT_CHUNK_SIZE rows).
+
+    Not transactional: if any insert fails, the chapters of the batch are
+    deleted again, cascading to whatever of their topics and hotspots was
+    written, and the error is raised.
+    """
+    await insert_rows(db, "chapters", chapter_docs)
+    try:
+        await insert_rows(db, "topics", topic_docs)
+        await insert_rows(db, "hotspots", hotspot_docs)
+    except Exception:
+        for chunk in _chunks([chapter["id"] for chapter in chapter_docs]):
+            await db.execute(db.table("chapters").delete().in_("id", chunk))
+        raise
+
+
+async def sync_topic_children(db, table: str, topic_id: str, rows: List[Dict[str, Any]]):
+    """Make the hotspot or annotation rows of a topic match `rows`, keyed by id.
+
+    Only new or changed rows are upserted (one bulk request) and only ids no
+    longer present are deleted (one bulk request), so nudging one marker
+    writes one row instead of rewriting the whole set.
+    """
+    existing_result = await db.execute(db.table(table).select("*").eq("topic_id", topic_id))
+    existing = {row["id"]: row for row in existing_result.data or []}
+
+    incoming = [{**row, "topic_id": topic_id} for row in rows]
+    incoming_ids = {row["id"] for row in incoming}
+
+    changed = [
+        row for row in incoming
+        if row["id"] not in existing
+        or any(existing[row["id"]].get(key) != value for key, value in row.items())
+    ]
+    removed = [row_id for row_id in existing if row_id not in incoming_ids]
+
+    await upsert_rows(db, table, changed)
+    for chunk in _chunks(removed):
+        await db.execute(db.table(table).delete().in_("id", chunk))
@@ -0,0 +1,144 @@
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, NamedTuple, Tuple, Union
+import itertools
+import re
+
+HEADER_SEPARATOR = "\n## "
+PARAGRAPH_SEPARATOR = "\n\n"
+READ_SIZE = 1 << 16
+
+KEYWORD_PATTERN = re.compile(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b')
+COMMON_WORDS = frozenset({'The', 'This', 'That', 'These', 'Those', 'When', 'Where', 'What', 'How', 'Why'})
+
+# Raw content, a path to a UTF-8 file, a text file object, or any iterable of text chunks
+ContentSource = Union[str, Path, IO[str], Iterable[str]]
+
+
+class Section(NamedTuple):
+    index: int  # position among all separator-delimited sections, blank ones included
+    title: str
+    content: str
+    introduction: bool = False  # the whole input, returned when it has no non-blank section
+
+
+def candidate_keywords(text: str) -> List[str]:
+    """Capitalized words and phrases of `text` (potential important terms) in order, common ones skipped"""
+    return [w for w in KEYWORD_PATTERN.findall(text) if w not in COMMON_WORDS]
+
+
+def extract_keywords(text: str) -> List[str]:
+    """Extract important keywords from text"""
+    return list(dict.fromkeys(candidate_keywords(text)))[:10]  # Unique, max 10
+
+
+def _read_chunks(f: IO[str]) -> Iterator[str]:
+    return iter(lambda: f.read(READ_SIZE), "")
+
+
+def _split(chunks: Iterable[str], separator: str) -> Iterator[str]:
+    """Lazy equivalent of "".join(chunks).split(separator)"""
+    keep = len(separator) - 1
+    pieces: List[str] = []
+    # Tail of the current section that may be the start of a separator
+    carry = ""
+    for chunk in chunks:
+        text = carry + chunk
+        start = 0
+        while True:
+            found = text.find(separator, start)
+            if found < 0:
+                break
+            pieces.append(text[start:found])
+            yield "".join(pieces)
+            pieces = []
+            start = found + len(separator)
+        cut = max(start, len(text) - keep)
+        pieces.append(text[start:cut])
+        carry = text[cut:]
+    pieces.append(carry)
+    yield "".join(pieces)
+
+
+def _contains(chunks: Iterable[str], separator: str) -> bool:
+    tail = ""
+    for chunk in chunks:
+        window = tail + chunk
+        if separator in window:
+            return True
+        tail = window[-(len(separator) - 1):]
+    return False
+
+
+def _raw_sections(source: ContentSource) -> Tuple[str, Iterator[str]]:
+    """Pick the separator the way the original parser did and split lazily on it.
+
+    Content is split on markdown "## " headers when it has any and on blank
+    lines otherwise. Strings are checked directly and seekable files are
+    scanned once and rewound; other streams are buffered only until the
+    first header turns up (or to the end if there is none).
+    """
+    if isinstance(source, str):
+        separator = HEADER_SEPARATOR if HEADER_SEPARATOR in source else PARAGRAPH_SEPARATOR
+        return separator, _split([source], separator)
+
+    if isinstance(source, Path):
+        def from_file() -> Iterator[str]:
+            with open(source, encoding="utf-8") as f:
+                separator, sections = _raw_sections(f)
+                yield separator
+                yield from sections
+        sections = from_file()
+        return next(sections), sections
+
+    if hasattr(source, "read"):
+        if source.seekable():
+            position = source.tell()
+            has_headers = _contains(_read_chunks(source), HEADER_SEPARATOR)
+            source.seek(position)
+            separator = HEADER_SEPARATOR if has_headers else PARAGRAPH_SEPARATOR
+            return separator, _split(_read_chunks(source), separator)
+        source = _read_chunks(source)
+
+    chunks = iter(source)
+    held: List[str] = []
+    tail = ""
+    for chunk in chunks:
+        held.append(chunk)
+        window = tail + chunk
+        if HEADER_SEPARATOR in window:
+            return HEADER_SEPARATOR, _split(itertools.chain(held, chunks), HEADER_SEPARATOR)
+        tail = window[-(len(HEADER_SEPARATOR) - 1):]
+    return PARAGRAPH_SEPARATOR, _split(held, PARAGRAPH_SEPARATOR)
+
+
+def iter_sections(source: ContentSource) -> Iterator[Section]:
+    """Yield the titled sections of raw content as they are scanned.
+
+    Equivalent to splitting on "\\n## " (or "\\n\\n" without headers) and
+    taking each non-blank section's first line as its title, but holds at
+    most one section in memory for header-structured input. If no section
+    has any text, the whole input is yielded as an introduction.
+    """
+    separator, sections = _raw_sections(source)
+    # Blank sections seen so far, to rebuild the input if nothing else turns up
+    blanks: List[str] = []
+    found = False
+
+    for index, section in enumerate(sections):
+        stripped = section.strip()
+        if not stripped:
+            if not found:
+                blanks.append(section)
+            continue
+        found = True
+        blanks = []
+
+        newline = stripped.find("\n")
+        if newline < 0:
+            title_line, content = stripped, stripped
+        else:
+            title_line, content = stripped[:newline], stripped[newline + 1:].strip()
+        yield Section(index, title_line.replace("#", "").strip() or f"Topic {index + 1}", content)
+
+    if not found:
+        yield Section(0, "Introduction", separator.join(blanks), introduction=True)
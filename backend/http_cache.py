@@ -0,0 +1,150 @@
+from typing import Any, Callable, Dict, List, Optional
+import gzip
+import hashlib
+import json
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = 1024
+
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(content: Any) -> bytes:
+    """Serialize to the same compact UTF-8 JSON as Starlette's JSONResponse, with orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_json_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSONResponse that serializes with encode_json.
+
+    Return an instance from a route to skip FastAPI's jsonable_encoder pass
+    as well; content must already be plain JSON types (or datetimes).
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+def _etag(data: bytes) -> str:
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def coded_etag(etag: str, encoding: Optional[str]) -> str:
+    """ETag of the body sent with Content-Encoding `encoding`.
+
+    Each coding has its own validator, so a shared cache never answers a
+    revalidation of one coding's bytes with another's.
+    """
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+class RenderedBody:
+    """Serialized JSON body with a strong ETag and memoized compressed variants"""
+
+    def __init__(self, body: bytes, etag: Optional[str] = None, source: Any = None):
+        self.body = body
+        self.etag = etag or _etag(body)
+        # The object this body was rendered from, to tell whether a memoized body is still current
+        self.source = source
+        self._encoded: Dict[str, bytes] = {}
+
+    @classmethod
+    def of(cls, content: Any) -> "RenderedBody":
+        return cls(encode_json(content), source=content)
+
+    @staticmethod
+    def list_etag(items: List["RenderedBody"]) -> str:
+        """ETag of the JSON array of `items`, computed without building the array"""
+        return _etag(",".join(item.etag for item in items).encode("ascii"))
+
+    @classmethod
+    def join(cls, items: List["RenderedBody"]) -> "RenderedBody":
+        return cls(b"[" + b",".join(item.body for item in items) + b"]", etag=cls.list_etag(items))
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding not in self._encoded:
+            if encoding == "br":
+                self._encoded[encoding] = brotli.compress(self.body, quality=5)
+            else:
+                self._encoded[encoding] = gzip.compress(self.body, compresslevel=6)
+        return self._encoded[encoding]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = set()
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def conditional_json_response(request: Request, etag: str, render: Callable[[], RenderedBody],
+                              headers: Optional[Dict[str, str]] = None) -> Response:
+    """304 if the client already has `etag`, otherwise the rendered body, compressed when worthwhile.
+
+    `render` is only called when a body is actually sent.
+    """
+    headers = {
+        "ETag": etag,
+        # Let browsers keep the body but revalidate it on every use
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        **(headers or {})
+    }
+    # The client names the coding it holds; any coding of the current body is still fresh
+    for candidate in (etag, coded_etag(etag, "br"), coded_etag(etag, "gzip")):
+        if etag_matches(request.headers.get("if-none-match"), candidate):
+            return Response(status_code=304, headers={**headers, "ETag": candidate})
+
+    rendered = render()
+    body = rendered.body
+    encoding = negotiate_encoding(request.headers.get("accept-encoding")) if len(body) >= COMPRESS_MIN_SIZE else None
+    if encoding:
+        body = rendered.encoded(encoding)
+        headers["Content-Encoding"] = encoding
+        headers["ETag"] = coded_etag(etag, encoding)
+    return Response(content=body, media_type="application/json", headers=headers)
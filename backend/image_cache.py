@@ -0,0 +1,117 @@
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(prompt: str, model: str, aspect_ratio: str, output_format: str) -> str:
+    """Content address of an image generation request.
+
+    Whitespace in the prompt is collapsed and the option fields are
+    lower-cased, so trivially different requests share one cached result.
+    """
+    normalized = {
+        "prompt": " ".join(prompt.split()),
+        "model": model.strip().lower(),
+        "aspect_ratio": aspect_ratio.strip().lower(),
+        "output_format": output_format.strip().lower()
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ImageResultCache:
+    """Completed image generations keyed by request_key.
+
+    Lookups hit an in-memory LRU/TTL tier first and a JSON-file-per-key disk
+    tier second, so results survive restarts. Requests for a key that is
+    still generating are attached to the in-flight task instead of starting
+    a new paid job.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, ttl: float = 7 * 24 * 3600, maxsize: int = 1024):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._starting: Dict[str, asyncio.Future] = {}
+        self._inflight: Dict[str, str] = {}
+        self._task_keys: Dict[str, str] = {}
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = json.loads(self._path(key).read_text())
+        except (OSError, ValueError):
+            return None
+        if entry.get("created_at", 0) + self.ttl < time.time():
+            return None
+        return entry
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(entry))
+        os.replace(tmp_path, path)
+
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return {"task_id", "image_url", "created_at"} for a completed generation"""
+        entry = self.memory.get(key)
+        if entry is None and self.cache_dir is not None:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None:
+                self.memory.set(key, entry, ttl=entry["created_at"] + self.ttl - time.time())
+        return entry
+
+    async def attach(self, key: str, start: Callable[[], Awaitable[str]]) -> str:
+        """Return the task id generating `key`, starting a task only if none is in flight"""
+        if key in self._inflight:
+            return self._inflight[key]
+        if key in self._starting:
+            return await asyncio.shield(self._starting[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._starting[key] = future
+        try:
+            task_id = await start()
+        except Exception as e:
+            future.set_exception(e)
+            # Consume the exception so it is not reported as never retrieved
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            self._inflight[key] = task_id
+            self._task_keys[task_id] = key
+            future.set_result(task_id)
+            return task_id
+        finally:
+            self._starting.pop(key, None)
+
+    async def finish(self, task_id: str, status: Dict[str, Any]):
+        """Record the outcome of a task started through attach()"""
+        key = self._task_keys.pop(task_id, None)
+        if key is None:
+            return
+        self._inflight.pop(key, None)
+        if status.get("status") != "completed" or not status.get("image_url"):
+            return
+
+        entry = {"task_id": task_id, "image_url": status["image_url"], "created_at": time.time()}
+        self.memory.set(key, entry)
+        if self.cache_dir is not None:
+            try:
+                await asyncio.to_thread(self._write_disk, key, entry)
+            except OSError as e:
+                logger.warning(f"Could not persist image cache entry {key}: {str(e)}")
@@ -0,0 +1,185 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional, Tuple
+import asyncio
+import bisect
+import hashlib
+import logging
+import mimetypes
+import multiprocessing
+import os
+import re
+
+import httpx
+
+from cache import LRUCache, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Requested widths are rounded up to one of these so each image has a handful of variants
+VARIANT_WIDTHS = (160, 320, 480, 640, 800, 960, 1280, 1600, 1920)
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+IMAGE_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{2,5}$")
+
+
+def snap_width(width: int) -> int:
+    index = bisect.bisect_left(VARIANT_WIDTHS, width)
+    return VARIANT_WIDTHS[min(index, len(VARIANT_WIDTHS) - 1)]
+
+
+def resize_to_webp(source: str, target: str, width: int, quality: int = 82):
+    """Write a WebP copy of `source` at most `width` pixels wide (runs in a worker process)"""
+    from PIL import Image
+
+    with Image.open(source) as image:
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        tmp_target = f"{target}.{os.getpid()}.tmp"
+        image.save(tmp_target, "WEBP", quality=quality, method=4)
+    os.replace(tmp_target, target)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=start-end" range into inclusive offsets.
+
+    Returns None when the header is absent or not a single byte range (the
+    whole file is served) and raises ValueError when it cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(end_text))
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class ImageStore:
+    """Content-addressed local copies of generated images.
+
+    Each remote URL is downloaded once and stored under the SHA-256 of its
+    bytes; resized WebP variants are produced on demand in a process pool
+    and cached next to the originals.
+    """
+
+    def __init__(self, root: Path, resize_workers: int = 2, timeout: float = 60.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.root = Path(root)
+        self.resize_workers = resize_workers
+        self.timeout = timeout
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._urls = LRUCache(maxsize=10000)
+        self._flights = SingleFlight()
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=self.timeout, follow_redirects=True, transport=self._transport)
+        return self._http
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Forking the threaded server process can copy locks held by other threads into the children
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.resize_workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._pool
+
+    def original_path(self, name: str) -> Path:
+        return self.root / "originals" / name[:2] / name
+
+    def variant_path(self, name: str, width: int) -> Path:
+        return self.root / "variants" / name[:2] / f"{name.rsplit('.', 1)[0]}-w{width}.webp"
+
+    def _url_index_path(self, url: str) -> Path:
+        return self.root / "urls" / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.txt"
+
+    def _read_url_index(self, url: str) -> Optional[str]:
+        try:
+            name = self._url_index_path(url).read_text().strip()
+        except OSError:
+            return None
+        return name if self.original_path(name).exists() else None
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    async def mirror(self, url: str) -> str:
+        """Return the local name of the image at `url`, downloading it the first time"""
+        name = self._urls.get(url) or await asyncio.to_thread(self._read_url_index, url)
+        if name:
+            self._urls.set(url, name)
+            return name
+        return await self._flights.do(url, lambda: self._download(url))
+
+    async def _download(self, url: str) -> str:
+        async with self.http.stream("GET", url) as response:
+            response.raise_for_status()
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > MAX_IMAGE_BYTES:
+                    raise ValueError(f"Image at {url} exceeds {MAX_IMAGE_BYTES} bytes")
+                chunks.append(chunk)
+            content_type = response.headers.get("content-type", "").split(";")[0].strip()
+
+        data = b"".join(chunks)
+        extension = (mimetypes.guess_extension(content_type) or Path(url.split("?")[0]).suffix or ".bin").lstrip(".")
+        name = f"{hashlib.sha256(data).hexdigest()}.{extension.lower()}"
+
+        path = self.original_path(name)
+        if not path.exists():
+            await asyncio.to_thread(self._write, path, data)
+        await asyncio.to_thread(self._write, self._url_index_path(url), name.encode("utf-8"))
+        self._urls.set(url, name)
+        logger.info(f"Mirrored {url} as {name} ({len(data)} bytes)")
+        return name
+
+    def save_original(self, name: str, data: bytes):
+        """Store an original received whole (e.g. from a library bundle), checking its name is its digest"""
+        if not IMAGE_NAME_PATTERN.match(name) or hashlib.sha256(data).hexdigest() != name.split(".", 1)[0]:
+            raise ValueError(f"Image {name} does not match its contents")
+        path = self.original_path(name)
+        if not path.exists():
+            self._write(path, data)
+
+    async def variant(self, name: str, width: int) -> Path:
+        """Return the path of a WebP variant of `name`, resizing it on first use"""
+        target = self.variant_path(name, width)
+        if target.exists():
+            return target
+
+        async def resize():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.pool, resize_to_webp, str(self.original_path(name)), str(target), width)
+            return target
+
+        return await self._flights.do(("variant", name, width), resize)
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
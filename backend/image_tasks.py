@@ -0,0 +1,204 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+import asyncio
+import logging
+import time
+
+from cache import LRUCache, SingleFlight
+from shared_cache import SharedCache
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"completed", "failed"}
+
+SHARED_KEY_PREFIX = "image-task:"
+
+StatusFetcher = Callable[[str], Awaitable[Dict[str, Any]]]
+FinishedCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class ImageStatusCache:
+    """Coalesced, cached view of upstream image task states.
+
+    Concurrent lookups for one task share a single upstream call. Terminal
+    states (completed/failed) never change and are kept until evicted;
+    other states are reused for `ttl` seconds. With a shared tier, states
+    fetched by any worker are reused by the others on the same terms.
+    """
+
+    def __init__(self, fetch_status: StatusFetcher, ttl: float = 2.0, maxsize: int = 10000,
+                 shared: Optional[SharedCache] = None, shared_terminal_ttl: float = 24 * 3600):
+        self.fetch_status = fetch_status
+        self.ttl = ttl
+        self.recent = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.terminal = LRUCache(maxsize=maxsize)
+        self.flights = SingleFlight()
+        self.shared = shared
+        self.shared_terminal_ttl = shared_terminal_ttl
+
+    def put(self, status: Dict[str, Any]):
+        if status.get("status") in TERMINAL_STATUSES:
+            self.terminal.set(status["task_id"], status)
+            self.recent.pop(status["task_id"])
+        else:
+            self.recent.set(status["task_id"], status)
+
+    async def refresh(self, task_id: str) -> Dict[str, Any]:
+        """Fetch the upstream state (shared with concurrent callers) unless it is already final"""
+        status = self.terminal.get(task_id)
+        if status is not None:
+            return status
+
+        async def fetch():
+            key = SHARED_KEY_PREFIX + task_id
+            if self.shared is not None:
+                found, _ = await self.shared.lookup([key])
+                if key in found:
+                    self.put(found[key])
+                    return found[key]
+
+            status = await self.fetch_status(task_id)
+            self.put(status)
+            if self.shared is not None:
+                terminal = status.get("status") in TERMINAL_STATUSES
+                await self.shared.store({key: status}, ttl=self.shared_terminal_ttl if terminal else self.ttl)
+            return status
+
+        return await self.flights.do(task_id, fetch)
+
+    async def get(self, task_id: str) -> Dict[str, Any]:
+        """Return a cached state if fresh enough, otherwise refresh it"""
+        status = self.recent.get(task_id)
+        if status is not None:
+            return status
+        return await self.refresh(task_id)
+
+
+class TrackedTask:
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.status: Optional[Dict[str, Any]] = None
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.poller: Optional[asyncio.Task] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status is not None and self.status.get("status") in TERMINAL_STATUSES
+
+
+class ImageTaskTracker:
+    """Polls Kei.ai once per outstanding image task and fans status changes out.
+
+    Each tracked task has a single background poller whose interval starts at
+    `min_interval` and backs off towards `max_interval` while the state is
+    unchanged, so upstream calls scale with active tasks rather than with the
+    number of browser tabs waiting on them. Subscribers receive every status
+    change through an asyncio.Queue; `on_finished` is awaited once per task
+    with its terminal status.
+    """
+
+    def __init__(self, fetch_status: StatusFetcher, min_interval: float = 1.0, max_interval: float = 8.0,
+                 backoff: float = 1.5, max_lifetime: float = 600.0, retention: float = 300.0,
+                 on_finished: Optional[FinishedCallback] = None):
+        self.fetch_status = fetch_status
+        self.on_finished = on_finished
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_lifetime = max_lifetime
+        self.retention = retention
+        self._tasks: Dict[str, TrackedTask] = {}
+
+    def track(self, task_id: str) -> TrackedTask:
+        """Start polling a task if nobody is polling it yet"""
+        self._expire()
+        task = self._tasks.get(task_id)
+        if task is None:
+            task = self._tasks[task_id] = TrackedTask(task_id)
+        if not task.done and (task.poller is None or task.poller.done()):
+            task.poller = asyncio.create_task(self._poll(task))
+        return task
+
+    def latest(self, task_id: str) -> Optional[Dict[str, Any]]:
+        task = self._tasks.get(task_id)
+        return task.status if task else None
+
+    async def subscribe(self, task_id: str, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield the current status and every later change until the task finishes.
+
+        With `heartbeat` set, None is yielded whenever that many seconds pass
+        without a change so streaming endpoints can keep the connection alive.
+        """
+        task = self.track(task_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        task.subscribers.add(queue)
+        try:
+            if task.status is not None:
+                queue.put_nowait(task.status)
+            while True:
+                try:
+                    status = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield status
+                if status.get("status") in TERMINAL_STATUSES:
+                    return
+        finally:
+            task.subscribers.discard(queue)
+
+    def _publish(self, task: TrackedTask, status: Dict[str, Any]):
+        task.status = status
+        for queue in list(task.subscribers):
+            queue.put_nowait(status)
+
+    async def _poll(self, task: TrackedTask):
+        interval = self.min_interval
+        deadline = time.monotonic() + self.max_lifetime
+        while time.monotonic() < deadline:
+            try:
+                status = await self.fetch_status(task.task_id)
+            except Exception as e:
+                logger.warning(f"Polling image task {task.task_id} failed: {str(e)}")
+                status = None
+
+            if status is not None and status != task.status:
+                self._publish(task, status)
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+
+            if task.done:
+                await self._finish(task)
+                return
+            await asyncio.sleep(interval)
+
+        logger.warning(f"Stopped polling image task {task.task_id} after {self.max_lifetime:.0f}s")
+        self._publish(task, {
+            "task_id": task.task_id,
+            "status": "failed",
+            "image_url": None,
+            "message": "Task status polling timed out"
+        })
+        await self._finish(task)
+
+    async def _finish(self, task: TrackedTask):
+        task.finished_at = time.monotonic()
+        if self.on_finished is not None:
+            try:
+                await self.on_finished(task.task_id, task.status)
+            except Exception as e:
+                logger.error(f"Finish callback for image task {task.task_id} failed: {str(e)}")
+
+    def _expire(self):
+        # Forget finished tasks once nobody is likely to ask about them again
+        now = time.monotonic()
+        for task_id, task in list(self._tasks.items()):
+            if task.finished_at is not None and now - task.finished_at > self.retention and not task.subscribers:
+                del self._tasks[task_id]
+
+    async def aclose(self):
+        pollers = [task.poller for task in self._tasks.values() if task.poller and not task.poller.done()]
+        for poller in pollers:
+            poller.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
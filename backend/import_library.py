@@ -0,0 +1,36 @@
+"""Bulk-import chapters into the library from the command line.
+
+Takes the same NDJSON files, zip archives and GET /api/export bundles as
+POST /api/import, using the Supabase settings from backend/.env, and prints
+the import report:
+
+    python backend/import_library.py curriculum.zip
+    python backend/import_library.py library-20260101-000000.tar.zst
+"""
+from pathlib import Path
+import asyncio
+import json
+import sys
+
+import server
+
+
+async def main(path: Path) -> int:
+    try:
+        # Keyword ranking of the imported hotspots uses the library already stored
+        await server.build_library_indexes()
+        report = await server.import_library(path)
+    finally:
+        if server.import_pool:
+            server.import_pool.shutdown()
+        if server.shared_cache:
+            await server.shared_cache.aclose()
+        server.get_database().close()
+    print(json.dumps(report, indent=2))
+    return 1 if report.get("failed") else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(__doc__)
+    sys.exit(asyncio.run(main(Path(sys.argv[1]))))
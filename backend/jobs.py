@@ -0,0 +1,151 @@
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import uuid
+
+from cache import LRUCache
+from shared_cache import SharedCache
+
+logger = logging.getLogger(__name__)
+
+# How long finished jobs stay pollable from other workers
+SHARED_JOB_TTL = 24 * 3600.0
+
+
+class Job:
+    """Progress record of a long-running background job"""
+
+    def __init__(self, kind: str, total: int = 0):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = "queued"
+        self.stage: Optional[str] = None
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now(timezone.utc)
+        self.updated_at = self.created_at
+
+    def touch(self):
+        self.updated_at = datetime.now(timezone.utc)
+
+    def set_stage(self, stage: str, total: Optional[int] = None):
+        self.stage = stage
+        if total is not None:
+            self.total = total
+            self.completed = 0
+            self.failed = 0
+        self.touch()
+
+    def advance(self, ok: bool = True, count: int = 1):
+        if ok:
+            self.completed += count
+        else:
+            self.failed += count
+        self.touch()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "progress": (self.completed + self.failed) / self.total if self.total else (1.0 if self.status == "completed" else 0.0),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat()
+        }
+
+
+class JobRegistry:
+    """Runs background jobs on the event loop and keeps their progress for polling.
+
+    A job runs in the worker that started it. With a SharedCache, its
+    state is also published there (on start, every `publish_interval`
+    seconds while it changes, and when it ends), so lookup() answers from
+    any worker on the host. Without one, jobs are only visible to their
+    own worker and multi-worker deployments need sticky routing.
+    """
+
+    def __init__(self, maxsize: int = 1000, shared: Optional[SharedCache] = None, publish_interval: float = 0.5):
+        self._jobs = LRUCache(maxsize=maxsize)
+        self._tasks = set()
+        self.shared = shared
+        self.publish_interval = publish_interval
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def lookup(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """State of a job started by this or, through the shared cache, any other worker"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.shared is None:
+            return None
+        key = f"job:{job_id}"
+        found, _ = await self.shared.lookup([key])
+        return found.get(key)
+
+    def start(self, kind: str, work: Callable[[Job], Awaitable[Any]], total: int = 0) -> Job:
+        """Create a job and run `work(job)` in the background; its return value becomes job.result"""
+        job = Job(kind, total)
+        self._jobs.set(job.id, job)
+        task = asyncio.create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def submit(self, kind: str, work: Callable[[Job], Awaitable[Any]], total: int = 0) -> Job:
+        """start(), returning once other workers can see the job, so its id can be polled anywhere at once"""
+        job = self.start(kind, work, total)
+        await self.publish(job)
+        return job
+
+    async def publish(self, job: Job):
+        if self.shared is None:
+            return
+        try:
+            await self.shared.store({f"job:{job.id}": job.to_dict()}, ttl=SHARED_JOB_TTL)
+        except Exception as e:
+            logger.warning(f"Could not publish {job.kind} job {job.id}: {str(e)}")
+
+    async def _report(self, job: Job):
+        published = None
+        while True:
+            await asyncio.sleep(self.publish_interval)
+            if job.updated_at != published:
+                published = job.updated_at
+                await self.publish(job)
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Any]]):
+        job.status = "running"
+        job.touch()
+        reporter = asyncio.create_task(self._report(job)) if self.shared is not None else None
+        try:
+            result = await work(job)
+            if result is not None:
+                job.result = result
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"{job.kind} job {job.id} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+        job.touch()
+        await self.publish(job)
+
+    async def aclose(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
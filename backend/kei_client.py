@@ -0,0 +1,104 @@
+from typing import Any, Dict, Optional
+import os
+import logging
+import time
+
+import httpx
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+KEI_API_BASE = "https://api.kie.ai/api/v1"
+
+
+class KeiClient:
+    """Shared HTTP client for the Kei.ai API.
+
+    One httpx.AsyncClient per worker keeps TCP/TLS connections to api.kie.ai
+    alive across requests instead of paying the handshake on every call.
+    """
+
+    def __init__(self, api_key: Optional[str], base_url: str = KEI_API_BASE, http2: bool = False,
+                 max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, timeout: float = 60.0, connect_timeout: float = 10.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self.request_seconds = Histogram(
+            "kei_request_duration_seconds", "Kei.ai API calls by endpoint and HTTP status (or error type)",
+            ["endpoint", "status"]
+        )
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("KEI_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+                    http2 = False
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                http2=http2,
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=self._transport
+            )
+        return self._http
+
+    async def _request(self, method: str, endpoint: str, **kwargs) -> httpx.Response:
+        status = "cancelled"
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, endpoint, **kwargs)
+            status = str(response.status_code)
+            return response
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            self.request_seconds.observe(time.perf_counter() - started, endpoint, status)
+
+    async def create_task(self, payload: Dict[str, Any]) -> httpx.Response:
+        return await self._request("POST", "/jobs/createTask", json=payload)
+
+    async def record_info(self, task_id: str, timeout: Optional[float] = 30.0) -> httpx.Response:
+        return await self._request("GET", "/jobs/recordInfo", params={"taskId": task_id}, timeout=timeout)
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+kei_client: Optional[KeiClient] = None
+
+def get_kei_client() -> KeiClient:
+    global kei_client
+    if kei_client is None:
+        kei_client = KeiClient(
+            api_key=os.environ.get('KEI_API_KEY'),
+            base_url=os.environ.get('KEI_API_BASE', KEI_API_BASE),
+            http2=os.environ.get('KEI_HTTP2', '').lower() in ('1', 'true', 'yes'),
+            max_connections=int(os.environ.get('KEI_MAX_CONNECTIONS', '100')),
+            max_keepalive_connections=int(os.environ.get('KEI_MAX_KEEPALIVE_CONNECTIONS', '20')),
+            timeout=float(os.environ.get('KEI_TIMEOUT', '60')),
+            connect_timeout=float(os.environ.get('KEI_CONNECT_TIMEOUT', '10'))
+        )
+    return kei_client
@@ -0,0 +1,206 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Lower values are dispatched first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Failures after which the request may have reached Kei.ai, so a retry can start a second paid task
+UNCERTAIN_STATUS_CODES = RETRYABLE_STATUS_CODES - {429}
+# Transport errors raised before the request was sent, safe to retry
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+Sender = Callable[[Dict[str, Any]], Awaitable[httpx.Response]]
+
+
+def parse_model_limits(spec: Optional[str]) -> Dict[str, int]:
+    """Parse "model=limit,model=limit" into a dict, ignoring malformed entries"""
+    limits = {}
+    for item in (spec or "").split(","):
+        model, _, limit = item.partition("=")
+        if model.strip() and limit.strip().isdigit():
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated_at = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class Job:
+    def __init__(self, model: str, payload: Dict[str, Any], priority: int):
+        self.model = model
+        self.payload = payload
+        self.priority = priority
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class KeiScheduler:
+    """Outbound scheduler for Kei.ai createTask calls.
+
+    Jobs wait in a priority queue (interactive generations ahead of batch
+    work) and are started while their model is under its concurrency cap.
+    Every attempt takes a token from a shared bucket so bursts stay under the
+    provider's rate limit, and 429/5xx answers are retried with jittered
+    exponential backoff (honouring Retry-After when present). A read timeout
+    is not retried: createTask may have been accepted, and a second call
+    would start (and bill) a second task. Retries after a 5xx or a dropped
+    connection carry the same risk and are logged as such.
+    """
+
+    def __init__(self, send: Sender, rate: float = 5.0, burst: float = 10.0,
+                 model_concurrency: Optional[Dict[str, int]] = None, default_concurrency: int = 4,
+                 max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.send = send
+        self.bucket = TokenBucket(rate, burst)
+        self.model_concurrency = model_concurrency or {}
+        self.default_concurrency = default_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._pending: List[tuple] = []
+        self._sequence = itertools.count()
+        self._running: Dict[str, int] = {}
+        self._workers = set()
+        self.submitted = 0
+        self.dispatched = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+
+    def _capacity(self, model: str) -> int:
+        return self.model_concurrency.get(model, self.default_concurrency)
+
+    async def submit(self, model: str, payload: Dict[str, Any], priority: int = PRIORITY_INTERACTIVE) -> httpx.Response:
+        """Queue a createTask call and wait for its final response"""
+        job = Job(model, payload, priority)
+        heapq.heappush(self._pending, (priority, next(self._sequence), job))
+        self.submitted += 1
+        self._dispatch()
+        return await job.future
+
+    def _dispatch(self):
+        deferred = []
+        while self._pending:
+            entry = heapq.heappop(self._pending)
+            job = entry[2]
+            if job.future.done():
+                continue
+            if self._running.get(job.model, 0) >= self._capacity(job.model):
+                deferred.append(entry)
+                continue
+            self._running[job.model] = self._running.get(job.model, 0) + 1
+            self.dispatched += 1
+            self.wait_seconds += time.monotonic() - job.enqueued_at
+            worker = asyncio.create_task(self._run(job))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+        for entry in deferred:
+            heapq.heappush(self._pending, entry)
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_delay)
+        # Full jitter: uniform between 0 and the exponential ceiling
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    @staticmethod
+    def _is_retryable(response: httpx.Response) -> bool:
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            return True
+        # Kei.ai also reports throttling and outages in the body of a 200
+        return KeiScheduler._body_code(response) in RETRYABLE_STATUS_CODES
+
+    @staticmethod
+    def _body_code(response: httpx.Response) -> Any:
+        try:
+            body = response.json()
+        except ValueError:
+            return None
+        return body.get("code") if isinstance(body, dict) else None
+
+    async def _run(self, job: Job):
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self.bucket.acquire()
+                response = None
+                try:
+                    response = await self.send(job.payload)
+                except httpx.TransportError as e:
+                    if attempt == self.max_retries or isinstance(e, httpx.ReadTimeout):
+                        raise
+                    if isinstance(e, UNSENT_ERRORS):
+                        logger.warning(f"Kei.ai {job.model} request failed ({str(e)}), retrying")
+                    else:
+                        logger.warning(f"Kei.ai {job.model} request failed after sending ({type(e).__name__}: {str(e)}), "
+                                       "retrying; this may create a duplicate task")
+                else:
+                    if attempt == self.max_retries or not self._is_retryable(response):
+                        if not job.future.done():
+                            job.future.set_result(response)
+                        return
+                    status = response.status_code if response.status_code in RETRYABLE_STATUS_CODES else self._body_code(response)
+                    if status in UNCERTAIN_STATUS_CODES:
+                        logger.warning(f"Kei.ai {job.model} answered {status}, retrying; this may create a duplicate task")
+                    else:
+                        logger.warning(f"Kei.ai {job.model} answered {status}, retrying")
+                self.retries += 1
+                await asyncio.sleep(self._retry_delay(attempt, response))
+        except Exception as e:
+            self.failures += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._running[job.model] -= 1
+            self._dispatch()
+
+    def metrics(self) -> Dict[str, Any]:
+        queued: Dict[str, int] = {}
+        for priority, _, job in self._pending:
+            if not job.future.done():
+                name = "interactive" if priority <= PRIORITY_INTERACTIVE else "batch"
+                queued[name] = queued.get(name, 0) + 1
+        return {
+            "queue_depth": sum(queued.values()),
+            "queued_by_priority": queued,
+            "running_by_model": {model: count for model, count in self._running.items() if count},
+            "submitted": self.submitted,
+            "dispatched": self.dispatched,
+            "retries": self.retries,
+            "failures": self.failures,
+            "average_queue_wait_seconds": self.wait_seconds / self.dispatched if self.dispatched else 0.0,
+            "rate_limit_per_second": self.bucket.rate
+        }
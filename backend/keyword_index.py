@@ -0,0 +1,124 @@
+from collections import Counter
+from typing import Any, Dict, FrozenSet, Iterable, List, Set, Tuple
+import math
+
+from content_parser import candidate_keywords
+
+
+def term_key(keyword: str) -> str:
+    """Index key of a keyword: case and inner whitespace do not matter"""
+    return " ".join(keyword.split()).casefold()
+
+
+class KeywordIndex:
+    """Document frequencies of candidate keywords across every topic in the library.
+
+    Each topic's content is tokenized once, when it is written; the index
+    keeps the set of terms per topic, so replacing or removing a topic only
+    touches the terms of that topic and never rescans the corpus. rank()
+    orders the keywords of new text by TF-IDF against these statistics, so
+    terms that appear in most of the library ("Chapter", "Figure") sink
+    below the ones specific to the text.
+
+    Every worker keeps its own index, built from the database at startup and
+    updated by its own write handlers. Writes served by other workers reach
+    it through the shared cache's invalidation log (see
+    refresh_library_indexes in server.py), or on the next restart when
+    workers share no cache.
+    """
+
+    def __init__(self):
+        self.df: Counter = Counter()
+        self._topics: Dict[str, Tuple[str, FrozenSet[str]]] = {}
+        self._chapters: Dict[str, Set[str]] = {}
+        # Ids written while the initial load runs, which the load must not overwrite
+        self._written: Set[str] = set()
+        self.loading = False
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    def _set(self, topic_id: str, chapter_id: str, content: str):
+        terms = frozenset(term_key(w) for w in candidate_keywords(content or ""))
+        previous = self._topics.get(topic_id)
+        if previous is not None:
+            self._unlink(topic_id, *previous)
+        self._topics[topic_id] = (chapter_id, terms)
+        self._chapters.setdefault(chapter_id, set()).add(topic_id)
+        self.df.update(terms)
+
+    def _unlink(self, topic_id: str, chapter_id: str, terms: FrozenSet[str]):
+        self.df.subtract(terms)
+        for term in terms:
+            if self.df[term] <= 0:
+                del self.df[term]
+        siblings = self._chapters.get(chapter_id)
+        if siblings is not None:
+            siblings.discard(topic_id)
+            if not siblings:
+                del self._chapters[chapter_id]
+
+    def set_topic(self, topic_id: str, chapter_id: str, content: str):
+        """Add a topic or replace its content"""
+        if self.loading:
+            self._written.add(topic_id)
+        self._set(topic_id, chapter_id, content)
+
+    def remove_topic(self, topic_id: str):
+        if self.loading:
+            self._written.add(topic_id)
+        entry = self._topics.pop(topic_id, None)
+        if entry is not None:
+            self._unlink(topic_id, *entry)
+
+    def remove_chapter(self, chapter_id: str):
+        if self.loading:
+            self._written.add(chapter_id)
+        for topic_id in list(self._chapters.get(chapter_id, ())):
+            self.remove_topic(topic_id)
+
+    def begin_load(self):
+        """Start the initial load; writes from now on take precedence over loaded rows"""
+        self.loading = True
+        self._written.clear()
+
+    def load(self, rows: Iterable[Dict[str, Any]]):
+        """Add stored topic rows (id, chapter_id, content) during the initial load"""
+        for row in rows:
+            if row["id"] not in self._written and row["chapter_id"] not in self._written:
+                self._set(row["id"], row["chapter_id"], row.get("content"))
+
+    def end_load(self, ok: bool = True):
+        self.loading = False
+        self._written.clear()
+        self.ready = self.ready or ok
+
+    def idf(self, term: str) -> float:
+        # Smoothed so unseen terms score highest and an empty index ranks by frequency alone
+        return math.log((1 + len(self._topics)) / (1 + self.df.get(term, 0))) + 1
+
+    def rank(self, text: str, limit: int = 10) -> List[str]:
+        """Keywords of `text` by descending TF-IDF, first occurrence breaking ties"""
+        return self.rank_candidates(candidate_keywords(text), limit)
+
+    def rank_candidates(self, candidates: List[str], limit: int = 10) -> List[str]:
+        """rank() for text whose candidate_keywords were already extracted, e.g. in another process"""
+        counts: Counter = Counter()
+        surface: Dict[str, str] = {}
+        for keyword in candidates:
+            key = term_key(keyword)
+            counts[key] += 1
+            surface.setdefault(key, keyword)
+
+        order = {key: position for position, key in enumerate(surface)}
+        ranked = sorted(counts, key=lambda key: (-counts[key] * self.idf(key), order[key]))
+        return [surface[key] for key in ranked[:limit]]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "topics": len(self._topics),
+            "chapters": len(self._chapters),
+            "terms": len(self.df),
+            "ready": self.ready
+        }
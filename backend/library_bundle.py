@@ -0,0 +1,277 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import gzip
+import io
+import json
+import re
+import tarfile
+import time
+import zipfile
+
+from chapter_store import SCAN_PAGE_SIZE, scan_rows, upsert_rows
+from http_cache import encode_json
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; zip and tar.gz bundles are always available
+    zstandard = None
+
+BUNDLE_FORMAT = "interactive-ebook-library"
+BUNDLE_VERSION = 1
+# Archive formats GET /api/export can write, with their media types
+BUNDLE_MEDIA_TYPES = {
+    "zip": "application/zip",
+    "tar.gz": "application/gzip",
+    "tar.zst": "application/zstd"
+}
+# Tables in the order they are written and restored, parents before the rows referencing them
+BUNDLE_TABLES = ("chapters", "topics", "hotspots", "annotations")
+MANIFEST_NAME = "manifest.json"
+IMAGES_DIR = "images"
+# Largest archive member a restore will read into memory
+MAX_MEMBER_BYTES = 64 * 1024 * 1024
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# Mirrored illustrations are referenced as .../api/images/<sha256>.<ext>
+IMAGE_URL_PATTERN = re.compile(r"/api/images/([0-9a-f]{64}\.[a-z0-9]{2,5})$")
+
+
+def available_formats() -> List[str]:
+    return [name for name in BUNDLE_MEDIA_TYPES if name != "tar.zst" or zstandard is not None]
+
+
+class _Sink(io.RawIOBase):
+    """Unseekable write target that holds archive bytes until they are drained"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class BundleWriter:
+    """Streaming zip/tar.gz/tar.zst writer.
+
+    Members are written whole and the compressed bytes collect in memory
+    until drain() is called, so a writer holds at most one member's worth of
+    output. Nothing is ever seeked, which lets the archive go straight into
+    an HTTP response.
+    """
+
+    def __init__(self, bundle_format: str = "zip"):
+        if bundle_format not in available_formats():
+            raise ValueError(f"Unsupported bundle format: {bundle_format}")
+        self.format = bundle_format
+        self._sink = _Sink()
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._tar: Optional[tarfile.TarFile] = None
+        self._compressor = None
+        if bundle_format == "zip":
+            self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+        else:
+            if bundle_format == "tar.gz":
+                self._compressor = gzip.GzipFile(fileobj=self._sink, mode="wb", compresslevel=6)
+            else:
+                self._compressor = zstandard.ZstdCompressor(level=3).stream_writer(self._sink, closefd=False)
+            self._tar = tarfile.open(fileobj=self._compressor, mode="w|")
+
+    def add(self, name: str, data: bytes, compress: bool = True):
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            self._zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def add_file(self, name: str, path: Path):
+        """Add a file that is already compressed (an image), stored as is in zip archives"""
+        self.add(name, Path(path).read_bytes(), compress=False)
+
+    def drain(self) -> bytes:
+        return self._sink.drain()
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+            self._compressor.close()
+
+
+def encode_rows(rows: List[Dict[str, Any]]) -> bytes:
+    return b"".join(encode_json(row) + b"\n" for row in rows)
+
+
+def referenced_images(topic_rows: List[Dict[str, Any]]) -> Iterator[str]:
+    """Names of the mirrored illustrations used by `topic_rows`"""
+    for row in topic_rows:
+        match = IMAGE_URL_PATTERN.search(row.get("illustration") or "")
+        if match:
+            yield match.group(1)
+
+
+async def export_bundle(db, bundle_format: str = "zip",
+                        image_path: Optional[Callable[[str], Optional[Path]]] = None,
+                        page_size: int = SCAN_PAGE_SIZE) -> AsyncIterator[bytes]:
+    """Yield a bundle of the whole library as compressed bytes, one table page at a time.
+
+    Every table is scanned in pages of `page_size` rows and each page
+    becomes one NDJSON member (chapters/000001.ndjson, ...), so memory does
+    not grow with the library. With `image_path`, which maps an image name
+    to its local file (or None), the mirrored illustrations of each topic
+    page follow that page under images/. Pages are read one after another,
+    not from a snapshot: rows written while the export runs may or may not
+    be included.
+    """
+    writer = BundleWriter(bundle_format)
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "tables": list(BUNDLE_TABLES),
+        "images": image_path is not None
+    }
+    writer.add(MANIFEST_NAME, encode_json(manifest))
+
+    written_images = set()
+    for table in BUNDLE_TABLES:
+        page = 0
+        async for rows in scan_rows(db, table, page_size=page_size):
+            page += 1
+            await asyncio.to_thread(writer.add, f"{table}/{page:06d}.ndjson", encode_rows(rows))
+            chunk = writer.drain()
+            if chunk:
+                yield chunk
+            if image_path is None or table != "topics":
+                continue
+            for name in referenced_images(rows):
+                path = image_path(name) if name not in written_images else None
+                if path is not None:
+                    written_images.add(name)
+                    await asyncio.to_thread(writer.add_file, f"{IMAGES_DIR}/{name}", path)
+                    chunk = writer.drain()
+                    if chunk:
+                        yield chunk
+
+    await asyncio.to_thread(writer.close)
+    yield writer.drain()
+
+
+def is_bundle(path: Path) -> bool:
+    """Whether `path` looks like a bundle written by export_bundle (rather than an import file)"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return MANIFEST_NAME in archive.NameToInfo
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    return magic.startswith(GZIP_MAGIC) or magic == ZSTD_MAGIC
+
+
+def _read_member(name: str, size: int, f) -> Tuple[str, bytes]:
+    if size > MAX_MEMBER_BYTES:
+        raise ValueError(f"{name} is larger than {MAX_MEMBER_BYTES} bytes")
+    return name, f.read()
+
+
+def iter_members(path: Path) -> Iterator[Tuple[str, bytes]]:
+    """Yield (name, data) for every file in a bundle, in archive order"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as f:
+                        yield _read_member(info.filename, info.file_size, f)
+        return
+
+    with open(path, "rb") as raw:
+        if raw.read(4) == ZSTD_MAGIC:
+            if zstandard is None:
+                raise ValueError("Restoring a tar.zst bundle requires the zstandard package")
+            raw.seek(0)
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+            mode = "r|"
+        else:
+            raw.seek(0)
+            stream = raw
+            mode = "r|gz"
+        with tarfile.open(fileobj=stream, mode=mode) as archive:
+            for info in archive:
+                if info.isfile():
+                    yield _read_member(info.name, info.size, archive.extractfile(info))
+
+
+def _check_manifest(member: Optional[Tuple[str, bytes]]) -> Dict[str, Any]:
+    if member is None or member[0] != MANIFEST_NAME:
+        raise ValueError("Not a library bundle: missing manifest.json")
+    try:
+        manifest = json.loads(member[1])
+    except ValueError as e:
+        raise ValueError(f"Invalid manifest.json: {str(e)}")
+    if not isinstance(manifest, dict) or manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError("Not a library bundle: unknown format")
+    if not isinstance(manifest.get("version"), int) or manifest["version"] > BUNDLE_VERSION:
+        raise ValueError(f"Unsupported bundle version: {manifest.get('version')}")
+    return manifest
+
+
+async def restore_bundle(path: Path, db,
+                         save_image: Optional[Callable[[str, bytes], None]] = None,
+                         image_url: Optional[Callable[[str], str]] = None,
+                         on_rows: Optional[Callable[[str, List[Dict[str, Any]]], Awaitable[None]]] = None) -> Dict[str, int]:
+    """Write the rows and images of a bundle back; returns how many of each were restored.
+
+    Rows are upserted by id, a page at a time in archive order, so restoring
+    the same bundle twice is harmless and rows missing from the bundle are
+    left alone. `save_image(name, data)` stores an image (in a thread), and
+    `image_url(name)` rewrites the illustration URLs of topics to this
+    server when the bundle carries its images. `on_rows` sees every page
+    after it is written.
+    """
+    members = iter_members(path)
+    try:
+        manifest = _check_manifest(await asyncio.to_thread(next, members, None))
+        rewrite_images = bool(manifest.get("images")) and image_url is not None
+        counts = {table: 0 for table in BUNDLE_TABLES}
+        counts["images"] = 0
+
+        while True:
+            member = await asyncio.to_thread(next, members, None)
+            if member is None:
+                break
+            name, data = member
+            folder, _, base = name.partition("/")
+
+            if folder in BUNDLE_TABLES:
+                rows = [json.loads(line) for line in data.splitlines() if line.strip()]
+                if rewrite_images and folder == "topics":
+                    for row in rows:
+                        match = IMAGE_URL_PATTERN.search(row.get("illustration") or "")
+                        if match:
+                            row["illustration"] = image_url(match.group(1))
+                await upsert_rows(db, folder, rows)
+                counts[folder] += len(rows)
+                if on_rows:
+                    await on_rows(folder, rows)
+            elif folder == IMAGES_DIR and save_image is not None:
+                await asyncio.to_thread(save_image, base, data)
+                counts["images"] += 1
+    finally:
+        members.close()
+    return counts
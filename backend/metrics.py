@@ -0,0 +1,247 @@
+from collections import Counter as Tally
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import bisect
+import math
+import time
+
+from starlette.routing import Match
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Latency buckets in seconds, from cache hits to slow upstream calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Storage round trips issued while serving one request
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 25, 50, 100, 250)
+# Route label of requests no route matches, so scanners cannot blow up the label set
+UNMATCHED_ROUTE = "<unmatched>"
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def format_value(value: float) -> str:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """One metric family; values are keyed by label values in `labelnames` order.
+
+    Metrics are updated from the event loop thread only, so they take no
+    locks.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def _key(self, labels: Sequence[Any]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {labels}")
+        return tuple(str(label) for label in labels)
+
+    def get(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[Sample]:
+        for key, value in self._values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, *labels, amount: float = 1):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: observations per bucket (not cumulative), sum, count
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def get(self, *labels) -> float:
+        """Number of observations for the label set"""
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self) -> Iterator[Sample]:
+        for key, (counts, total, count) in self._series.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, observed in zip(self.buckets, counts):
+                cumulative += observed
+                yield f"{self.name}_bucket", {**labels, "le": format_value(bound)}, cumulative
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+def render(metrics: Iterable[Metric]) -> str:
+    """Prometheus text exposition of `metrics`"""
+    lines: List[str] = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+            lines.append(f"{name}{{{label_text}}} {format_value(value)}" if label_text else f"{name} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def cache_metrics(caches: Dict[str, Optional[Dict[str, Any]]]) -> List[Metric]:
+    """Metric families for the stats() of named caches (LRUCache, ChapterCache, SharedCache)"""
+    families = {
+        "hits": Counter("cache_hits_total", "Cache lookups that found an entry", ["cache"]),
+        "misses": Counter("cache_misses_total", "Cache lookups that found nothing", ["cache"]),
+        "evictions": Counter("cache_evictions_total", "Entries dropped to make room", ["cache"]),
+        "size": Gauge("cache_entries", "Entries currently held", ["cache"]),
+        "hit_ratio": Gauge("cache_hit_ratio", "Hits over lookups since the worker started", ["cache"])
+    }
+    for cache, stats in caches.items():
+        for key, family in families.items():
+            if stats and key in stats:
+                # Fresh families, so adding the snapshot sets it
+                family.inc(cache, amount=stats[key])
+    return list(families.values())
+
+
+class RequestTally:
+    """Storage queries issued on behalf of one request, by (table, operation)"""
+
+    __slots__ = ("calls", "open")
+
+    def __init__(self):
+        self.calls: Tally = Tally()
+        self.open = True
+
+
+_request_tally: ContextVar[Optional[RequestTally]] = ContextVar("request_tally", default=None)
+
+
+def note_storage_call(table: str, operation: str):
+    """Count a storage round trip against the request being served, if any"""
+    tally = _request_tally.get()
+    # Background jobs inherit the context of the request that started them; once it is answered they no longer count
+    if tally is not None and tally.open:
+        tally.calls[(table, operation)] += 1
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """Path template of the route that will serve `scope`, e.g. /api/chapters/{chapter_id}"""
+    router = getattr(scope.get("app"), "router", None)
+    partial = None
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            # Path matches but the method does not (405s and CORS preflights)
+            partial = route.path
+    return partial or UNMATCHED_ROUTE
+
+
+class RequestMetrics:
+    """Latency, in-flight and storage round-trip metrics per route, recorded by MetricsMiddleware"""
+
+    def __init__(self):
+        self.duration = Histogram(
+            "http_request_duration_seconds", "Time to serve a request, streamed bodies included",
+            ["method", "route", "status"]
+        )
+        self.in_flight = Gauge("http_requests_in_flight", "Requests being served", ["method", "route"])
+        self.round_trips = Histogram(
+            "http_request_storage_round_trips", "Storage queries issued while serving one request",
+            ["method", "route"], buckets=ROUND_TRIP_BUCKETS
+        )
+        self.storage_queries = Counter(
+            "http_request_storage_queries_total", "Storage queries issued by requests, by table and operation",
+            ["method", "route", "table", "operation"]
+        )
+
+    def metrics(self) -> List[Metric]:
+        return [self.duration, self.in_flight, self.round_trips, self.storage_queries]
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding a RequestMetrics; pass it as `metrics=` to app.add_middleware"""
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        tally = RequestTally()
+        token = _request_tally.set(tally)
+        self.metrics.in_flight.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            tally.open = False
+            _request_tally.reset(token)
+            self.metrics.in_flight.dec(method, route)
+            self.metrics.duration.observe(elapsed, method, route, status)
+            self.metrics.round_trips.observe(sum(tally.calls.values()), method, route)
+            for (table, operation), count in tally.calls.items():
+                self.metrics.storage_queries.inc(method, route, table, operation, amount=count)
@@ -0,0 +1,409 @@
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import heapq
+import math
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Title tokens count this many times towards term frequency
+TITLE_BOOST = 2
+# Indexed terms a prefix query term may expand to, most frequent first
+MAX_PREFIX_TERMS = 32
+# Documents one query may score per kind before it settles for the best seen
+MAX_SCORED_DOCS = 500
+# New terms kept unsorted before they are merged into the sorted vocabulary
+MAX_UNSORTED_TERMS = 1024
+# Characters of context shown around the first match
+SNIPPET_CHARS = 160
+
+# Searchable fields per document kind; the first one is the title
+FIELDS = {
+    "chapter": ("title", "description"),
+    "topic": ("title", "subtitle", "content"),
+    "hotspot": ("title", "description", "fun_fact")
+}
+# Field a snippet is cut from, falling back to the title
+SNIPPET_FIELDS = {"chapter": "description", "topic": "content", "hotspot": "description"}
+
+DocKey = Tuple[str, str]  # (kind, id)
+
+# Term impacts are stored as integers up to this (one byte, like Lucene's norms)
+MAX_IMPACT = 255
+# Impacts are recomputed when the average document length moves this far from the one they used
+RENORMALIZE_DRIFT = 1.5
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.casefold()) if text else []
+
+
+class Document(NamedTuple):
+    kind: str
+    id: str
+    chapter_id: str
+    topic_id: Optional[str]
+    fields: Dict[str, str]
+    terms: Dict[str, int]  # weighted term frequencies
+    length: int
+    impacts: Dict[str, int]  # quantized BM25 term weights, empty until posted
+
+
+class Postings:
+    """Documents of one kind containing one term, highest impact first"""
+
+    __slots__ = ("ranks", "ids")
+
+    def __init__(self):
+        self.ranks: List[int] = []  # MAX_IMPACT - impact, ascending
+        self.ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, doc_id: str, impact: int):
+        i = bisect_right(self.ranks, MAX_IMPACT - impact)
+        self.ranks.insert(i, MAX_IMPACT - impact)
+        self.ids.insert(i, doc_id)
+
+    def remove(self, doc_id: str, impact: int):
+        i = self.ids.index(doc_id, bisect_left(self.ranks, MAX_IMPACT - impact))
+        del self.ranks[i]
+        del self.ids[i]
+
+
+class SearchIndex:
+    """In-process inverted index over chapters, topics and hotspots with BM25 ranking.
+
+    Postings are kept per document kind and sorted by a precomputed,
+    byte-quantized BM25 impact, so top-k queries use the threshold algorithm
+    and stop as soon as no unseen document can enter the results instead of
+    scoring every match. Every write replaces the postings of the documents
+    it touches only. The last query term also matches as a prefix, for
+    search-as-you-type.
+
+    Like KeywordIndex, each worker keeps its own copy, loaded from the
+    database at startup and updated by its own writes; server.py re-reads
+    chapters that other workers write when the shared cache broadcasts
+    their invalidation. Loaded rows are posted in one sorted pass at the
+    end of the load, and writes made during it take precedence over the rows
+    it reads.
+    """
+
+    def __init__(self):
+        self._docs: Dict[DocKey, Document] = {}
+        self._postings: Dict[str, Dict[str, Postings]] = {kind: {} for kind in FIELDS}
+        self._df: Dict[str, int] = {}
+        # Vocabulary for prefix lookups: a sorted list plus recent additions; dead terms are skipped
+        self._terms: List[str] = []
+        self._new_terms: List[str] = []
+        self._children: Dict[str, Set[DocKey]] = {}  # chapter or topic id -> documents below it
+        self._total_length = 0
+        # Average document length the current impacts were computed with
+        self._norm_length = 0.0
+        self._written: Set[Tuple[str, str]] = set()
+        self.loading = False
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _impact(self, tf: int, length: int) -> int:
+        saturation = tf / (tf + K1 * (1 - B + B * length / self._norm_length))
+        return max(1, round(MAX_IMPACT * saturation))
+
+    def _post(self, document: Document):
+        postings = self._postings[document.kind]
+        for term, tf in document.terms.items():
+            impact = document.impacts[term] = self._impact(tf, document.length)
+            if term not in postings:
+                postings[term] = Postings()
+            postings[term].add(document.id, impact)
+
+    def _add(self, kind: str, doc_id: str, chapter_id: str, topic_id: Optional[str], row: Dict[str, Any],
+             post: bool = True):
+        self._remove((kind, doc_id))
+        names = FIELDS[kind]
+        fields = {name: row[name] for name in names if row.get(name)}
+        terms: Dict[str, int] = {}
+        for name, text in fields.items():
+            weight = TITLE_BOOST if name == names[0] else 1
+            for token in tokenize(text):
+                terms[token] = terms.get(token, 0) + weight
+        key = (kind, doc_id)
+        document = Document(kind, doc_id, chapter_id, topic_id, fields, terms, sum(terms.values()), {})
+        self._docs[key] = document
+        self._total_length += document.length
+        for term in terms:
+            if term not in self._df:
+                self._df[term] = 0
+                self._new_terms.append(term)
+            self._df[term] += 1
+        self._children.setdefault(chapter_id, set()).add(key)
+        if topic_id:
+            self._children.setdefault(topic_id, set()).add(key)
+
+        if post:
+            average = self._total_length / len(self._docs)
+            if not self._norm_length:
+                self._norm_length = average or 1.0
+            if not self.loading and not (1 / RENORMALIZE_DRIFT < average / self._norm_length < RENORMALIZE_DRIFT):
+                self._repost()
+            else:
+                self._post(document)
+
+    def _remove(self, key: DocKey):
+        document = self._docs.pop(key, None)
+        if document is None:
+            return
+        self._total_length -= document.length
+        postings = self._postings[document.kind]
+        for term, impact in document.impacts.items():
+            postings[term].remove(document.id, impact)
+            if not postings[term]:
+                del postings[term]
+        for term in document.terms:
+            self._df[term] -= 1
+            if not self._df[term]:
+                del self._df[term]
+        for parent in (document.chapter_id, document.topic_id):
+            siblings = self._children.get(parent)
+            if siblings is not None:
+                siblings.discard(key)
+                if not siblings:
+                    del self._children[parent]
+
+    def _repost(self):
+        """Recompute every impact against the current average length and rebuild sorted postings"""
+        self._norm_length = self._total_length / len(self._docs) if self._docs and self._total_length else 1.0
+        entries: Dict[str, Dict[str, List[Tuple[int, str]]]] = {kind: {} for kind in FIELDS}
+        for document in self._docs.values():
+            document.impacts.clear()
+            by_term = entries[document.kind]
+            for term, tf in document.terms.items():
+                impact = document.impacts[term] = self._impact(tf, document.length)
+                by_term.setdefault(term, []).append((MAX_IMPACT - impact, document.id))
+        for kind, by_term in entries.items():
+            postings = self._postings[kind] = {}
+            for term, pairs in by_term.items():
+                pairs.sort()
+                postings[term] = Postings()
+                postings[term].ranks = [rank for rank, _ in pairs]
+                postings[term].ids = [doc_id for _, doc_id in pairs]
+
+    def _mark(self, *keys: Tuple[str, str]):
+        if self.loading:
+            self._written.update(keys)
+
+    def set_chapter(self, row: Dict[str, Any]):
+        """Add a chapter row or replace its indexed fields"""
+        self._mark(("chapter", row["id"]))
+        self._add("chapter", row["id"], row["id"], None, row)
+
+    def set_topic(self, row: Dict[str, Any], chapter_id: str):
+        """Add a topic row or update the fields present in `row`, keeping the others"""
+        self._mark(("topic", row["id"]))
+        previous = self._docs.get(("topic", row["id"]))
+        merged = {**previous.fields, **row} if previous else row
+        self._add("topic", row["id"], chapter_id, None, merged)
+
+    def set_hotspot(self, row: Dict[str, Any], chapter_id: str):
+        self._mark(("hotspot", row["id"]))
+        self._add("hotspot", row["id"], chapter_id, row["topic_id"], row)
+
+    def replace_hotspots(self, topic_id: str, chapter_id: str, rows: Iterable[Dict[str, Any]]):
+        """Make the indexed hotspots of a topic match `rows`"""
+        self._mark(("hotspots", topic_id))
+        for key in [key for key in self._children.get(topic_id, ()) if key[0] == "hotspot"]:
+            self._remove(key)
+        for row in rows:
+            self._add("hotspot", row["id"], chapter_id, topic_id, {**row, "topic_id": topic_id})
+
+    def remove_chapter(self, chapter_id: str):
+        """Drop a chapter and everything below it"""
+        self._mark(("chapter", chapter_id))
+        for key in list(self._children.get(chapter_id, ())):
+            self._remove(key)
+
+    def begin_load(self):
+        self.loading = True
+        self._written.clear()
+
+    def load_chapters(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            if ("chapter", row["id"]) not in self._written:
+                self._add("chapter", row["id"], row["id"], None, row, post=False)
+
+    def load_topics(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            if ("topic", row["id"]) not in self._written and ("chapter", row["chapter_id"]) not in self._written:
+                self._add("topic", row["id"], row["chapter_id"], None, row, post=False)
+
+    def load_hotspots(self, rows: Iterable[Dict[str, Any]]):
+        """Add hotspot rows; load their topics first, hotspots of unknown topics are skipped"""
+        for row in rows:
+            topic = self._docs.get(("topic", row["topic_id"]))
+            if (topic is None or ("hotspot", row["id"]) in self._written
+                    or ("hotspots", row["topic_id"]) in self._written
+                    or ("chapter", topic.chapter_id) in self._written):
+                continue
+            self._add("hotspot", row["id"], topic.chapter_id, row["topic_id"], row, post=False)
+
+    def end_load(self, ok: bool = True):
+        """Post everything loaded; until then only documents written during the load are searchable"""
+        self.loading = False
+        self._written.clear()
+        self.ready = self.ready or ok
+        self._repost()
+        self._merge_terms()
+
+    def _merge_terms(self):
+        # Timsort merges the two sorted runs in linear time
+        self._new_terms.sort()
+        merged = sorted(self._terms + self._new_terms)
+        self._terms = [
+            term for i, term in enumerate(merged)
+            if term in self._df and (i == 0 or merged[i - 1] != term)
+        ]
+        self._new_terms = []
+
+    def _expand(self, prefix: str) -> List[str]:
+        if len(self._new_terms) > MAX_UNSORTED_TERMS:
+            self._merge_terms()
+        matches = set(term for term in self._new_terms if term.startswith(prefix))
+        for i in range(bisect_left(self._terms, prefix), len(self._terms)):
+            term = self._terms[i]
+            if not term.startswith(prefix):
+                break
+            matches.add(term)
+        matches = [term for term in matches if term in self._df]
+        if len(matches) > MAX_PREFIX_TERMS:
+            matches = heapq.nlargest(MAX_PREFIX_TERMS, matches, key=self._df.__getitem__)
+        return matches
+
+    def _top(self, kind: str, groups: List[List[Tuple[str, float]]], limit: int) -> List[Tuple[float, DocKey]]:
+        """Threshold algorithm over impact-ordered postings.
+
+        Walks all lists of the query in step, scoring each new document in
+        full, and stops once the k-th best score reaches the most an unseen
+        document could still get. Queries whose lists barely overlap would
+        walk far before that, so at most MAX_SCORED_DOCS documents are scored
+        and the best of those returned, highest impacts having come first.
+        """
+        postings = self._postings[kind]
+        lists = [(postings[term], weight, g) for g, group in enumerate(groups)
+                 for term, weight in group if term in postings]
+        docs = self._docs
+        heap: List[Tuple[float, DocKey]] = []
+        seen: Set[str] = set()
+        depth = 0
+        while len(seen) < MAX_SCORED_DOCS:
+            bounds = [0.0] * len(groups)
+            for entries, weight, g in lists:
+                if depth >= len(entries.ids):
+                    continue
+                bounds[g] = max(bounds[g], weight * (MAX_IMPACT - entries.ranks[depth]))
+                doc_id = entries.ids[depth]
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                score = group_score(docs[(kind, doc_id)].impacts, groups)
+                if len(heap) < limit:
+                    heapq.heappush(heap, (score, (kind, doc_id)))
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, (score, (kind, doc_id)))
+            threshold = sum(bounds)
+            if not threshold or (len(heap) >= limit and heap[0][0] >= threshold):
+                break
+            depth += 1
+        return heap
+
+    def search(self, query: str, limit: int = 20, kinds: Optional[Set[str]] = None,
+               chapter_id: Optional[str] = None, prefix: bool = True) -> List[Dict[str, Any]]:
+        """Top `limit` documents for `query` by BM25, with a snippet around the first match"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self._docs:
+            return []
+
+        # One group per query term; the last one also holds its prefix expansions, of which the best counts
+        alternatives = [[token] for token in tokens]
+        if prefix:
+            alternatives[-1] = list(dict.fromkeys([tokens[-1], *self._expand(tokens[-1])]))
+        count = len(self._docs)
+        groups = [
+            [(term, math.log(1 + (count - self._df[term] + 0.5) / (self._df[term] + 0.5)))
+             for term in group if term in self._df]
+            for group in alternatives
+        ]
+        groups = [group for group in groups if group]
+        kinds = [kind for kind in FIELDS if not kinds or kind in kinds]
+
+        if chapter_id:
+            # One chapter is small enough to score outright
+            scored = []
+            for key in self._children.get(chapter_id, ()):
+                score = group_score(self._docs[key].impacts, groups)
+                if key[0] in kinds and score:
+                    scored.append((score, key))
+        else:
+            scored = [hit for kind in kinds for hit in self._top(kind, groups, limit)]
+
+        matched = [term for group in groups for term, _ in group]
+        return [
+            self._result(self._docs[key], score * (K1 + 1) / MAX_IMPACT, matched)
+            for score, key in heapq.nlargest(limit, scored)
+        ]
+
+    def _result(self, document: Document, score: float, terms: List[str]) -> Dict[str, Any]:
+        title_field = FIELDS[document.kind][0]
+        return {
+            "type": document.kind,
+            "id": document.id,
+            "chapter_id": document.chapter_id,
+            "topic_id": document.topic_id,
+            "title": document.fields.get(title_field, ""),
+            "snippet": snippet(
+                document.fields.get(SNIPPET_FIELDS[document.kind]) or document.fields.get(title_field, ""),
+                [term for term in terms if term in document.terms]
+            ),
+            "score": round(score, 4)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"documents": len(self._docs), "terms": len(self._df), "ready": self.ready}
+
+
+def group_score(impacts: Dict[str, int], groups: List[List[Tuple[str, float]]]) -> float:
+    score = 0.0
+    for group in groups:
+        if len(group) == 1:
+            term, weight = group[0]
+            score += weight * impacts.get(term, 0)
+        else:
+            score += max(weight * impacts.get(term, 0) for term, weight in group)
+    return score
+
+
+def snippet(text: str, terms: List[str], width: int = SNIPPET_CHARS) -> str:
+    """About `width` characters of `text` around the first occurrence of any of `terms`"""
+    text = " ".join(text.split())
+    if len(text) <= width:
+        return text
+    start = 0
+    if terms:
+        match = re.search(r"\b(?:" + "|".join(map(re.escape, sorted(terms, key=len, reverse=True))) + r")",
+                          text, re.IGNORECASE)
+        if match:
+            start = max(0, min(match.start() - width // 4, len(text) - width))
+    # Widen to whole words
+    if start:
+        space = text.rfind(" ", 0, start)
+        start = space + 1 if space >= 0 else 0
+    end = start + width
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+    return ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
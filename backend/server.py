@@ -1,37 +1,89 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Query, Request, UploadFile
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, NamedTuple, Optional, Dict, Any, Set
+from concurrent.futures import ProcessPoolExecutor
 import uuid
 from datetime import datetime, timezone
 import httpx
 import asyncio
 import json
-from supabase import create_client, Client
+import mimetypes
+import multiprocessing
+import shutil
+import tempfile
+from storage import get_database
+from kei_client import get_kei_client
+from kei_scheduler import KeiScheduler, PRIORITY_BATCH, PRIORITY_INTERACTIVE, parse_model_limits
+from image_tasks import ImageTaskTracker, ImageStatusCache
+from image_cache import ImageResultCache, request_key
+from image_store import IMAGE_NAME_PATTERN, ImageStore, parse_range, snap_width
+from jobs import Job, JobRegistry
+from cache import LRUCache
+from chapter_cache import KEY_PREFIX as CHAPTER_KEY_PREFIX, ChapterCache
+from content_parser import ContentSource, Section, iter_sections
+from keyword_index import KeywordIndex
+from bulk_import import MAX_FILE_SIZE as MAX_IMPORT_FILE_SIZE, ImportReport, ParsedDocument, count_items, read_items, run_import
+from library_bundle import BUNDLE_MEDIA_TYPES, available_formats, export_bundle, is_bundle, restore_bundle
+from search_index import FIELDS as SEARCH_KINDS, SearchIndex
+from http_cache import FastJSONResponse, RenderedBody, conditional_json_response, encode_json, etag_matches
+from shared_cache import SQLiteSharedCache
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Gauge, MetricsMiddleware, RequestMetrics, cache_metrics, render
+from chapter_store import (
+    CHAPTER_COLUMNS, MAX_PARALLEL_CHUNKS, decode_cursor, list_chapters, load_chapter_trees, load_chapter,
+    insert_chapter_tree, insert_chapter_trees, scan_rows, select_in, sync_topic_children
+)
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Supabase connection
-SUPABASE_URL = os.environ.get('SUPABASE_URL')
-SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_KEY')
 CORS_ORIGINS = os.environ.get('CORS_ORIGINS')
-supabase: Client = None
-
-def get_supabase() -> Client:
-    global supabase
-    if supabase is None:
-        supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    return supabase
 
 # Kei.ai API configuration
 KEI_API_KEY = os.environ.get('KEI_API_KEY')
-KEI_API_BASE = "https://api.kie.ai/api/v1"
+
+# All createTask calls go through one queue: per-model concurrency caps,
+# a shared token bucket and jittered retries on 429/5xx
+kei_scheduler = KeiScheduler(
+    lambda payload: get_kei_client().create_task(payload),
+    rate=float(os.environ.get('KEI_RATE_LIMIT', '5')),
+    burst=float(os.environ.get('KEI_RATE_BURST', '10')),
+    model_concurrency=parse_model_limits(os.environ.get('KEI_MODEL_CONCURRENCY')),
+    default_concurrency=int(os.environ.get('KEI_DEFAULT_CONCURRENCY', '4')),
+    max_retries=int(os.environ.get('KEI_MAX_RETRIES', '4'))
+)
+
+# Cache tier shared by all workers on this host (SHARED_CACHE=none keeps caches per process);
+# point SHARED_CACHE_PATH at /dev/shm to keep it in memory
+shared_cache = None
+if os.environ.get('SHARED_CACHE', 'sqlite').lower() != 'none':
+    shared_cache = SQLiteSharedCache(
+        Path(os.environ.get('SHARED_CACHE_PATH', ROOT_DIR / '.cache' / 'shared-cache.sqlite3')),
+        poll_interval=float(os.environ.get('SHARED_CACHE_POLL_INTERVAL', '0.5'))
+    )
+
+# Background jobs (chapter illustration, ingest, import) and their progress; published to the
+# shared cache so any worker can answer GET /api/jobs/{id} (per worker with SHARED_CACHE=none)
+jobs = JobRegistry(shared=shared_cache)
+
+# Assembled chapter documents by id; every write handler invalidates what it touches
+chapter_cache = ChapterCache(
+    maxsize=int(os.environ.get('CHAPTER_CACHE_SIZE', '512')),
+    ttl=float(os.environ.get('CHAPTER_CACHE_TTL', '300')),
+    shared=shared_cache
+)
+
+# Keyword document frequencies across the library, ranking hotspot keywords of new content
+keyword_index = KeywordIndex()
+
+# Full-text index over chapters, topics and hotspots behind GET /api/search
+search_index = SearchIndex()
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -62,6 +114,7 @@ class ImageGenerationResponse(BaseModel):
     task_id: str
     status: str
     message: str
+    image_url: Optional[str] = None  # Set when the result is served from cache
 
 class TaskStatusResponse(BaseModel):
     task_id: str
@@ -122,6 +175,13 @@ class ChapterCreate(BaseModel):
 class ChapterFavoriteUpdate(BaseModel):
     favorite: bool
 
+class ChapterIllustrationRequest(BaseModel):
+    model: str = "nano-banana-pro"
+    aspect_ratio: str = "16:9"
+    output_format: str = "png"
+    overwrite: bool = False  # Also regenerate topics that already have an illustration
+    concurrency: int = Field(default=4, ge=1, le=16)
+
 class TopicUpdate(BaseModel):
     title: Optional[str] = None
     subtitle: Optional[str] = None
@@ -161,6 +221,68 @@ async def get_status_checks():
 
 # ============== Image Generation Endpoints ==============
 
+async def request_image(request: ImageGenerationRequest, priority: int = PRIORITY_INTERACTIVE) -> ImageGenerationResponse:
+    """Start an image generation, reusing a cached or in-flight result for the same request"""
+    
+    # Map model names to kie.ai model identifiers
+    model_mapping = {
+        "nano-banana-pro": "google/nano-banana",
+        "flux-kontext-pro": "flux-kontext-pro",
+        "flux-kontext-max": "flux-kontext-max",
+        "4o-image": "openai/gpt-image-1"
+    }
+    
+    model_id = model_mapping.get(request.model, "google/nano-banana")
+    
+    # Payload structure with nested input object as per kie.ai docs
+    payload = {
+        "model": model_id,
+        "input": {
+            "prompt": request.prompt,
+            "image_size": request.aspect_ratio,
+            "output_format": request.output_format
+        }
+    }
+    
+    # Identical requests reuse a finished image or join the task already generating it
+    cache_key = request_key(request.prompt, model_id, request.aspect_ratio, request.output_format)
+    cached = await image_results.lookup(cache_key)
+    if cached:
+        logger.info(f"Image cache hit for {cache_key[:12]}: task {cached['task_id']}")
+        return ImageGenerationResponse(
+            task_id=cached["task_id"],
+            status="completed",
+            image_url=cached["image_url"],
+            message="Image served from cache"
+        )
+    
+    async def start_task() -> str:
+        logger.info(f"Generating image with model {model_id}: {request.prompt[:100]}...")
+        logger.info(f"Payload: {payload}")
+        response = await kei_scheduler.submit(model_id, payload, priority=priority)
+        
+        logger.info(f"API Response status: {response.status_code}")
+        logger.info(f"API Response: {response.text[:500]}")
+        
+        if response.status_code != 200:
+            logger.error(f"Kei.ai API error: {response.text}")
+            raise HTTPException(status_code=response.status_code, detail=f"Image generation failed: {response.text}")
+        
+        result = response.json()
+        
+        if result.get("code") != 200:
+            raise HTTPException(status_code=500, detail=f"API error: {result.get('msg', 'Unknown error')}")
+        
+        return result.get("data", {}).get("taskId", "")
+    
+    task_id = await image_results.attach(cache_key, start_task)
+    image_tasks.track(task_id)
+    return ImageGenerationResponse(
+        task_id=task_id,
+        status="processing",
+        message="Image generation started"
+    )
+
 @api_router.post("/generate-image", response_model=ImageGenerationResponse)
 async def generate_image(request: ImageGenerationRequest):
     """Generate an image using Kei.ai API"""
@@ -168,65 +290,106 @@ async def generate_image(request: ImageGenerationRequest):
     if not KEI_API_KEY:
         raise HTTPException(status_code=500, detail="KEI_API_KEY not configured")
     
-    headers = {
-        "Authorization": f"Bearer {KEI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     try:
-        async with httpx.AsyncClient(timeout=60.0) as http_client:
-            # All models use the unified createTask endpoint
-            endpoint = f"{KEI_API_BASE}/jobs/createTask"
-            
-            # Map model names to kie.ai model identifiers
-            model_mapping = {
-                "nano-banana-pro": "google/nano-banana",
-                "flux-kontext-pro": "flux-kontext-pro",
-                "flux-kontext-max": "flux-kontext-max",
-                "4o-image": "openai/gpt-image-1"
-            }
+        return await request_image(request)
             
-            model_id = model_mapping.get(request.model, "google/nano-banana")
-            
-            # Payload structure with nested input object as per kie.ai docs
-            payload = {
-                "model": model_id,
-                "input": {
-                    "prompt": request.prompt,
-                    "image_size": request.aspect_ratio,
-                    "output_format": request.output_format
-                }
-            }
-            
-            logger.info(f"Generating image with model {model_id}: {request.prompt[:100]}...")
-            logger.info(f"Payload: {payload}")
-            response = await http_client.post(endpoint, json=payload, headers=headers)
-            
-            logger.info(f"API Response status: {response.status_code}")
-            logger.info(f"API Response: {response.text[:500]}")
-            
-            if response.status_code != 200:
-                logger.error(f"Kei.ai API error: {response.text}")
-                raise HTTPException(status_code=response.status_code, detail=f"Image generation failed: {response.text}")
-            
-            result = response.json()
-            
-            if result.get("code") == 200:
-                task_id = result.get("data", {}).get("taskId", "")
-                return ImageGenerationResponse(
-                    task_id=task_id,
-                    status="processing",
-                    message="Image generation started"
-                )
-            else:
-                raise HTTPException(status_code=500, detail=f"API error: {result.get('msg', 'Unknown error')}")
-                
     except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail="Request timeout")
     except Exception as e:
         logger.error(f"Image generation error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def fetch_image_status(task_id: str) -> Dict[str, Any]:
+    """Ask Kei.ai for the current state of an image generation task"""
+    
+    # Use the recordInfo endpoint for task status
+    response = await get_kei_client().record_info(task_id)
+    
+    logger.info(f"Status check response: {response.status_code} - {response.text[:500]}")
+    
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to get task status")
+    
+    result = response.json()
+    data = result.get("data", {})
+    
+    state = data.get("state", "unknown")
+    result_json = data.get("resultJson", "{}")
+    
+    # Parse resultJson to get image URLs
+    image_url = None
+    if state == "success" and result_json:
+        try:
+            import json
+            result_data = json.loads(result_json) if isinstance(result_json, str) else result_json
+            result_urls = result_data.get("resultUrls", [])
+            if result_urls:
+                image_url = result_urls[0]
+        except:
+            pass
+    
+    if image_url:
+        image_url = await mirror_image_url(image_url)
+    
+    # Map state to simpler status
+    status_mapping = {
+        "waiting": "processing",
+        "queuing": "processing",
+        "generating": "processing",
+        "success": "completed",
+        "fail": "failed"
+    }
+    
+    return TaskStatusResponse(
+        task_id=task_id,
+        status=status_mapping.get(state, state),
+        image_url=image_url,
+        message=f"Task state: {state}" + (f" - {data.get('failMsg', '')}" if state == "fail" else "")
+    ).model_dump()
+
+# Local copies of finished images, served from /api/images instead of the provider's CDN
+image_store = ImageStore(
+    Path(os.environ.get('IMAGE_STORE_DIR', ROOT_DIR / '.cache' / 'images')),
+    resize_workers=int(os.environ.get('IMAGE_RESIZE_WORKERS', '2'))
+)
+IMAGE_MIRROR = os.environ.get('IMAGE_MIRROR', 'true').lower() not in ('0', 'false', 'no')
+# Absolute URL of this API as browsers reach it: mirrored URLs are saved on topics and the
+# frontend loads them from its own origin, where a relative /api/images/... would not resolve
+PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', '').rstrip('/')
+
+def public_base_url() -> str:
+    """PUBLIC_BASE_URL, refusing to hand out relative image URLs when it is unset"""
+    if not PUBLIC_BASE_URL.startswith(('http://', 'https://')):
+        raise RuntimeError("PUBLIC_BASE_URL must be the absolute URL of the backend, e.g. https://api.example.com")
+    return PUBLIC_BASE_URL
+
+async def mirror_image_url(url: str) -> str:
+    """Return the URL of a local copy of `url`, or `url` itself if it cannot be mirrored"""
+    if not IMAGE_MIRROR:
+        return url
+    try:
+        name = await image_store.mirror(url)
+    except Exception as e:
+        logger.warning(f"Could not mirror {url}: {str(e)}")
+        return url
+    return f"{public_base_url()}/api/images/{name}"
+
+# Finished generations by normalized request, in memory and on disk
+image_results = ImageResultCache(
+    cache_dir=Path(os.environ.get('IMAGE_CACHE_DIR', ROOT_DIR / '.cache' / 'generated-images')),
+    ttl=float(os.environ.get('IMAGE_CACHE_TTL', 7 * 24 * 3600))
+)
+
+# Upstream lookups for one task are coalesced; final states are cached for good
+image_statuses = ImageStatusCache(
+    fetch_image_status,
+    ttl=float(os.environ.get('IMAGE_STATUS_TTL', '2')),
+    shared=shared_cache
+)
+
+# One background poller per outstanding task, shared by every client waiting on it
+image_tasks = ImageTaskTracker(image_statuses.refresh, on_finished=image_results.finish)
+
 @api_router.get("/image-status/{task_id}", response_model=TaskStatusResponse)
 async def get_image_status(task_id: str):
     """Check the status of an image generation task"""
@@ -234,60 +397,33 @@ async def get_image_status(task_id: str):
     if not KEI_API_KEY:
         raise HTTPException(status_code=500, detail="KEI_API_KEY not configured")
     
-    headers = {
-        "Authorization": f"Bearer {KEI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     try:
-        async with httpx.AsyncClient(timeout=30.0) as http_client:
-            # Use the recordInfo endpoint for task status
-            endpoint = f"{KEI_API_BASE}/jobs/recordInfo"
-            response = await http_client.get(endpoint, params={"taskId": task_id}, headers=headers)
-            
-            logger.info(f"Status check response: {response.status_code} - {response.text[:500]}")
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to get task status")
-            
-            result = response.json()
-            data = result.get("data", {})
-            
-            state = data.get("state", "unknown")
-            result_json = data.get("resultJson", "{}")
-            
-            # Parse resultJson to get image URLs
-            image_url = None
-            if state == "success" and result_json:
-                try:
-                    import json
-                    result_data = json.loads(result_json) if isinstance(result_json, str) else result_json
-                    result_urls = result_data.get("resultUrls", [])
-                    if result_urls:
-                        image_url = result_urls[0]
-                except:
-                    pass
-            
-            # Map state to simpler status
-            status_mapping = {
-                "waiting": "processing",
-                "queuing": "processing",
-                "generating": "processing",
-                "success": "completed",
-                "fail": "failed"
-            }
-            
-            return TaskStatusResponse(
-                task_id=task_id,
-                status=status_mapping.get(state, state),
-                image_url=image_url,
-                message=f"Task state: {state}" + (f" - {data.get('failMsg', '')}" if state == "fail" else "")
-            )
-            
+        return TaskStatusResponse(**await image_statuses.get(task_id))
+        
     except Exception as e:
         logger.error(f"Status check error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/image-status/{task_id}/events")
+async def stream_image_status(task_id: str):
+    """Push status changes of an image generation task as Server-Sent Events"""
+    
+    if not KEI_API_KEY:
+        raise HTTPException(status_code=500, detail="KEI_API_KEY not configured")
+    
+    async def event_stream():
+        async for status in image_tasks.subscribe(task_id, heartbeat=15.0):
+            if status is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(status)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/available-models")
 async def get_available_models():
     """Get list of available image generation models"""
@@ -324,173 +460,565 @@ async def get_available_models():
         ]
     }
 
+def serve_image_file(request: Request, path: Path, etag: str, media_type: str) -> Response:
+    """Serve an immutable file with a strong ETag, answering conditional and single-range requests"""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes"
+    }
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    size = path.stat().st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    
+    start, end = byte_range
+    
+    def read_range(chunk_size: int = 64 * 1024):
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(read_range(), status_code=206, media_type=media_type, headers=headers)
+
+@api_router.get("/images/{name}")
+async def get_image(name: str, request: Request, w: Optional[int] = Query(default=None, ge=1, le=4096)):
+    """Serve a mirrored illustration, optionally as a resized WebP variant (?w=640)"""
+    
+    if not IMAGE_NAME_PATTERN.match(name) or not image_store.original_path(name).exists():
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    digest = name.rsplit(".", 1)[0]
+    if w is None:
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        return serve_image_file(request, image_store.original_path(name), f'"{digest}"', media_type)
+    
+    width = snap_width(w)
+    try:
+        path = await image_store.variant(name, width)
+    except Exception as e:
+        logger.error(f"Resizing {name} to {width}px failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return serve_image_file(request, path, f'"{digest}-w{width}"', "image/webp")
+
+@api_router.get("/image-queue")
+async def get_image_queue():
+    """Queue depth and throughput counters of the outbound Kei.ai scheduler"""
+    return kei_scheduler.metrics()
+
+# Per-route latency, in-flight requests and storage round trips, filled in by MetricsMiddleware
+request_metrics = RequestMetrics()
+
+def scheduler_metrics():
+    """Metric families for the outbound Kei.ai scheduler"""
+    stats = kei_scheduler.metrics()
+    queued = Gauge("kei_queue_depth", "createTask calls waiting for a slot", ["priority"])
+    for priority in ("interactive", "batch"):
+        queued.set(stats["queued_by_priority"].get(priority, 0), priority)
+    running = Gauge("kei_running_tasks", "createTask calls in progress", ["model"])
+    for model, count in stats["running_by_model"].items():
+        running.set(count, model)
+    families = [queued, running]
+    for key, documentation in (
+        ("submitted", "createTask calls queued"),
+        ("dispatched", "createTask calls dispatched to a worker"),
+        ("retries", "createTask attempts retried after a 429, 5xx or network error"),
+        ("failures", "createTask calls that gave up")
+    ):
+        counter = Counter(f"kei_tasks_{key}_total", documentation)
+        counter.inc(amount=stats[key])
+        families.append(counter)
+    return families
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    families = [
+        *request_metrics.metrics(),
+        get_database().query_seconds,
+        get_kei_client().request_seconds,
+        *scheduler_metrics(),
+        *cache_metrics({
+            "chapters": chapter_cache.stats(),
+            "rendered_chapters": rendered_chapters.stats(),
+            "rendered_chapter_lists": rendered_chapter_lists.stats(),
+            "image_results": image_results.memory.stats(),
+            "image_statuses": image_statuses.recent.stats(),
+            "image_statuses_terminal": image_statuses.terminal.stats(),
+            "shared": shared_cache.stats() if shared_cache else None
+        })
+    ]
+    return Response(render(families), media_type=METRICS_CONTENT_TYPE)
+
+@api_router.get("/cache-stats")
+async def get_cache_stats():
+    """Size and hit/miss/eviction counters of the in-process caches"""
+    return {
+        "chapters": chapter_cache.stats(),
+        "image_results": image_results.memory.stats(),
+        "image_statuses": image_statuses.recent.stats(),
+        "image_statuses_terminal": image_statuses.terminal.stats(),
+        "shared": shared_cache.stats() if shared_cache else None,
+        "keyword_index": keyword_index.stats(),
+        "search_index": search_index.stats()
+    }
+
+# Largest page GET /api/search?limit= will return
+MAX_SEARCH_RESULTS = 100
+
+@api_router.get("/search")
+async def search_library(
+    q: str = Query(min_length=1, max_length=500),
+    limit: int = Query(default=20, ge=1, le=MAX_SEARCH_RESULTS),
+    types: Optional[str] = Query(default=None, alias="type"),
+    chapter_id: Optional[str] = None,
+    prefix: bool = True
+):
+    """Search chapter, topic and hotspot text; ?type=topic,hotspot narrows the kinds, ?chapter_id= one chapter"""
+    kinds = None
+    if types:
+        kinds = {t.strip() for t in types.split(",") if t.strip()}
+        unknown = kinds - set(SEARCH_KINDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(sorted(unknown))}")
+    
+    return {
+        "query": q,
+        "results": search_index.search(q, limit=limit, kinds=kinds, chapter_id=chapter_id, prefix=prefix),
+        # False while the index is still loading the library at startup
+        "complete": search_index.ready
+    }
+
 # ============== Chapter & Content Endpoints (Supabase) ==============
 
-@api_router.post("/chapters")
-async def create_chapter(chapter_data: ChapterCreate):
-    """Create a new chapter from raw content and save to Supabase"""
+class ChapterRows(NamedTuple):
+    chapter: Dict[str, Any]
+    topics: List[Dict[str, Any]]
+    hotspots: List[Dict[str, Any]]
+    document: Dict[str, Any]  # what the create endpoints return
+
+def build_chapter_rows(chapter_data: ChapterCreate, parsed_topics: List[Topic]) -> ChapterRows:
+    """Database rows and response document of a new chapter"""
+    chapter_id = str(uuid.uuid4())
+    
+    chapter_doc = {
+        "id": chapter_id,
+        "title": chapter_data.title,
+        "subject": chapter_data.subject,
+        "description": chapter_data.description or f"Interactive chapter about {chapter_data.title}",
+        "favorite": False
+    }
+    
+    # Build topic and hotspot rows up front so the tree is written in bulk
+    topic_docs = []
+    hotspot_docs = []
+    topics_with_ids = []
+    for idx, topic in enumerate(parsed_topics):
+        topic_docs.append({
+            "id": topic.id,
+            "chapter_id": chapter_id,
+            "title": topic.title,
+            "subtitle": topic.subtitle,
+            "content": topic.content,
+            "illustration": topic.illustration,
+            "illustration_prompt": topic.illustration_prompt,
+            "order_index": idx
+        })
+        
+        for hotspot in topic.hotspots:
+            hotspot_docs.append({
+                "id": hotspot.id,
+                "topic_id": topic.id,
+                "x": hotspot.x,
+                "y": hotspot.y,
+                "label": hotspot.label,
+                "icon": hotspot.icon,
+                "color": hotspot.color,
+                "title": hotspot.title,
+                "description": hotspot.description,
+                "fun_fact": hotspot.fun_fact
+            })
+        
+        topics_with_ids.append({
+            "id": topic.id,
+            "title": topic.title,
+            "subtitle": topic.subtitle,
+            "content": topic.content,
+            "illustration": topic.illustration,
+            "hotspots": [h.model_dump() for h in topic.hotspots],
+            "annotations": []
+        })
+    
+    return ChapterRows(chapter_doc, topic_docs, hotspot_docs, {
+        "id": chapter_id,
+        "title": chapter_data.title,
+        "subject": chapter_data.subject,
+        "description": chapter_data.description,
+        "favorite": False,
+        "topics": topics_with_ids,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+
+def index_chapter_rows(rows: ChapterRows):
+    chapter_id = rows.chapter["id"]
+    search_index.set_chapter(rows.chapter)
+    for topic in rows.topics:
+        keyword_index.set_topic(topic["id"], chapter_id, topic["content"])
+        search_index.set_topic(topic, chapter_id)
+    for hotspot in rows.hotspots:
+        search_index.set_hotspot(hotspot, chapter_id)
+
+async def save_chapter(db, chapter_data: ChapterCreate, parsed_topics: List[Topic]) -> Dict[str, Any]:
+    """Write a parsed chapter in bulk, update the caches and indexes, and return the chapter document"""
+    rows = build_chapter_rows(chapter_data, parsed_topics)
+    try:
+        await insert_chapter_tree(db, rows.chapter, rows.topics, rows.hotspots)
+    finally:
+        await chapter_cache.invalidate(rows.chapter["id"])
+    
+    index_chapter_rows(rows)
+    return rows.document
+
+async def save_chapter_batch(batch: List[ChapterRows]):
+    """Write many new chapters with one bulk insert per table"""
+    try:
+        await insert_chapter_trees(
+            get_database(),
+            [rows.chapter for rows in batch],
+            [topic for rows in batch for topic in rows.topics],
+            [hotspot for rows in batch for hotspot in rows.hotspots]
+        )
+    finally:
+        for rows in batch:
+            await chapter_cache.invalidate(rows.chapter["id"])
+    
+    for rows in batch:
+        index_chapter_rows(rows)
+
+async def ingest_chapter(job: Job, chapter_data: ChapterCreate) -> Dict[str, Any]:
+    """Parse, generate hotspots for and save an uploaded chapter, reporting progress per stage"""
+    
+    # Progress in characters scanned; the CPU-bound stages run off the event loop
+    job.set_stage("parsing", total=len(chapter_data.content))
+    
+    def parse() -> List[Section]:
+        sections = []
+        for section in iter_sections(chapter_data.content):
+            sections.append(section)
+            job.advance(count=len(section.title) + len(section.content))
+        return sections
+    
+    sections = await asyncio.to_thread(parse)
+    job.advance(count=job.total - job.completed)
+    
+    job.set_stage("generating", total=len(sections))
+    
+    def generate() -> List[Topic]:
+        topics = []
+        for section in sections:
+            topics.append(topic_from_section(section))
+            job.advance()
+        return topics
+    
+    topics = await asyncio.to_thread(generate)
     
+    job.set_stage("saving", total=1)
+    chapter = await save_chapter(get_database(), chapter_data, topics)
+    job.advance()
+    return chapter
+
+# Process pool for bulk import parsing, started on first use
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', os.cpu_count() or 2))
+# Chapters written per bulk insert during imports
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '50'))
+# Largest uncompressed file of a zip import; bigger files are reported as failures
+IMPORT_MAX_FILE_SIZE = int(os.environ.get('IMPORT_MAX_FILE_SIZE', MAX_IMPORT_FILE_SIZE))
+import_pool: Optional[ProcessPoolExecutor] = None
+
+def get_import_pool() -> ProcessPoolExecutor:
+    global import_pool
+    if import_pool is None:
+        # Not forked: the server process has live threads whose held locks a fork would copy
+        import_pool = ProcessPoolExecutor(max_workers=IMPORT_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return import_pool
+
+def build_imported_chapter(parsed: ParsedDocument) -> ChapterRows:
+    document = parsed.document
+    chapter_data = ChapterCreate(
+        title=document["title"],
+        subject=document["subject"],
+        description=document.get("description"),
+        content=""
+    )
+    topics = [topic_from_section(section, candidates) for section, candidates in parsed.sections]
+    return build_chapter_rows(chapter_data, topics)
+
+async def import_library(path: Path, job: Optional[Job] = None) -> Dict[str, Any]:
+    """Import every document of an NDJSON file or zip archive, or restore an export bundle; returns the report"""
+    if await asyncio.to_thread(is_bundle, path):
+        return await restore_library(path, job)
+    
+    report = ImportReport(total=await asyncio.to_thread(count_items, path))
+    if job:
+        job.set_stage("importing", total=report.total)
+    
+    def on_item(ok: bool):
+        if job:
+            job.advance(ok=ok)
+            job.result = report.to_dict()
+    
+    await run_import(
+        read_items(path, IMPORT_MAX_FILE_SIZE), get_import_pool(), build_imported_chapter, save_chapter_batch, report,
+        batch_size=IMPORT_BATCH_SIZE, max_pending=IMPORT_WORKERS * 2, on_item=on_item
+    )
+    logger.info(f"Imported {path.name}: {report.to_dict()}")
+    return report.to_dict()
+
+async def restore_library(path: Path, job: Optional[Job] = None) -> Dict[str, Any]:
+    """Restore a bundle written by GET /api/export; returns the restored row and image counts"""
+    base_url = public_base_url()
+    if job:
+        job.set_stage("restoring")
+    chapter_ids = set()
+    
+    async def on_rows(table: str, rows: List[Dict[str, Any]]):
+        if table == "chapters":
+            chapter_ids.update(row["id"] for row in rows)
+        if job:
+            job.advance(count=len(rows))
+    
+    counts = await restore_bundle(
+        path, get_database(), save_image=image_store.save_original,
+        image_url=lambda name: f"{base_url}/api/images/{name}", on_rows=on_rows
+    )
+    # Only once every table is written, so no reader caches a half-restored chapter
+    for chapter_id in chapter_ids:
+        await chapter_cache.invalidate(chapter_id)
+    if job:
+        job.set_stage("indexing")
+    await build_library_indexes()
+    logger.info(f"Restored {path.name}: {counts}")
+    return counts
+
+@api_router.post("/import", status_code=202)
+async def import_chapters(file: UploadFile):
+    """Bulk-import an NDJSON file (one ChapterCreate object per line) or a zip of .md/.txt files as a background job.
+
+    A bundle from GET /api/export is restored instead, keeping its ids.
+    """
+    
+    # The upload is spooled to a file of our own so the job outlives the request
+    fd, name = tempfile.mkstemp(prefix="import-", suffix=Path(file.filename or "").suffix)
+    path = Path(name)
+    try:
+        with os.fdopen(fd, "wb") as target:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, target)
+    except Exception as e:
+        path.unlink(missing_ok=True)
+        logger.error(f"Error receiving import: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def run(job: Job) -> Dict[str, Any]:
+        try:
+            return await import_library(path, job)
+        finally:
+            path.unlink(missing_ok=True)
+    
+    return (await jobs.submit("import", run)).to_dict()
+
+def stored_image_path(name: str) -> Optional[Path]:
+    path = image_store.original_path(name)
+    return path if path.exists() else None
+
+@api_router.get("/export")
+async def export_library(
+    bundle_format: str = Query(default="zip", alias="format"),
+    images: bool = Query(default=True)
+):
+    """Stream the whole library (and its mirrored illustrations) as a zip, tar.gz or tar.zst bundle"""
+    
+    if bundle_format not in available_formats():
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(available_formats())}")
+    
+    db = get_database()
     try:
-        sb = get_supabase()
+        # Fail before the response starts if the database cannot be reached
+        await db.execute(db.table("chapters").select("id").limit(1))
+    except Exception as e:
+        logger.error(f"Error exporting library: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def stream():
+        try:
+            async for chunk in export_bundle(db, bundle_format, stored_image_path if images else None):
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error exporting library: {str(e)}")
+            raise
+    
+    filename = f"library-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.{bundle_format}"
+    return StreamingResponse(
+        stream(),
+        media_type=BUNDLE_MEDIA_TYPES[bundle_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.post("/chapters", response_class=FastJSONResponse)
+async def create_chapter(chapter_data: ChapterCreate, run_async: bool = Query(default=False, alias="async")):
+    """Create a new chapter from raw content and save to Supabase; with ?async=true, return a job to poll instead"""
+    
+    if run_async:
+        job = await jobs.submit("ingest", lambda job: ingest_chapter(job, chapter_data))
+        return FastJSONResponse(job.to_dict(), status_code=202)
+    
+    try:
+        db = get_database()
         
         # Parse content into topics
         parsed_topics = parse_content_to_topics(chapter_data.content)
         
-        chapter_id = str(uuid.uuid4())
-        
-        # Insert chapter
-        chapter_doc = {
-            "id": chapter_id,
-            "title": chapter_data.title,
-            "subject": chapter_data.subject,
-            "description": chapter_data.description or f"Interactive chapter about {chapter_data.title}",
-            "favorite": False
-        }
-        
-        try:
-            result = sb.table("chapters").insert(chapter_doc).execute()
-        except Exception as insert_error:
-            error_message = str(insert_error)
-            if "favorite" in error_message.lower():
-                logger.warning("Favorite column missing in chapters table. Retrying insert without favorite.")
-                chapter_doc.pop("favorite", None)
-                result = sb.table("chapters").insert(chapter_doc).execute()
-            else:
-                raise
-        
-        if not result.data:
-            raise HTTPException(status_code=500, detail="Failed to create chapter")
-        
-        # Insert topics
-        topics_with_ids = []
-        for idx, topic in enumerate(parsed_topics):
-            topic_id = str(uuid.uuid4())
-            topic_doc = {
-                "id": topic_id,
-                "chapter_id": chapter_id,
-                "title": topic.title,
-                "subtitle": topic.subtitle,
-                "content": topic.content,
-                "illustration": topic.illustration,
-                "illustration_prompt": topic.illustration_prompt,
-                "order_index": idx
-            }
-            
-            topic_result = sb.table("topics").insert(topic_doc).execute()
-            
-            if topic_result.data:
-                # Insert hotspots for this topic
-                for hotspot in topic.hotspots:
-                    hotspot_doc = {
-                        "id": str(uuid.uuid4()),
-                        "topic_id": topic_id,
-                        "x": hotspot.x,
-                        "y": hotspot.y,
-                        "label": hotspot.label,
-                        "icon": hotspot.icon,
-                        "color": hotspot.color,
-                        "title": hotspot.title,
-                        "description": hotspot.description,
-                        "fun_fact": hotspot.fun_fact
-                    }
-                    sb.table("hotspots").insert(hotspot_doc).execute()
-                
-                topics_with_ids.append({
-                    "id": topic_id,
-                    "title": topic.title,
-                    "subtitle": topic.subtitle,
-                    "content": topic.content,
-                    "illustration": topic.illustration,
-                    "hotspots": [h.model_dump() for h in topic.hotspots],
-                    "annotations": []
-                })
-        
-        return {
-            "id": chapter_id,
-            "title": chapter_data.title,
-            "subject": chapter_data.subject,
-            "description": chapter_data.description,
-            "favorite": False,
-            "topics": topics_with_ids,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
+        return FastJSONResponse(await save_chapter(db, chapter_data, parsed_topics))
         
     except Exception as e:
         logger.error(f"Error creating chapter: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/chapters")
-async def get_chapters():
-    """Get all chapters from Supabase"""
+# Largest page GET /api/chapters?limit= will return
+MAX_CHAPTER_PAGE_SIZE = 200
+# Chapters assembled per round trip in ?stream=ndjson mode
+NDJSON_BATCH_SIZE = 20
+
+# Serialized chapter documents (and recent lists of them), reused while the cached document is unchanged
+rendered_chapters = LRUCache(maxsize=chapter_cache.docs.maxsize)
+rendered_chapter_lists = LRUCache(maxsize=32)
+
+def render_chapter(chapter: Dict[str, Any]) -> RenderedBody:
+    rendered = rendered_chapters.get(chapter["id"])
+    if rendered is None or rendered.source is not chapter:
+        rendered = RenderedBody.of(chapter)
+        rendered_chapters.set(chapter["id"], rendered)
+    return rendered
+
+def render_chapter_list(etag: str, parts: List[RenderedBody]) -> RenderedBody:
+    rendered = rendered_chapter_lists.get(etag)
+    if rendered is None:
+        rendered = RenderedBody.join(parts)
+        rendered_chapter_lists.set(etag, rendered)
+    return rendered
+
+@api_router.get("/chapters", response_class=FastJSONResponse)
+async def get_chapters(
+    request: Request,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_CHAPTER_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    view: str = Query(default="full", pattern="^(full|summary)$"),
+    fields: Optional[str] = None,
+    stream: Optional[str] = Query(default=None, pattern="^ndjson$")
+):
+    """Get chapters from Supabase, newest first; page with ?limit=&cursor=, trim with ?view=summary or ?fields=,
+    and stream one chapter per line with ?stream=ndjson"""
+    
+    # view=summary drops the topic subtree; fields= picks chapter columns, plus "topics" to keep it
+    requested = None
+    include_topics = view == "full"
+    if fields:
+        requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = set(requested) - set(CHAPTER_COLUMNS) - {"topics"}
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        include_topics = "topics" in requested
+    
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
     try:
-        sb = get_supabase()
+        db = get_database()
         
-        # Get all chapters
-        chapters_result = sb.table("chapters").select("*").order("created_at", desc=True).execute()
+        columns = [f for f in requested if f != "topics"] if requested else None
+        chapters, next_cursor = await list_chapters(db, columns, limit, after)
         
-        chapters = []
-        for ch in chapters_result.data or []:
-            # Get topics for this chapter
-            topics_result = sb.table("topics").select("*").eq("chapter_id", ch["id"]).order("order_index").execute()
-            
-            topics = []
-            for topic in topics_result.data or []:
-                # Get hotspots for this topic
-                hotspots_result = sb.table("hotspots").select("*").eq("topic_id", topic["id"]).execute()
-                
-                # Get annotations for this topic
-                annotations_result = sb.table("annotations").select("*").eq("topic_id", topic["id"]).execute()
-                
-                topics.append({
-                    **topic,
-                    "hotspots": hotspots_result.data or [],
-                    "annotations": annotations_result.data or []
-                })
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        full_documents = include_topics and not requested
+        
+        async def assemble(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            if full_documents:
+                # Cached trees are reused; the rest are fetched in bulk and stitched in memory
+                return await chapter_cache.get_many(rows, lambda rows: load_chapter_trees(db, rows))
+            if include_topics:
+                rows = await load_chapter_trees(db, rows)
+            if requested:
+                rows = [{f: ch[f] for f in requested if f in ch} for ch in rows]
+            return rows
+        
+        if stream:
+            async def lines():
+                try:
+                    for start in range(0, len(chapters), NDJSON_BATCH_SIZE):
+                        batch = await assemble(chapters[start:start + NDJSON_BATCH_SIZE])
+                        yield b"".join(
+                            (render_chapter(chapter).body if full_documents else encode_json(chapter)) + b"\n"
+                            for chapter in batch
+                        )
+                except Exception as e:
+                    # The status line is already sent; the client sees a truncated stream
+                    logger.error(f"Error streaming chapters: {str(e)}")
             
-            chapters.append({
-                **ch,
-                "topics": topics
-            })
+            return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
         
-        return chapters
+        chapters = await assemble(chapters)
+        
+        if full_documents:
+            # The list ETag comes from the per-chapter ones, so a 304 needs no serialization
+            parts = [render_chapter(chapter) for chapter in chapters]
+            etag = RenderedBody.list_etag(parts)
+            return conditional_json_response(request, etag, lambda: render_chapter_list(etag, parts), headers)
+        
+        rendered = RenderedBody.of(chapters)
+        return conditional_json_response(request, rendered.etag, lambda: rendered, headers)
         
     except Exception as e:
         logger.error(f"Error getting chapters: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/chapters/{chapter_id}")
-async def get_chapter(chapter_id: str):
+@api_router.get("/chapters/{chapter_id}", response_class=FastJSONResponse)
+async def get_chapter(chapter_id: str, request: Request):
     """Get a specific chapter from Supabase"""
     try:
-        sb = get_supabase()
+        db = get_database()
         
-        # Get chapter
-        chapter_result = sb.table("chapters").select("*").eq("id", chapter_id).single().execute()
+        # On a miss: chapter row and topics in parallel, then all hotspots/annotations in bulk
+        chapter = await chapter_cache.get(chapter_id, lambda chapter_id: load_chapter(db, chapter_id))
         
-        if not chapter_result.data:
+        if not chapter:
             raise HTTPException(status_code=404, detail="Chapter not found")
         
-        ch = chapter_result.data
-        
-        # Get topics
-        topics_result = sb.table("topics").select("*").eq("chapter_id", chapter_id).order("order_index").execute()
-        
-        topics = []
-        for topic in topics_result.data or []:
-            hotspots_result = sb.table("hotspots").select("*").eq("topic_id", topic["id"]).execute()
-            annotations_result = sb.table("annotations").select("*").eq("topic_id", topic["id"]).execute()
-            
-            topics.append({
-                **topic,
-                "hotspots": hotspots_result.data or [],
-                "annotations": annotations_result.data or []
-            })
-        
-        return {
-            **ch,
-            "topics": topics
-        }
+        rendered = render_chapter(chapter)
+        return conditional_json_response(request, rendered.etag, lambda: rendered)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting chapter: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -499,55 +1027,44 @@ async def get_chapter(chapter_id: str):
 async def update_topic(chapter_id: str, topic_id: str, topic_update: TopicUpdate):
     """Update a specific topic in Supabase"""
     try:
-        sb = get_supabase()
-        
-        update_data = topic_update.model_dump(exclude_unset=True)
+        db = get_database()
         
-        # Handle hotspots separately if provided
-        hotspots_data = update_data.pop("hotspots", None)
-        annotations_data = update_data.pop("annotations", None)
+        update_data = topic_update.model_dump(exclude_unset=True, exclude={"hotspots", "annotations"})
         
         if update_data:
             update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
-            sb.table("topics").update(update_data).eq("id", topic_id).execute()
+            result = await db.execute(db.table("topics").update(update_data).eq("id", topic_id))
+            # Index the whole updated row: the patch alone is a partial document when the topic is
+            # not indexed yet (the startup load is still running), and no row means no such topic
+            for row in result.data or []:
+                if "content" in update_data:
+                    keyword_index.set_topic(topic_id, row["chapter_id"], row["content"])
+                search_index.set_topic(row, row["chapter_id"])
         
-        # Update hotspots if provided
-        if hotspots_data is not None:
-            # Delete existing hotspots
-            sb.table("hotspots").delete().eq("topic_id", topic_id).execute()
-            
-            # Insert new hotspots
-            for hotspot in hotspots_data:
-                hotspot_doc = {
-                    "id": hotspot.get("id", str(uuid.uuid4())),
-                    "topic_id": topic_id,
-                    **{k: v for k, v in hotspot.items() if k != "id"}
-                }
-                sb.table("hotspots").insert(hotspot_doc).execute()
-        
-        # Update annotations if provided
-        if annotations_data is not None:
-            sb.table("annotations").delete().eq("topic_id", topic_id).execute()
-            
-            for annotation in annotations_data:
-                annotation_doc = {
-                    "id": annotation.get("id", str(uuid.uuid4())),
-                    "topic_id": topic_id,
-                    **{k: v for k, v in annotation.items() if k != "id"}
-                }
-                sb.table("annotations").insert(annotation_doc).execute()
+        # Diff hotspots/annotations against stored rows by id: one upsert, one delete
+        syncs = []
+        if topic_update.hotspots is not None:
+            syncs.append(sync_topic_children(db, "hotspots", topic_id, [h.model_dump() for h in topic_update.hotspots]))
+        if topic_update.annotations is not None:
+            syncs.append(sync_topic_children(db, "annotations", topic_id, [a.model_dump() for a in topic_update.annotations]))
+        await asyncio.gather(*syncs)
+        
+        if topic_update.hotspots is not None:
+            search_index.replace_hotspots(topic_id, chapter_id, [h.model_dump() for h in topic_update.hotspots])
         
         return {"message": "Topic updated successfully"}
         
     except Exception as e:
         logger.error(f"Error updating topic: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await chapter_cache.invalidate(chapter_id)
 
 @api_router.post("/chapters/{chapter_id}/topics/{topic_id}/hotspots")
 async def add_hotspot(chapter_id: str, topic_id: str, hotspot: Hotspot):
     """Add a hotspot to a topic in Supabase"""
     try:
-        sb = get_supabase()
+        db = get_database()
         
         hotspot_doc = {
             "id": hotspot.id,
@@ -562,19 +1079,22 @@ async def add_hotspot(chapter_id: str, topic_id: str, hotspot: Hotspot):
             "fun_fact": hotspot.fun_fact
         }
         
-        result = sb.table("hotspots").insert(hotspot_doc).execute()
+        result = await db.execute(db.table("hotspots").insert(hotspot_doc))
+        search_index.set_hotspot(hotspot_doc, chapter_id)
         
         return {"message": "Hotspot added", "hotspot": result.data[0] if result.data else hotspot_doc}
         
     except Exception as e:
         logger.error(f"Error adding hotspot: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await chapter_cache.invalidate(chapter_id)
 
 @api_router.post("/chapters/{chapter_id}/topics/{topic_id}/annotations")
 async def add_annotation(chapter_id: str, topic_id: str, annotation: Annotation):
     """Add an annotation to a topic in Supabase"""
     try:
-        sb = get_supabase()
+        db = get_database()
         
         annotation_doc = {
             "id": annotation.id,
@@ -591,41 +1111,47 @@ async def add_annotation(chapter_id: str, topic_id: str, annotation: Annotation)
             "end_y": annotation.end_y
         }
         
-        result = sb.table("annotations").insert(annotation_doc).execute()
+        result = await db.execute(db.table("annotations").insert(annotation_doc))
         
         return {"message": "Annotation added", "annotation": result.data[0] if result.data else annotation_doc}
         
     except Exception as e:
         logger.error(f"Error adding annotation: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await chapter_cache.invalidate(chapter_id)
 
 @api_router.delete("/chapters/{chapter_id}")
 async def delete_chapter(chapter_id: str):
     """Delete a chapter from Supabase (cascade deletes topics, hotspots, annotations)"""
     try:
-        sb = get_supabase()
+        db = get_database()
         
-        result = sb.table("chapters").delete().eq("id", chapter_id).execute()
+        result = await db.execute(db.table("chapters").delete().eq("id", chapter_id))
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Chapter not found")
         
+        keyword_index.remove_chapter(chapter_id)
+        search_index.remove_chapter(chapter_id)
         return {"message": "Chapter deleted"}
         
     except Exception as e:
         logger.error(f"Error deleting chapter: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await chapter_cache.invalidate(chapter_id)
 
 @api_router.put("/chapters/{chapter_id}/favorite")
 async def update_chapter_favorite(chapter_id: str, favorite_update: ChapterFavoriteUpdate):
     """Update the favorite status of a chapter"""
     try:
-        sb = get_supabase()
+        db = get_database()
         update_data = {
             "favorite": favorite_update.favorite,
             "updated_at": datetime.now(timezone.utc).isoformat()
         }
-        result = sb.table("chapters").update(update_data).eq("id", chapter_id).execute()
+        result = await db.execute(db.table("chapters").update(update_data).eq("id", chapter_id))
         if not result.data:
             raise HTTPException(status_code=404, detail="Chapter not found")
         return {"message": "Favorite updated", "favorite": favorite_update.favorite}
@@ -639,68 +1165,166 @@ async def update_chapter_favorite(chapter_id: str, favorite_update: ChapterFavor
             )
         logger.error(f"Error updating favorite: {error_message}")
         raise HTTPException(status_code=500, detail=error_message)
+    finally:
+        await chapter_cache.invalidate(chapter_id)
 
-def parse_content_to_topics(content: str) -> List[Topic]:
-    """Parse raw educational content into topics"""
-    topics = []
-    
-    # Split by markdown headers or double newlines
-    sections = content.split('\n## ')
-    
-    if len(sections) == 1:
-        # Try splitting by double newlines if no headers
-        sections = content.split('\n\n')
-    
-    for idx, section in enumerate(sections):
-        if not section.strip():
-            continue
-        
-        lines = section.strip().split('\n')
-        title = lines[0].replace('#', '').strip() or f"Topic {idx + 1}"
-        content_text = '\n'.join(lines[1:]).strip() if len(lines) > 1 else section.strip()
-        
-        # Extract keywords for potential hotspots
-        keywords = extract_keywords(content_text)
-        
-        # Create default hotspots from keywords
-        hotspots = []
-        for i, keyword in enumerate(keywords[:6]):  # Max 6 hotspots
-            hotspots.append(Hotspot(
-                x=15 + (i % 3) * 30,
-                y=20 + (i // 3) * 35,
-                label=keyword,
-                icon=get_icon_for_keyword(keyword),
-                color=get_color_for_index(i),
-                title=keyword,
-                description=f"Learn more about {keyword.lower()} and its role in this topic.",
-                fun_fact=None
-            ))
-        
-        topics.append(Topic(
-            title=title,
-            subtitle=f"Interactive Learning Content",
-            content=content_text,
-            hotspots=hotspots,
+# ============== Background Jobs ==============
+
+def build_illustration_prompt(chapter: Dict[str, Any], topic: Dict[str, Any]) -> str:
+    """Derive an image prompt for a topic without an illustration_prompt"""
+    summary = " ".join((topic.get("content") or "").split())[:200]
+    return (
+        f"Educational illustration for {topic['title']} ({chapter['title']}), {chapter['subject']} topic: {summary}. "
+        "Colorful and engaging visual style suitable for students, modern flat design with clear visual elements"
+    )
+
+async def wait_for_image(task_id: str) -> Dict[str, Any]:
+    """Wait for the tracker to report a terminal status for an image task"""
+    status = None
+    async for status in image_tasks.subscribe(task_id):
+        pass
+    return status
+
+async def illustrate_chapter(job: Job, chapter: Dict[str, Any], options: ChapterIllustrationRequest) -> Dict[str, Any]:
+    """Generate illustrations for a chapter's topics and store the URLs on the topics that still exist"""
+    topics = [topic for topic in chapter["topics"] if options.overwrite or not topic.get("illustration")]
+    job.set_stage("generating", total=len(topics))
+    
+    semaphore = asyncio.Semaphore(options.concurrency)
+    illustrated: Dict[str, Dict[str, str]] = {}
+    failures: Dict[str, str] = {}
+    
+    async def illustrate(topic: Dict[str, Any]):
+        prompt = topic.get("illustration_prompt") or build_illustration_prompt(chapter, topic)
+        try:
+            async with semaphore:
+                started = await request_image(ImageGenerationRequest(
+                    prompt=prompt,
+                    model=options.model,
+                    aspect_ratio=options.aspect_ratio,
+                    output_format=options.output_format
+                ), priority=PRIORITY_BATCH)
+                status = started.model_dump() if started.image_url else await wait_for_image(started.task_id)
+            
+            if status["status"] != "completed" or not status.get("image_url"):
+                raise RuntimeError(status.get("message") or "Image generation failed")
+            
+            illustrated[topic["id"]] = {"illustration": status["image_url"], "illustration_prompt": prompt}
+            job.advance()
+        except Exception as e:
+            logger.warning(f"Illustrating topic {topic['id']} failed: {str(e)}")
+            failures[topic["id"]] = str(e)
+            job.advance(ok=False)
+    
+    await asyncio.gather(*(illustrate(topic) for topic in topics))
+    
+    job.set_stage("saving")
+    db = get_database()
+    updated_at = datetime.now(timezone.utc).isoformat()
+    # One request per topic, so a large chapter does not take over the storage executor
+    save_slots = asyncio.Semaphore(MAX_PARALLEL_CHUNKS)
+    
+    async def save(topic_id: str, item: Dict[str, str]) -> bool:
+        # Only the generated fields: generation takes minutes, during which the topic may be
+        # edited, or deleted with its chapter (then the update matches nothing and is skipped)
+        async with save_slots:
+            result = await db.execute(db.table("topics").update({**item, "updated_at": updated_at}).eq("id", topic_id))
+        return bool(result.data)
+    
+    try:
+        saved = await asyncio.gather(*(save(topic_id, item) for topic_id, item in illustrated.items()))
+    finally:
+        await chapter_cache.invalidate(chapter["id"])
+    
+    return {
+        "chapter_id": chapter["id"],
+        "illustrations": {
+            topic_id: item["illustration"] for (topic_id, item), ok in zip(illustrated.items(), saved) if ok
+        },
+        "failures": failures,
+        "deleted": [topic_id for topic_id, ok in zip(illustrated, saved) if not ok]
+    }
+
+@api_router.post("/chapters/{chapter_id}/illustrate", status_code=202)
+async def illustrate_chapter_topics(chapter_id: str, options: Optional[ChapterIllustrationRequest] = None):
+    """Start a background job that illustrates every topic of a chapter"""
+    
+    if not KEI_API_KEY:
+        raise HTTPException(status_code=500, detail="KEI_API_KEY not configured")
+    
+    try:
+        db = get_database()
+        chapter = await chapter_cache.get(chapter_id, lambda chapter_id: load_chapter(db, chapter_id))
+        
+        if not chapter:
+            raise HTTPException(status_code=404, detail="Chapter not found")
+        
+        options = options or ChapterIllustrationRequest()
+        job = await jobs.submit("illustrate", lambda job: illustrate_chapter(job, chapter, options))
+        return job.to_dict()
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting illustration job: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the progress of a background job, whichever worker runs it"""
+    try:
+        job = await jobs.lookup(job_id)
+    except Exception as e:
+        logger.error(f"Error getting job: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def topic_from_section(section: Section, candidates: Optional[List[str]] = None) -> Topic:
+    """Turn a scanned section into a topic with default hotspots; pass its candidate_keywords if already known"""
+    if section.introduction:
+        return Topic(
+            title="Introduction",
+            subtitle="Getting Started",
+            content=section.content,
+            hotspots=[],
             annotations=[]
+        )
+    
+    # Keywords for potential hotspots, most specific to this section first
+    keywords = keyword_index.rank(section.content) if candidates is None else keyword_index.rank_candidates(candidates)
+    
+    # Create default hotspots from keywords
+    hotspots = []
+    for i, keyword in enumerate(keywords[:6]):  # Max 6 hotspots
+        hotspots.append(Hotspot(
+            x=15 + (i % 3) * 30,
+            y=20 + (i // 3) * 35,
+            label=keyword,
+            icon=get_icon_for_keyword(keyword),
+            color=get_color_for_index(i),
+            title=keyword,
+            description=f"Learn more about {keyword.lower()} and its role in this topic.",
+            fun_fact=None
         ))
     
-    return topics if topics else [Topic(
-        title="Introduction",
-        subtitle="Getting Started",
-        content=content,
-        hotspots=[],
+    return Topic(
+        title=section.title,
+        subtitle=f"Interactive Learning Content",
+        content=section.content,
+        hotspots=hotspots,
         annotations=[]
-    )]
-
-def extract_keywords(text: str) -> List[str]:
-    """Extract important keywords from text"""
-    import re
-    # Find capitalized words (potential important terms)
-    words = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', text)
-    # Remove common words
-    common = {'The', 'This', 'That', 'These', 'Those', 'When', 'Where', 'What', 'How', 'Why'}
-    keywords = [w for w in words if w not in common]
-    return list(dict.fromkeys(keywords))[:10]  # Unique, max 10
+    )
+
+def iter_topics(source: ContentSource) -> Iterator[Topic]:
+    """Yield topics from raw content (a string, path, text stream or chunks) as sections are scanned"""
+    for section in iter_sections(source):
+        yield topic_from_section(section)
+
+def parse_content_to_topics(content: ContentSource) -> List[Topic]:
+    """Parse raw educational content into topics"""
+    return list(iter_topics(content))
 
 def get_icon_for_keyword(keyword: str) -> str:
     """Get an appropriate icon for a keyword"""
@@ -721,8 +1345,12 @@ app.add_middleware(
     allow_origins=CORS_ORIGINS.split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Disposition"],
 )
 
+# Added last so it wraps CORS too and times every request end to end
+app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -730,6 +1358,94 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def build_library_indexes():
+    """Load the stored library into the keyword and search indexes, page by page"""
+    db = get_database()
+    keyword_index.begin_load()
+    search_index.begin_load()
+    ok = False
+    try:
+        async for rows in scan_rows(db, "chapters", "id,title,description"):
+            search_index.load_chapters(rows)
+        # Topics before hotspots, which find their chapter through them
+        async for rows in scan_rows(db, "topics", "id,chapter_id,title,subtitle,content"):
+            keyword_index.load(rows)
+            search_index.load_topics(rows)
+        async for rows in scan_rows(db, "hotspots", "id,topic_id,title,description,fun_fact"):
+            search_index.load_hotspots(rows)
+        ok = True
+        logger.info(f"Library indexes built: keywords {keyword_index.stats()}, search {search_index.stats()}")
+    except Exception as e:
+        logger.warning(f"Could not build library indexes: {str(e)}")
+    finally:
+        keyword_index.end_load(ok)
+        search_index.end_load(ok)
+
+# Chapters other workers wrote since this one loaded its indexes, waiting to be re-read
+stale_indexed_chapters: Set[str] = set()
+index_refresh: Optional[asyncio.Task] = None
+
+async def refresh_library_indexes():
+    """Re-read chapters written by other workers into the keyword and search indexes"""
+    db = get_database()
+    while stale_indexed_chapters:
+        chapter_ids = list(stale_indexed_chapters)
+        stale_indexed_chapters.clear()
+        try:
+            chapters = await load_chapter_trees(db, await select_in(db, "chapters", "id", chapter_ids))
+        except Exception as e:
+            # Retried with the next invalidation that arrives
+            stale_indexed_chapters.update(chapter_ids)
+            logger.warning(f"Could not refresh library indexes: {str(e)}")
+            return
+        for chapter_id in chapter_ids:
+            keyword_index.remove_chapter(chapter_id)
+            search_index.remove_chapter(chapter_id)
+        for chapter in chapters:
+            search_index.set_chapter(chapter)
+            for topic in chapter["topics"]:
+                keyword_index.set_topic(topic["id"], chapter["id"], topic["content"])
+                search_index.set_topic(topic, chapter["id"])
+                search_index.replace_hotspots(topic["id"], chapter["id"], topic["hotspots"])
+
+def on_shared_invalidation(key: str):
+    # Every chapter write invalidates the chapter's cache entry, which the shared cache broadcasts
+    global index_refresh
+    if not key.startswith(CHAPTER_KEY_PREFIX):
+        return
+    stale_indexed_chapters.add(key[len(CHAPTER_KEY_PREFIX):])
+    if index_refresh is None or index_refresh.done():
+        index_refresh = asyncio.create_task(refresh_library_indexes())
+
+if shared_cache:
+    shared_cache.subscribe(on_shared_invalidation)
+
+@app.on_event("startup")
+async def check_public_base_url():
+    # Fail now rather than after the first generation has saved an unusable URL
+    if IMAGE_MIRROR:
+        public_base_url()
+
+@app.on_event("startup")
+async def start_shared_cache():
+    if shared_cache:
+        await shared_cache.start()
+
+@app.on_event("startup")
+async def start_library_indexes():
+    # Until the load finishes, hotspots rank by per-section frequency and search sees only new writes
+    jobs.start("library-indexes", lambda job: build_library_indexes())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await jobs.aclose()
+    if index_refresh:
+        index_refresh.cancel()
+    if import_pool:
+        import_pool.shutdown(wait=False, cancel_futures=True)
+    get_database().close()
+    await image_tasks.aclose()
+    await get_kei_client().aclose()
+    await image_store.aclose()
+    if shared_cache:
+        await shared_cache.aclose()
\ No newline at end of file
@@ -0,0 +1,258 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+InvalidationCallback = Callable[[str], None]
+
+# Keys per SELECT ... IN (...), under SQLite's default limit of 999 bound variables
+LOOKUP_CHUNK_SIZE = 500
+
+
+class SharedCache(ABC):
+    """Cache tier shared by every worker process on a host.
+
+    Values are JSON documents. invalidate() removes keys and broadcasts
+    them; each process polls the broadcast log and passes keys invalidated
+    by other processes to its subscribers so they can drop local copies.
+    lookup() also returns the current log position, and store() with
+    `since` set skips keys invalidated after that position, so a read that
+    raced a write cannot publish the pre-write value.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self._subscribers: List[InvalidationCallback] = []
+
+    def subscribe(self, callback: InvalidationCallback):
+        self._subscribers.append(callback)
+
+    def _notify(self, keys: Iterable[str]):
+        for key in keys:
+            for callback in self._subscribers:
+                try:
+                    callback(key)
+                except Exception as e:
+                    logger.error(f"Shared cache invalidation callback failed for {key}: {str(e)}")
+
+    @abstractmethod
+    async def lookup(self, keys: List[str]) -> Tuple[Dict[str, Any], int]:
+        """Return the live values among `keys` and the current invalidation log position"""
+
+    @abstractmethod
+    async def store(self, items: Dict[str, Any], ttl: Optional[float] = None, since: Optional[int] = None) -> int:
+        """Store values, skipping keys invalidated after log position `since`; returns how many were stored"""
+
+    @abstractmethod
+    async def invalidate(self, keys: List[str]):
+        """Remove keys here and in every other worker's local copies"""
+
+    async def start(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class SQLiteSharedCache(SharedCache):
+    """SharedCache in one SQLite file (WAL mode), ideally on /dev/shm.
+
+    Every worker opens the same file. Invalidations are appended to a log
+    table that each worker polls every `poll_interval` seconds; expired
+    entries and old log rows are pruned as part of polling.
+    """
+
+    def __init__(self, path: Path, poll_interval: float = 0.5, maxsize: int = 10000,
+                 log_retention: float = 3600.0):
+        super().__init__()
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self.maxsize = maxsize
+        self.log_retention = log_retention
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._poller: Optional[asyncio.Task] = None
+        self._polls = 0
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.rejected = 0
+        self.invalidations_sent = 0
+        self.invalidations_received = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing a cache on power failure is fine
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS invalidations (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT NOT NULL,
+                    origin TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_invalidations_key_seq ON invalidations(key, seq);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            return fn(self._connect())
+
+    @staticmethod
+    def _position(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()[0]
+
+    def _lookup(self, conn: sqlite3.Connection, keys: List[str]) -> Tuple[Dict[str, Any], int]:
+        now = time.time()
+        found: Dict[str, Any] = {}
+        for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, value FROM entries WHERE key IN ({placeholders}) AND (expires_at IS NULL OR expires_at > ?)",
+                [*chunk, now]
+            ).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+        return found, self._position(conn)
+
+    def _store(self, conn: sqlite3.Connection, items: Dict[str, Any], ttl: Optional[float], since: Optional[int]) -> int:
+        expires_at = time.time() + ttl if ttl is not None else None
+        stored = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, value in items.items():
+                cursor = conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at) SELECT ?, ?, ? "
+                    "WHERE NOT EXISTS (SELECT 1 FROM invalidations WHERE key = ? AND seq > ?)",
+                    (key, json.dumps(value), expires_at, key, since if since is not None else 2 ** 62)
+                )
+                stored += cursor.rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return stored
+
+    def _invalidate(self, conn: sqlite3.Connection, keys: List[str]):
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+            conn.executemany(
+                "INSERT INTO invalidations (key, origin, created_at) VALUES (?, ?, ?)",
+                [(key, self.origin, now) for key in keys]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _read_log(self, conn: sqlite3.Connection) -> List[str]:
+        rows = conn.execute(
+            "SELECT seq, key, origin FROM invalidations WHERE seq > ? ORDER BY seq", (self._last_seq,)
+        ).fetchall()
+        if rows:
+            self._last_seq = rows[-1][0]
+        return [key for _, key, origin in rows if origin != self.origin]
+
+    def _prune(self, conn: sqlite3.Connection):
+        now = time.time()
+        conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        conn.execute("DELETE FROM invalidations WHERE created_at < ?", (now - self.log_retention,))
+        # Replaced rows get a new rowid, so the lowest rowids are the least recently written
+        conn.execute(
+            "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY rowid "
+            "LIMIT MAX(0, (SELECT COUNT(*) FROM entries) - ?))",
+            (self.maxsize,)
+        )
+
+    async def lookup(self, keys: List[str]) -> Tuple[Dict[str, Any], int]:
+        if not keys:
+            return {}, await asyncio.to_thread(self._run, self._position)
+        found, position = await asyncio.to_thread(self._run, lambda conn: self._lookup(conn, keys))
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found, position
+
+    async def store(self, items: Dict[str, Any], ttl: Optional[float] = None, since: Optional[int] = None) -> int:
+        if not items:
+            return 0
+        stored = await asyncio.to_thread(self._run, lambda conn: self._store(conn, items, ttl, since))
+        self.stored += stored
+        self.rejected += len(items) - stored
+        return stored
+
+    async def invalidate(self, keys: List[str]):
+        if not keys:
+            return
+        await asyncio.to_thread(self._run, lambda conn: self._invalidate(conn, keys))
+        self.invalidations_sent += len(keys)
+
+    async def poll(self):
+        """Deliver invalidations from other workers to subscribers"""
+        keys = await asyncio.to_thread(self._run, self._read_log)
+        self.invalidations_received += len(keys)
+        self._notify(keys)
+        self._polls += 1
+        if self._polls % 120 == 0:
+            await asyncio.to_thread(self._run, self._prune)
+
+    async def _poll_forever(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning(f"Shared cache poll failed: {str(e)}")
+
+    async def start(self):
+        """Skip past existing log entries and start polling for new ones"""
+        self._last_seq = await asyncio.to_thread(self._run, self._position)
+        if self._poller is None:
+            self._poller = asyncio.create_task(self._poll_forever())
+
+    async def aclose(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "sqlite",
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "stored": self.stored,
+            "rejected": self.rejected,
+            "invalidations_sent": self.invalidations_sent,
+            "invalidations_received": self.invalidations_received
+        }
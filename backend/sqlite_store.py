@@ -0,0 +1,398 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import sqlite3
+import threading
+import uuid
+
+from chapter_store import CHAPTER_TREE_RPC
+from storage import QueryResult, StorageBackend
+
+# RETURNING, which every write relies on, arrived in SQLite 3.35
+MIN_SQLITE_VERSION = (3, 35, 0)
+# Bound parameters per statement (SQLITE_MAX_VARIABLE_NUMBER since 3.32)
+MAX_VARIABLES = 32766
+# Seconds a writer waits for another connection's write lock before failing
+BUSY_TIMEOUT = 5.0
+
+TABLES = ("chapters", "topics", "hotspots", "annotations")
+
+# CREATE_TABLES_SQL in SQLite terms: uuids are TEXT generated by the caller,
+# timestamps are ISO 8601 TEXT in UTC, which sorts chronologically
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chapters (
+    id TEXT PRIMARY KEY NOT NULL,
+    title TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    description TEXT,
+    favorite BOOLEAN DEFAULT FALSE,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS topics (
+    id TEXT PRIMARY KEY NOT NULL,
+    chapter_id TEXT REFERENCES chapters(id) ON DELETE CASCADE,
+    title TEXT NOT NULL,
+    subtitle TEXT,
+    content TEXT,
+    illustration TEXT,
+    illustration_prompt TEXT,
+    order_index INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS hotspots (
+    id TEXT PRIMARY KEY NOT NULL,
+    topic_id TEXT REFERENCES topics(id) ON DELETE CASCADE,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    label TEXT NOT NULL,
+    icon TEXT DEFAULT 'sparkles',
+    color TEXT DEFAULT 'primary',
+    title TEXT NOT NULL,
+    description TEXT,
+    fun_fact TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS annotations (
+    id TEXT PRIMARY KEY NOT NULL,
+    topic_id TEXT REFERENCES topics(id) ON DELETE CASCADE,
+    type TEXT NOT NULL,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    width REAL,
+    height REAL,
+    rotation REAL DEFAULT 0,
+    text TEXT,
+    color TEXT DEFAULT 'primary',
+    end_x REAL,
+    end_y REAL,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_chapters_created_at_id ON chapters(created_at DESC, id DESC);
+-- Also serves the order_index sort of a chapter's topics
+CREATE INDEX IF NOT EXISTS idx_topics_chapter_id_order ON topics(chapter_id, order_index);
+CREATE INDEX IF NOT EXISTS idx_hotspots_topic_id ON hotspots(topic_id);
+CREATE INDEX IF NOT EXISTS idx_annotations_topic_id ON annotations(topic_id);
+"""
+
+FILTER_OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class SQLiteError(Exception):
+    """Query error carrying the PostgREST/Postgres code of its Supabase counterpart"""
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[None]:
+    # IMMEDIATE takes the write lock up front, so concurrent writers wait on busy_timeout instead of deadlocking
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text):
+        if ch == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+class SQLiteQuery:
+    """Request builder over one table, compiled to a single SQL statement by execute()"""
+
+    def __init__(self, db: "SQLiteDatabase", table: str):
+        if table not in db.columns:
+            raise SQLiteError(f'relation "{table}" does not exist', code="42P01")
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.columns: Optional[List[str]] = None
+        self.payload: Any = None
+        self.on_conflict = "id"
+        self.conditions: List[str] = []
+        self.params: List[Any] = []
+        self.order_by: List[str] = []
+        self.row_limit: Optional[int] = None
+
+    def _column(self, name: str) -> str:
+        name = name.strip()
+        if name not in self.db.columns[self.table]:
+            raise SQLiteError(f"column {self.table}.{name} does not exist", code="42703")
+        return name
+
+    def select(self, *columns: str):
+        self.op = "select"
+        names = ",".join(columns).split(",") if columns else ["*"]
+        self.columns = None if names == ["*"] else [self._column(name) for name in names]
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload if isinstance(payload, list) else [payload]
+        return self
+
+    def upsert(self, payload, on_conflict: str = "id"):
+        self.op, self.payload = "upsert", payload if isinstance(payload, list) else [payload]
+        self.on_conflict = self._column(on_conflict)
+        return self
+
+    def update(self, payload: Dict[str, Any]):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def _compare(self, column: str, operator: str, value: Any):
+        self.conditions.append(f"{self._column(column)} {FILTER_OPERATORS[operator]} ?")
+        self.params.append(value)
+        return self
+
+    def eq(self, column: str, value: Any):
+        return self._compare(column, "eq", value)
+
+    def gt(self, column: str, value: Any):
+        return self._compare(column, "gt", value)
+
+    def lt(self, column: str, value: Any):
+        return self._compare(column, "lt", value)
+
+    def in_(self, column: str, values: List[Any]):
+        values = list(values)
+        if values:
+            self.conditions.append(f"{self._column(column)} IN ({', '.join('?' * len(values))})")
+            self.params.extend(values)
+        else:
+            self.conditions.append("0")
+        return self
+
+    def _compile_condition(self, text: str) -> Tuple[str, List[Any]]:
+        text = text.strip()
+        for keyword in ("and", "or"):
+            if text.startswith(f"{keyword}(") and text.endswith(")"):
+                parts = [self._compile_condition(part) for part in _split_top_level(text[len(keyword) + 1:-1])]
+                sql = f" {keyword.upper()} ".join(part_sql for part_sql, _ in parts)
+                return f"({sql})", [param for _, part_params in parts for param in part_params]
+        column, operator, value = text.split(".", 2)
+        if operator not in FILTER_OPERATORS:
+            raise SQLiteError(f"Unsupported filter operator: {operator}", code="PGRST100")
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        return f"{self._column(column)} {FILTER_OPERATORS[operator]} ?", [value]
+
+    def or_(self, filters: str):
+        """PostgREST logic tree, e.g. `a.lt.1,and(a.eq.1,b.lt.2)`"""
+        sql, params = self._compile_condition(f"or({filters})")
+        self.conditions.append(sql)
+        self.params.extend(params)
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        # SQLite's own NULL placement, so the sort can walk an index
+        self.order_by.append(f"{self._column(column)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+
+    def _where(self) -> str:
+        return f" WHERE {' AND '.join(self.conditions)}" if self.conditions else ""
+
+    def execute(self) -> QueryResult:
+        conn = self.db.connection()
+
+        if self.op == "select":
+            sql = f"SELECT {', '.join(self.columns) if self.columns else '*'} FROM {self.table}{self._where()}"
+            params = list(self.params)
+            if self.order_by:
+                sql += f" ORDER BY {', '.join(self.order_by)}"
+            if self.row_limit is not None:
+                sql += " LIMIT ?"
+                params.append(self.row_limit)
+            return QueryResult(self.db.fetch(conn, self.table, sql, params))
+
+        if self.op in ("insert", "upsert"):
+            with _transaction(conn):
+                return QueryResult(self.db.write_rows(
+                    conn, self.table, self.payload, on_conflict=self.on_conflict if self.op == "upsert" else None
+                ))
+
+        if self.op == "update":
+            columns = [self._column(name) for name in self.payload]
+            sql = f"UPDATE {self.table} SET {', '.join(f'{name} = ?' for name in columns)}{self._where()} RETURNING *"
+            params = [self.payload[name] for name in columns] + self.params
+        else:
+            sql = f"DELETE FROM {self.table}{self._where()} RETURNING *"
+            params = self.params
+        # A single statement is atomic on its own, cascades included
+        return QueryResult(self.db.fetch(conn, self.table, sql, params))
+
+
+class SQLiteCall:
+    """rpc() builder: runs one of FUNCTIONS in a transaction"""
+
+    op = "rpc"
+
+    def __init__(self, db: "SQLiteDatabase", fn: str, params: Dict[str, Any]):
+        self.db = db
+        self.fn = fn
+        self.params = params
+
+    @property
+    def table(self) -> str:
+        # Functions are labelled like tables in the storage metrics
+        return self.fn
+
+    def execute(self) -> QueryResult:
+        function = FUNCTIONS.get(self.fn)
+        if function is None:
+            # Same code PostgREST answers with, so callers that fall back on missing functions work unchanged
+            raise SQLiteError(f"Could not find the function public.{self.fn}", code="PGRST202")
+        conn = self.db.connection()
+        with _transaction(conn):
+            return QueryResult(function(self.db, conn, **self.params))
+
+
+def _create_chapter_tree(db: "SQLiteDatabase", conn: sqlite3.Connection, chapter: Dict[str, Any],
+                         topics: List[Dict[str, Any]], hotspots: List[Dict[str, Any]]) -> None:
+    """create_chapter_tree of CREATE_TABLES_SQL: the chapter with its topics and hotspots, all or nothing"""
+    db.write_rows(conn, "chapters", [{"favorite": False, **chapter}])
+    db.write_rows(conn, "topics", topics)
+    db.write_rows(conn, "hotspots", hotspots)
+
+
+FUNCTIONS = {CHAPTER_TREE_RPC: _create_chapter_tree}
+
+
+class SQLiteDatabase(StorageBackend):
+    """Storage backend on an embedded SQLite database, for local, edge and test deployments.
+
+    The schema mirrors CREATE_TABLES_SQL and is created on first use. The
+    database runs in WAL mode, so readers never wait for the writer; each
+    pool thread keeps its own connection and writers queue on the database
+    lock for up to `busy_timeout` seconds. Several worker processes may
+    share one file.
+    """
+
+    thread_name_prefix = "sqlite"
+
+    def __init__(self, path: Path, pool_size: int = 4, busy_timeout: float = BUSY_TIMEOUT):
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(f"SQLite {sqlite3.sqlite_version} is too old, "
+                               f"{'.'.join(map(str, MIN_SQLITE_VERSION))} or later is required")
+        super().__init__(pool_size)
+        self.path = Path(path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(SQLITE_SCHEMA)
+        self.columns: Dict[str, Dict[str, str]] = {
+            table: {row[1]: row[2].upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+            for table in TABLES
+        }
+        # SQLite stores booleans as 0/1; these columns are turned back into bools on the way out
+        self._booleans = {
+            table: [name for name, column_type in columns.items() if column_type == "BOOLEAN"]
+            for table, columns in self.columns.items()
+        }
+
+    def connection(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA foreign_keys = ON")
+            # Durable across application crashes in WAL mode; only a power loss can drop the last commits
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def table(self, name: str) -> SQLiteQuery:
+        return SQLiteQuery(self, name)
+
+    def rpc(self, fn: str, params: Optional[dict] = None) -> SQLiteCall:
+        return SQLiteCall(self, fn, params or {})
+
+    def fetch(self, conn: sqlite3.Connection, table: str, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        cursor = conn.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        rows = [dict(zip(names, values)) for values in cursor.fetchall()]
+        booleans = [name for name in self._booleans[table] if name in names]
+        if booleans:
+            for row in rows:
+                for name in booleans:
+                    if row[name] is not None:
+                        row[name] = bool(row[name])
+        return rows
+
+    def write_rows(self, conn: sqlite3.Connection, table: str, rows: List[Dict[str, Any]],
+                   on_conflict: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Insert (or, with `on_conflict`, upsert) rows with multi-row statements; returns the written rows.
+
+        Rows with the same keys share statements and columns a row leaves
+        out keep their defaults. Must run inside a transaction.
+        """
+        rows = [row if row.get("id") is not None else {**row, "id": str(uuid.uuid4())} for row in rows]
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(tuple(row), []).append(row)
+
+        written: Dict[Any, Dict[str, Any]] = {}
+        for columns, group in groups.items():
+            for name in columns:
+                if name not in self.columns[table]:
+                    raise SQLiteError(f"column {table}.{name} does not exist", code="42703")
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+            suffix = " RETURNING *"
+            if on_conflict:
+                updates = [f"{name} = excluded.{name}" for name in columns if name != on_conflict]
+                action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+                suffix = f" ON CONFLICT({on_conflict}) {action}{suffix}"
+            placeholders = f"({', '.join('?' * len(columns))})"
+            per_statement = max(1, MAX_VARIABLES // len(columns))
+            for start in range(0, len(group), per_statement):
+                chunk = group[start:start + per_statement]
+                params = [row[name] for row in chunk for name in columns]
+                for stored in self.fetch(conn, table, sql + ", ".join([placeholders] * len(chunk)) + suffix, params):
+                    written[stored["id"]] = stored
+        # In the order they were given, like PostgREST
+        return [written[row["id"]] for row in rows if row["id"] in written]
+
+    def close(self):
+        super().close()
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
@@ -0,0 +1,103 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, NamedTuple, Optional, Tuple
+import asyncio
+import functools
+import logging
+import os
+import time
+
+from metrics import Histogram, note_storage_call
+
+logger = logging.getLogger(__name__)
+
+# Threads per worker process available for blocking storage round trips
+DEFAULT_POOL_SIZE = 16
+# Where STORAGE_BACKEND=sqlite keeps the library unless SQLITE_PATH says otherwise
+DEFAULT_SQLITE_PATH = Path(__file__).parent / ".data" / "library.db"
+
+
+class QueryResult(NamedTuple):
+    data: Any
+
+
+class StorageBackend(ABC):
+    """Where chapters, topics, hotspots and annotations are persisted.
+
+    A backend hands out request builders with the subset of the PostgREST
+    API that chapter_store and the route handlers use: table(name) with
+    select/insert/upsert/update/delete, eq/gt/lt/in_/or_ filters and
+    order/limit, plus rpc(fn, params) for the functions of
+    CREATE_TABLES_SQL. Each builder has a blocking execute() returning an
+    object with .data; execute() on the backend runs it on a bounded thread
+    pool so handlers never block the event loop, and records its latency by
+    table and operation (see describe()).
+    """
+
+    thread_name_prefix = "storage"
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE):
+        self.pool_size = pool_size
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=self.thread_name_prefix)
+        self.query_seconds = Histogram(
+            "storage_query_duration_seconds", "Storage round trips, including the wait for a pool thread",
+            ["table", "operation"]
+        )
+
+    @abstractmethod
+    def table(self, name: str):
+        """Request builder over table `name`"""
+
+    @abstractmethod
+    def rpc(self, fn: str, params: Optional[dict] = None):
+        """Request builder calling the database function `fn`"""
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking callable on the storage thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def describe(self, query) -> Tuple[str, str]:
+        """(table, operation) of a request builder, for metrics; operation is select/insert/upsert/update/delete/rpc"""
+        return getattr(query, "table", "unknown"), getattr(query, "op", "unknown")
+
+    async def execute(self, query) -> Any:
+        """Execute a request builder without blocking the event loop"""
+        table, operation = self.describe(query)
+        note_storage_call(table, operation)
+        started = time.perf_counter()
+        try:
+            return await self.run(query.execute)
+        finally:
+            self.query_seconds.observe(time.perf_counter() - started, table, operation)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+database: Optional[StorageBackend] = None
+
+def get_database() -> StorageBackend:
+    """The process-wide storage backend, chosen by STORAGE_BACKEND (supabase or sqlite)"""
+    global database
+    if database is None:
+        # Read lazily so values loaded from backend/.env by server.py are picked up
+        backend = os.environ.get('STORAGE_BACKEND', 'supabase').lower()
+        if backend == 'sqlite':
+            from sqlite_store import SQLiteDatabase
+
+            path = Path(os.environ.get('SQLITE_PATH', DEFAULT_SQLITE_PATH))
+            database = SQLiteDatabase(path, pool_size=int(os.environ.get('SQLITE_POOL_SIZE', '4')))
+            logger.info(f"Using SQLite storage at {path}")
+        elif backend == 'supabase':
+            from supabase_client import Database
+
+            database = Database(
+                url=os.environ.get('SUPABASE_URL'),
+                key=os.environ.get('SUPABASE_SERVICE_KEY'),
+                pool_size=int(os.environ.get('SUPABASE_POOL_SIZE', DEFAULT_POOL_SIZE))
+            )
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, expected supabase or sqlite")
+    return database
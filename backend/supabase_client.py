@@ -1,21 +1,57 @@
 from supabase import create_client, Client
-import os
+from typing import Optional, Tuple
 import logging
 
+from storage import DEFAULT_POOL_SIZE, StorageBackend
+
 logger = logging.getLogger(__name__)
 
-SUPABASE_URL = os.environ.get('SUPABASE_URL')
-SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_KEY')
 
-supabase: Client = None
+class Database(StorageBackend):
+    """Storage backend for the hosted Supabase project.
+
+    The supabase client is synchronous, so every request builder is executed
+    on a dedicated, bounded thread pool and awaited from the handlers.
+    """
+
+    thread_name_prefix = "supabase"
+
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None,
+                 client: Optional[Client] = None, pool_size: int = DEFAULT_POOL_SIZE):
+        super().__init__(pool_size)
+        self.url = url
+        self.key = key
+        self._client = client
+
+    @property
+    def client(self) -> Client:
+        if self._client is None:
+            if not self.url or not self.key:
+                raise ValueError("Supabase credentials not configured")
+            self._client = create_client(self.url, self.key)
+        return self._client
+
+    def table(self, name: str):
+        return self.client.table(name)
+
+    def rpc(self, fn: str, params: Optional[dict] = None):
+        return self.client.rpc(fn, params or {})
+
+    def describe(self, query) -> Tuple[str, str]:
+        # postgrest builders only keep the URL and HTTP method of the request they will send
+        request = getattr(query, "request", None)
+        if request is None:
+            return super().describe(query)
+        path = str(getattr(request, "path", ""))
+        if "/rpc/" in path:
+            return path.rsplit("/", 1)[-1], "rpc"
+        method = str(getattr(request.http_method, "value", request.http_method)).upper()
+        if method == "POST":
+            prefer = request.headers.get("prefer", "") if getattr(request, "headers", None) is not None else ""
+            return path.rsplit("/", 1)[-1], "upsert" if "merge-duplicates" in prefer else "insert"
+        operation = {"GET": "select", "HEAD": "select", "PATCH": "update", "DELETE": "delete"}.get(method, method.lower())
+        return path.rsplit("/", 1)[-1], operation
 
-def get_supabase_client() -> Client:
-    global supabase
-    if supabase is None:
-        if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-            raise ValueError("Supabase credentials not configured")
-        supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    return supabase
 
 # SQL to create tables - run this in Supabase SQL editor
 CREATE_TABLES_SQL = """
@@ -104,9 +140,30 @@ CREATE POLICY "Allow public update access on annotations" ON annotations FOR UPD
 CREATE POLICY "Allow public delete access on annotations" ON annotations FOR DELETE USING (true);
 
 -- Create indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_chapters_created_at_id ON chapters(created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_topics_chapter_id ON topics(chapter_id);
 CREATE INDEX IF NOT EXISTS idx_hotspots_topic_id ON hotspots(topic_id);
 CREATE INDEX IF NOT EXISTS idx_annotations_topic_id ON annotations(topic_id);
+
+-- Write a chapter with all its topics and hotspots in one transaction (used by POST /api/chapters)
+CREATE OR REPLACE FUNCTION create_chapter_tree(chapter JSONB, topics JSONB, hotspots JSONB)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO chapters (id, title, subject, description, favorite)
+    SELECT id, title, subject, description, COALESCE(favorite, FALSE)
+    FROM jsonb_populate_record(NULL::chapters, chapter);
+
+    INSERT INTO topics (id, chapter_id, title, subtitle, content, illustration, illustration_prompt, order_index)
+    SELECT id, chapter_id, title, subtitle, content, illustration, illustration_prompt, order_index
+    FROM jsonb_populate_recordset(NULL::topics, topics);
+
+    INSERT INTO hotspots (id, topic_id, x, y, label, icon, color, title, description, fun_fact)
+    SELECT id, topic_id, x, y, label, icon, color, title, description, fun_fact
+    FROM jsonb_populate_recordset(NULL::hotspots, hotspots);
+END;
+$$;
 """
 
 def print_setup_instructions():
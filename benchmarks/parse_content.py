@@ -0,0 +1,102 @@
+"""parse_content_to_topics: original split-based parser vs the streaming scanner.
+
+Times both on synthetic textbook content of about 1 KB, 1 MB and 50 MB and
+reports the peak memory traced while parsing (the input string itself is
+not counted). The streaming scanner is also run straight from a file.
+
+    python benchmarks/parse_content.py [sizes in bytes...]
+"""
+from pathlib import Path
+from typing import List
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("CORS_ORIGINS", "*")
+os.environ.setdefault("SHARED_CACHE", "none")
+
+from server import Hotspot, Topic, get_color_for_index, get_icon_for_keyword, iter_topics  # noqa: E402
+
+
+def legacy_extract_keywords(text: str) -> List[str]:
+    words = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', text)
+    common = {'The', 'This', 'That', 'These', 'Those', 'When', 'Where', 'What', 'How', 'Why'}
+    keywords = [w for w in words if w not in common]
+    return list(dict.fromkeys(keywords))[:10]
+
+
+def legacy_parse_content_to_topics(content: str) -> List[Topic]:
+    """parse_content_to_topics as it was before the streaming scanner"""
+    topics = []
+    sections = content.split('\n## ')
+    if len(sections) == 1:
+        sections = content.split('\n\n')
+    for idx, section in enumerate(sections):
+        if not section.strip():
+            continue
+        lines = section.strip().split('\n')
+        title = lines[0].replace('#', '').strip() or f"Topic {idx + 1}"
+        content_text = '\n'.join(lines[1:]).strip() if len(lines) > 1 else section.strip()
+        keywords = legacy_extract_keywords(content_text)
+        hotspots = []
+        for i, keyword in enumerate(keywords[:6]):
+            hotspots.append(Hotspot(
+                x=15 + (i % 3) * 30, y=20 + (i // 3) * 35, label=keyword,
+                icon=get_icon_for_keyword(keyword), color=get_color_for_index(i), title=keyword,
+                description=f"Learn more about {keyword.lower()} and its role in this topic.", fun_fact=None
+            ))
+        topics.append(Topic(title=title, subtitle="Interactive Learning Content", content=content_text,
+                            hotspots=hotspots, annotations=[]))
+    return topics if topics else [Topic(title="Introduction", subtitle="Getting Started", content=content,
+                                        hotspots=[], annotations=[])]
+
+
+SECTION = (
+    "## The Water Cycle {n}\n"
+    "Water moves between the Ocean, the Atmosphere and the Land. When the Sun heats the surface,\n"
+    "Evaporation lifts vapour into the air, where Condensation forms Clouds.\n\n"
+    "Precipitation returns it as Rain or Snow, and Rivers carry it back to the Sea.\n"
+)
+
+
+def make_document(size: int) -> str:
+    parts, total, n = ["# Earth Science\nAn overview.\n"], 0, 0
+    while total < size:
+        parts.append(SECTION.format(n=n))
+        total += len(parts[-1])
+        n += 1
+    return "\n".join(parts)[:max(size, 1)]
+
+
+def run(label: str, fn) -> None:
+    started = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label:<28} {elapsed * 1000:10.1f} ms  peak {peak / 1e6:8.1f} MB  {count} topics")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 1_000_000, 50_000_000]
+    for size in sizes:
+        document = make_document(size)
+        print(f"{len(document) / 1e6:.3f} MB input")
+        run("original (str)", lambda: len(legacy_parse_content_to_topics(document)))
+        run("streaming (str)", lambda: sum(1 for _ in iter_topics(document)))
+        with tempfile.NamedTemporaryFile("w", suffix=".md", delete=False, encoding="utf-8") as f:
+            f.write(document)
+        try:
+            run("streaming (file)", lambda: sum(1 for _ in iter_topics(Path(f.name))))
+        finally:
+            os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    main()
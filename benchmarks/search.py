@@ -0,0 +1,74 @@
+"""SearchIndex query latency on a synthetic library.
+
+Builds an index of 1,000 chapters x 100 topics (100k topics, each with a
+few hotspots) and reports the median and p99 latency of a mix of rare,
+common, multi-word and prefix queries.
+
+    python benchmarks/search.py [chapters] [topics_per_chapter]
+"""
+from pathlib import Path
+import itertools
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from search_index import SearchIndex  # noqa: E402
+
+VOCABULARY_SIZE = 50_000
+QUERIES = ["photosynthesis", "the", "energy cell", "light reactions in the leaf", "chloro", "ab", "w123", "w4 w5 w6"]
+
+
+def build(chapters: int, topics: int) -> SearchIndex:
+    rng = random.Random(0)
+    # Zipf-like vocabulary: a few very common words and a long tail
+    words = ["the", "of", "and", "energy", "cell", "light", "leaf"] + [f"w{i}" for i in range(VOCABULARY_SIZE)]
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    special = ["photosynthesis", "chlorophyll", "chloroplast", "reactions", "absorb", "abstract"]
+
+    pool = rng.choices(words, cum_weights=cumulative, k=1_000_000)
+
+    def text(n):
+        start = rng.randrange(len(pool) - n)
+        chosen = pool[start:start + n]
+        chosen[rng.randrange(n)] = rng.choice(special)
+        return " ".join(chosen)
+
+    index = SearchIndex()
+    index.begin_load()
+    for c in range(chapters):
+        chapter_id = f"ch-{c}"
+        index.load_chapters([{"id": chapter_id, "title": text(4), "description": text(12)}])
+        index.load_topics([
+            {"id": f"{chapter_id}-t{t}", "chapter_id": chapter_id, "title": text(4), "content": text(120)}
+            for t in range(topics)
+        ])
+        index.load_hotspots([
+            {"id": f"{chapter_id}-t{t}-h{h}", "topic_id": f"{chapter_id}-t{t}", "title": text(2), "description": text(10)}
+            for t in range(topics) for h in range(3)
+        ])
+    index.end_load()
+    return index
+
+
+def main():
+    chapters, topics = (int(arg) for arg in (sys.argv[1:] or ["1000", "100"]))
+    started = time.perf_counter()
+    index = build(chapters, topics)
+    print(f"indexed {index.stats()} in {time.perf_counter() - started:.1f} s")
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(50):
+            started = time.perf_counter()
+            results = index.search(query, limit=20)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f"  {query!r:<32} median {statistics.median(timings):6.2f} ms  "
+              f"p99 {timings[int(len(timings) * 0.99) - 1]:6.2f} ms  {len(results)} results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Serialization cost of the chapter list on a 10k-topic library.
+
+Compares FastAPI's default path (jsonable_encoder + JSONResponse) with
+encode_json and with the per-chapter bodies the list endpoint reuses.
+
+    python benchmarks/serialization.py [chapters] [topics_per_chapter]
+"""
+from pathlib import Path
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import http_cache  # noqa: E402
+from http_cache import RenderedBody, encode_json  # noqa: E402
+
+
+def build_library(chapters: int, topics: int):
+    paragraph = "Chlorophyll absorbs light energy and converts it into chemical energy. " * 6
+    return [
+        {
+            "id": f"chapter-{c}", "title": f"Chapter {c}", "subject": "science",
+            "description": f"Interactive chapter about chapter {c}", "favorite": c % 3 == 0,
+            "created_at": "2026-01-01T00:00:00+00:00", "updated_at": "2026-01-01T00:00:00+00:00",
+            "topics": [
+                {
+                    "id": f"topic-{c}-{t}", "chapter_id": f"chapter-{c}", "title": f"Topic {t}",
+                    "subtitle": None, "content": paragraph, "illustration": None,
+                    "illustration_prompt": f"Educational illustration for topic {t}", "order_index": t,
+                    "hotspots": [
+                        {"id": f"h-{c}-{t}-{h}", "topic_id": f"topic-{c}-{t}", "x": 20.0 + h * 25, "y": 30.0,
+                         "label": f"Keyword {h}", "icon": "sparkles", "color": "primary", "title": "Keyword",
+                         "description": "Learn more about this concept", "fun_fact": None}
+                        for h in range(3)
+                    ],
+                    "annotations": [
+                        {"id": f"a-{c}-{t}", "topic_id": f"topic-{c}-{t}", "type": "text", "x": 5.0, "y": 5.0,
+                         "width": None, "height": None, "rotation": 0, "text": "note", "color": "#ff0000",
+                         "end_x": None, "end_y": None}
+                    ]
+                }
+                for t in range(topics)
+            ]
+        }
+        for c in range(chapters)
+    ]
+
+
+def measure(fn, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    chapters = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    topics = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    library = build_library(chapters, topics)
+    size = len(encode_json(library))
+    print(f"{chapters} chapters x {topics} topics = {chapters * topics} topics, {size / 1e6:.1f} MB of JSON")
+
+    results = {"jsonable_encoder + JSONResponse": measure(lambda: JSONResponse(jsonable_encoder(library)).body)}
+
+    orjson = http_cache.orjson
+    http_cache.orjson = None
+    results["encode_json (stdlib json)"] = measure(lambda: encode_json(library))
+    http_cache.orjson = orjson
+    if orjson is not None:
+        results["encode_json (orjson)"] = measure(lambda: encode_json(library))
+
+    parts = [RenderedBody.of(chapter) for chapter in library]
+    results["cached chapter bodies, joined"] = measure(lambda: RenderedBody.join(parts).body)
+    results["cached chapter bodies, list ETag only"] = measure(lambda: RenderedBody.list_etag(parts))
+
+    baseline = next(iter(results.values()))
+    for name, ms in results.items():
+        print(f"{name:<40} {ms:9.2f} ms  {baseline / ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
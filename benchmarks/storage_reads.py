@@ -0,0 +1,81 @@
+"""Read latency of the chapter_store queries on the embedded SQLite backend.
+
+Builds a library of 1,000 chapters x 20 topics (3 hotspots and 1 annotation
+each) in a temporary database and reports the median and p99 latency of a
+full chapter load, a 20-chapter list page with its trees, and a whole-table
+scan, all awaited through the backend's thread pool as the server does.
+
+    python benchmarks/storage_reads.py [chapters] [topics_per_chapter]
+"""
+from pathlib import Path
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from chapter_store import insert_chapter_trees, list_chapters, load_chapter, load_chapter_trees, scan_rows  # noqa: E402
+from sqlite_store import SQLiteDatabase  # noqa: E402
+
+
+async def build(db: SQLiteDatabase, chapters: int, topics: int):
+    paragraph = "Chlorophyll absorbs light energy and converts it into chemical energy. " * 6
+    for start in range(0, chapters, 50):
+        chapter_docs, topic_docs, hotspot_docs, annotation_docs = [], [], [], []
+        for c in range(start, min(start + 50, chapters)):
+            chapter_id = f"chapter-{c:06d}"
+            chapter_docs.append({"id": chapter_id, "title": f"Chapter {c}", "subject": "science",
+                                 "created_at": f"2026-01-01T00:{c // 60 % 60:02d}:{c % 60:02d}.000+00:00"})
+            for t in range(topics):
+                topic_id = f"{chapter_id}-t{t:03d}"
+                topic_docs.append({"id": topic_id, "chapter_id": chapter_id, "title": f"Topic {t}",
+                                   "content": paragraph, "order_index": t})
+                hotspot_docs.extend({"id": f"{topic_id}-h{h}", "topic_id": topic_id, "x": 20.0 + h * 25, "y": 30.0,
+                                     "label": f"Keyword {h}", "title": "Keyword"} for h in range(3))
+                annotation_docs.append({"id": f"{topic_id}-a0", "topic_id": topic_id, "type": "note", "x": 5, "y": 5})
+        await insert_chapter_trees(db, chapter_docs, topic_docs, hotspot_docs)
+        await db.execute(db.table("annotations").insert(annotation_docs))
+
+
+async def measure(name: str, fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    print(f"{name:<34} median {statistics.median(samples):8.3f} ms   p99 {samples[int(len(samples) * 0.99) - 1]:8.3f} ms")
+
+
+async def main(chapters: int, topics: int):
+    with tempfile.TemporaryDirectory() as directory:
+        db = SQLiteDatabase(Path(directory) / "library.db")
+        started = time.perf_counter()
+        await build(db, chapters, topics)
+        print(f"Built {chapters} chapters x {topics} topics in {time.perf_counter() - started:.1f} s\n")
+
+        rng = random.Random(0)
+
+        async def one_chapter():
+            await load_chapter(db, f"chapter-{rng.randrange(chapters):06d}")
+
+        async def list_page():
+            rows, _ = await list_chapters(db, limit=20)
+            await load_chapter_trees(db, rows)
+
+        async def scan_topics():
+            async for _ in scan_rows(db, "topics", "id,chapter_id,title"):
+                pass
+
+        await measure("load_chapter (one tree)", one_chapter, 500)
+        await measure("list_chapters(20) + trees", list_page, 100)
+        await measure(f"scan_rows topics ({chapters * topics} rows)", scan_topics, 5)
+        db.close()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    asyncio.run(main(*(args + [1000, 20][len(args):])))
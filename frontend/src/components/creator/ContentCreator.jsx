@@ -161,24 +161,36 @@ Volcanic eruptions can be explosive or effusive. Explosive eruptions blast ash a
       
       const taskId = response.data.task_id;
       
-      // Poll for completion
+      const handleStatus = ({ status, image_url }) => {
+        if (status === 'completed' || status === 'success' || image_url) {
+          setGeneratedImageUrl(image_url);
+          setIsGeneratingImage(false);
+          return true;
+        }
+        
+        if (status === 'failed' || status === 'error') {
+          setImageError('Image generation failed. Please try again.');
+          setIsGeneratingImage(false);
+          return true;
+        }
+        
+        return false;
+      };
+      
+      // Identical requests are answered straight from the backend's image cache
+      if (handleStatus(response.data)) {
+        return;
+      }
+      
+      // Poll for completion (fallback when the event stream is unavailable)
       let attempts = 0;
       const maxAttempts = 60; // 2 minutes max
       
       const pollStatus = async () => {
         try {
           const statusResponse = await axios.get(`${API}/image-status/${taskId}`);
-          const { status, image_url } = statusResponse.data;
-          
-          if (status === 'completed' || status === 'success' || image_url) {
-            setGeneratedImageUrl(image_url);
-            setIsGeneratingImage(false);
-            return;
-          }
           
-          if (status === 'failed' || status === 'error') {
-            setImageError('Image generation failed. Please try again.');
-            setIsGeneratingImage(false);
+          if (handleStatus(statusResponse.data)) {
             return;
           }
           
@@ -201,7 +213,24 @@ Volcanic eruptions can be explosive or effusive. Explosive eruptions blast ash a
         }
       };
       
-      setTimeout(pollStatus, 3000); // Start polling after 3 seconds
+      if (typeof EventSource === 'undefined') {
+        setTimeout(pollStatus, 3000); // Start polling after 3 seconds
+        return;
+      }
+      
+      // The backend polls the provider once per task and pushes every status change
+      const events = new EventSource(`${API}/image-status/${taskId}/events`);
+      
+      events.onmessage = (event) => {
+        if (handleStatus(JSON.parse(event.data))) {
+          events.close();
+        }
+      };
+      
+      events.onerror = () => {
+        events.close();
+        setTimeout(pollStatus, 3000);
+      };
       
     } catch (error) {
       console.error('Image generation error:', error);
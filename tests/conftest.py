@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from tests.fakes import FakeSupabase
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("CORS_ORIGINS", "*")
+# server.py reads these at import: keep its caches per process and its files out of the tree
+os.environ.setdefault("SHARED_CACHE", "none")
+_CACHE_DIR = tempfile.mkdtemp(prefix="test-cache-")
+os.environ.setdefault("IMAGE_STORE_DIR", os.path.join(_CACHE_DIR, "images"))
+os.environ.setdefault("IMAGE_CACHE_DIR", os.path.join(_CACHE_DIR, "generated-images"))
+os.environ.setdefault("PUBLIC_BASE_URL", "http://testserver")
+
+
+@pytest.fixture
+def fake_sb():
+    return FakeSupabase()
+
+
+@pytest.fixture
+def fake_db(fake_sb):
+    from supabase_client import Database
+    db = Database(client=fake_sb, pool_size=4)
+    yield db
+    db.close()
@@ -0,0 +1,221 @@
+from datetime import datetime, timezone
+
+
+def _with_defaults(row):
+    # Every table of CREATE_TABLES_SQL has created_at DEFAULT NOW()
+    return {"created_at": datetime.now(timezone.utc).isoformat(), **row}
+
+
+class FakeAPIError(Exception):
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+
+def _split_top_level(text):
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _parse_condition(text):
+    """Compile a PostgREST logic tree such as `a.lt.1,and(a.eq.1,b.lt.2)` into a row predicate"""
+    if text.startswith(("and(", "or(")):
+        combine = all if text.startswith("and(") else any
+        children = [_parse_condition(part) for part in _split_top_level(text[text.index("(") + 1:-1])]
+        return lambda row: combine(child(row) for child in children)
+    column, op, value = text.split(".", 2)
+    value = value.strip('"')
+    compare = {"eq": lambda a, b: a == b, "lt": lambda a, b: a < b, "gt": lambda a, b: a > b}[op]
+    return lambda row: row.get(column) is not None and compare(row.get(column), value)
+
+
+class FakeQuery:
+    """Minimal stand-in for a postgrest request builder over in-memory rows"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.payload = None
+        self.filters = []
+        self.order_by = []
+        self.single_row = False
+        self.columns = None
+        self.row_limit = None
+
+    def select(self, *columns):
+        self.op = "select"
+        if columns and columns != ("*",):
+            self.columns = ",".join(columns).split(",")
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict="id"):
+        self.op, self.payload = "upsert", payload
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def or_(self, filters):
+        self.filters.append(_parse_condition(f"or({filters})"))
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def _matches(self, row):
+        return all(f(row) for f in self.filters)
+
+    def execute(self):
+        self.client.calls.append((self.table, self.op))
+        if (self.table, self.op) in self.client.fail_on:
+            raise FakeAPIError(f"{self.op} on {self.table} failed")
+        rows = self.client.tables.setdefault(self.table, [])
+
+        if self.op == "insert":
+            payload = [_with_defaults(row) for row in (self.payload if isinstance(self.payload, list) else [self.payload])]
+            rows.extend(dict(row) for row in payload)
+            return FakeResult([dict(row) for row in payload])
+
+        if self.op == "upsert":
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            by_id = {row["id"]: row for row in rows}
+            for row in payload:
+                if row["id"] in by_id:
+                    by_id[row["id"]].update(row)
+                else:
+                    rows.append(dict(row))
+            return FakeResult([dict(row) for row in payload])
+
+        matched = [row for row in rows if self._matches(row)]
+
+        if self.op == "update":
+            for row in matched:
+                row.update(self.payload)
+            return FakeResult([dict(row) for row in matched])
+
+        if self.op == "delete":
+            self.client.tables[self.table] = [row for row in rows if not self._matches(row)]
+            return FakeResult([dict(row) for row in matched])
+
+        for column, desc in reversed(self.order_by):
+            matched.sort(key=lambda row: row.get(column) or 0, reverse=desc)
+        if self.row_limit is not None:
+            matched = matched[:self.row_limit]
+        if self.columns:
+            data = [{column: row.get(column) for column in self.columns} for row in matched]
+        else:
+            data = [dict(row) for row in matched]
+        if self.single_row:
+            return FakeResult(data[0] if data else None)
+        return FakeResult(data)
+
+
+class FakeRpc:
+    op = "rpc"
+
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    @property
+    def table(self):
+        return self.name
+
+    def execute(self):
+        self.client.calls.append((self.name, "rpc"))
+        if self.name not in self.client.functions:
+            raise FakeAPIError(f"Could not find the function public.{self.name}", code="PGRST202")
+        return FakeResult(self.client.functions[self.name](self.client, self.params))
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.calls = []
+        self.functions = {}
+        self.fail_on = set()
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+
+def fake_create_chapter_tree(sb, params):
+    """In-memory equivalent of the create_chapter_tree SQL function"""
+    sb.tables.setdefault("chapters", []).append(dict(params["chapter"]))
+    sb.tables.setdefault("topics", []).extend(dict(row) for row in params["topics"])
+    sb.tables.setdefault("hotspots", []).extend(dict(row) for row in params["hotspots"])
+
+
+def seed_library(sb, chapters=3, topics=4, hotspots=2, annotations=1):
+    """Fill the fake database with a library of the given shape"""
+    for c in range(chapters):
+        chapter_id = f"ch-{c}"
+        sb.tables.setdefault("chapters", []).append({
+            "id": chapter_id, "title": f"Chapter {c}", "subject": "science",
+            "favorite": False, "created_at": f"2026-01-{c + 1:02d}T00:00:00+00:00"
+        })
+        for t in range(topics):
+            topic_id = f"{chapter_id}-t{t}"
+            sb.tables.setdefault("topics", []).append({
+                "id": topic_id, "chapter_id": chapter_id, "title": f"Topic {t}",
+                "content": "text", "order_index": topics - 1 - t
+            })
+            for h in range(hotspots):
+                sb.tables.setdefault("hotspots", []).append({
+                    "id": f"{topic_id}-h{h}", "topic_id": topic_id, "x": 10, "y": 10,
+                    "label": "L", "title": "T", "description": "D"
+                })
+            for a in range(annotations):
+                sb.tables.setdefault("annotations", []).append({
+                    "id": f"{topic_id}-a{a}", "topic_id": topic_id, "type": "text", "x": 1, "y": 1
+                })
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import multiprocessing
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from bulk_import import ImportReport, count_items, parse_item, read_items, run_import
+
+
+def write_ndjson(path, lines):
+    path.write_text("\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines) + "\n")
+    return path
+
+
+def test_read_items_from_ndjson_reports_bad_lines(tmp_path):
+    path = write_ndjson(tmp_path / "lib.ndjson", [
+        {"title": "Plants", "subject": "biology", "content": "## Leaves\nGreen."},
+        "{not json",
+        "",
+        [1, 2]
+    ])
+
+    items = list(read_items(path))
+
+    assert count_items(path) == 3
+    assert [item.name for item in items] == ["line 1", "line 2", "line 4"]
+    assert parse_item(items[0]).sections[0][0].title == "Leaves"
+    for item, message in ((items[1], "Invalid JSON"), (items[2], "Expected a JSON object")):
+        with pytest.raises(ValueError, match=message):
+            parse_item(item)
+
+
+def test_read_items_from_zip_uses_file_and_folder_names(tmp_path):
+    path = tmp_path / "lib.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("physics/light_and_optics.md", "## Refraction\nLight bends in Water.")
+        archive.writestr("intro.txt", "Welcome")
+        archive.writestr("images/cover.png", b"\x89PNG")
+        archive.writestr("physics/.DS_Store.md", "")
+
+    items = list(read_items(path))
+
+    assert count_items(path) == 2
+    assert [(item.document["title"], item.document["subject"]) for item in items] == [
+        ("light and optics", "physics"), ("intro", "general")
+    ]
+    parsed = parse_item(items[0])
+    assert parsed.sections[0][1] == ["Light", "Water"]
+
+
+def test_read_items_skips_zip_files_over_the_size_limit_without_reading_them(tmp_path, monkeypatch):
+    path = tmp_path / "lib.zip"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("bomb.md", "a" * 1_000_000)
+        archive.writestr("small.md", "## Fits\nShort.")
+    opened = []
+    open_member = zipfile.ZipFile.open
+
+    def recording_open(self, name, *args, **kwargs):
+        opened.append(getattr(name, "filename", name))
+        return open_member(self, name, *args, **kwargs)
+
+    monkeypatch.setattr(zipfile.ZipFile, "open", recording_open)
+
+    items = list(read_items(path, max_file_size=1000))
+
+    assert [item.name for item in items] == ["bomb.md", "small.md"]
+    with pytest.raises(ValueError, match="larger than 1000 bytes"):
+        parse_item(items[0])
+    assert items[1].document["content"] == "## Fits\nShort." and opened == ["small.md"]
+
+
+def test_parse_item_requires_title_subject_and_content(tmp_path):
+    path = write_ndjson(tmp_path / "lib.ndjson", [{"title": "Plants", "subject": "biology", "content": " "}])
+
+    with pytest.raises(ValueError, match="Missing content"):
+        parse_item(next(read_items(path)))
+
+
+def test_run_import_batches_saves_and_isolates_failures(tmp_path):
+    lines = [{"title": f"Chapter {i}", "subject": "science", "content": f"## Part\nText {i}"} for i in range(7)]
+    lines[2] = {"title": "No content", "subject": "science"}
+    lines[5]["title"] = "Poison"
+    path = write_ndjson(tmp_path / "lib.ndjson", lines)
+    saved_batches = []
+    progress = []
+
+    async def save(batch):
+        if any(title == "Poison" for title in batch):
+            raise RuntimeError("insert failed")
+        saved_batches.append(batch)
+
+    async def main():
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            return await run_import(
+                read_items(path), pool, lambda parsed: parsed.document["title"], save,
+                ImportReport(total=count_items(path)), batch_size=3, max_pending=2, on_item=progress.append
+            )
+
+    report = asyncio.run(main()).to_dict()
+
+    assert (report["total"], report["imported"], report["failed"]) == (7, 5, 2)
+    assert {failure["item"]: failure["error"] for failure in report["failures"]} == {
+        "line 3": "Missing content", "line 6": "insert failed"
+    }
+    assert sorted(title for batch in saved_batches for title in batch) == [f"Chapter {i}" for i in (0, 1, 3, 4, 6)]
+    # Whole batches go in one call; only the failed batch is retried item by item
+    assert max(len(batch) for batch in saved_batches) == 3
+    assert progress.count(True) == 5 and progress.count(False) == 2
+    assert report["chapters_per_second"] > 0
+
+
+def test_run_import_parses_in_a_forkserver_process_pool_off_the_event_loop(tmp_path):
+    lines = [{"title": f"Chapter {i}", "subject": "science", "content": f"## Part\nText {i}"} for i in range(20)]
+    path = write_ndjson(tmp_path / "lib.ndjson", lines)
+    saved = []
+    loop_threads = set()
+
+    def items():
+        # The reader and build run in worker threads, never on the loop's thread
+        for item in read_items(path):
+            loop_threads.add(threading.get_ident())
+            yield item
+
+    def build(parsed):
+        loop_threads.add(threading.get_ident())
+        return (parsed.document["title"], len(parsed.sections))
+
+    async def save(batch):
+        saved.extend(batch)
+
+    async def main():
+        loop_thread = threading.get_ident()
+        with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("forkserver")) as pool:
+            report = await run_import(items(), pool, build, save, ImportReport(total=20), batch_size=8)
+        return loop_thread, report
+
+    loop_thread, report = asyncio.run(main())
+
+    assert report.imported == 20 and report.failed == 0
+    assert sorted(saved) == sorted((f"Chapter {i}", 1) for i in range(20))
+    assert loop_thread not in loop_threads
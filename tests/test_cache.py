@@ -0,0 +1,33 @@
+from cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = LRUCache(ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=100)
+    clock.now = 50
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
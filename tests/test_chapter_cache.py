@@ -0,0 +1,100 @@
+import asyncio
+
+from chapter_cache import ChapterCache
+
+
+def make_loader(calls, delay=0):
+    async def load(chapter_id):
+        calls.append(chapter_id)
+        await asyncio.sleep(delay)
+        return None if chapter_id == "missing" else {"id": chapter_id, "version": len(calls)}
+    return load
+
+
+def test_get_reads_through_and_counts_hits():
+    cache = ChapterCache()
+    calls = []
+
+    async def main():
+        first = await cache.get("a", make_loader(calls))
+        second = await cache.get("a", make_loader(calls))
+        return first, second
+
+    first, second = asyncio.run(main())
+
+    assert first is second
+    assert calls == ["a"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_missing_chapters_are_not_cached():
+    cache = ChapterCache()
+    calls = []
+
+    async def main():
+        await cache.get("missing", make_loader(calls))
+        await cache.get("missing", make_loader(calls))
+
+    asyncio.run(main())
+
+    assert calls == ["missing", "missing"]
+
+
+def test_invalidate_forces_a_reload():
+    cache = ChapterCache()
+    calls = []
+
+    async def main():
+        await cache.get("a", make_loader(calls))
+        await cache.invalidate("a")
+        return await cache.get("a", make_loader(calls))
+
+    assert asyncio.run(main())["version"] == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    cache = ChapterCache()
+    calls = []
+
+    async def main():
+        read = asyncio.create_task(cache.get("a", make_loader(calls, delay=0.01)))
+        await asyncio.sleep(0)
+        await cache.invalidate("a")  # a write lands while the read is in flight
+        await read
+        return "a" in cache.docs
+
+    assert asyncio.run(main()) is False
+
+
+def test_get_many_loads_only_uncached_rows_in_one_batch():
+    cache = ChapterCache()
+    batches = []
+
+    async def load_trees(rows):
+        batches.append([row["id"] for row in rows])
+        return [{**row, "topics": []} for row in rows]
+
+    async def main():
+        await cache.get_many([{"id": "a"}], load_trees)
+        return await cache.get_many([{"id": "b"}, {"id": "a"}, {"id": "c"}], load_trees)
+
+    docs = asyncio.run(main())
+
+    assert [doc["id"] for doc in docs] == ["b", "a", "c"]
+    assert batches == [["a"], ["b", "c"]]
+
+
+def test_lru_eviction_is_counted():
+    cache = ChapterCache(maxsize=2)
+    calls = []
+
+    async def main():
+        for chapter_id in ("a", "b", "c"):
+            await cache.get(chapter_id, make_loader(calls))
+
+    asyncio.run(main())
+
+    assert cache.stats()["evictions"] == 1
+    assert "a" not in cache.docs
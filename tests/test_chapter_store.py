@@ -0,0 +1,262 @@
+import asyncio
+
+import pytest
+
+import chapter_store
+from chapter_store import (
+    decode_cursor, encode_cursor, list_chapters, load_chapter_trees, load_chapter, insert_chapter_tree, insert_chapter_trees, scan_rows,
+    sync_topic_children, IN_CHUNK_SIZE
+)
+from supabase_client import Database
+from tests.fakes import FakeAPIError, FakeSupabase, fake_create_chapter_tree, seed_library
+
+
+def _count_load_queries(sb, **shape):
+    seed_library(sb, **shape)
+    chapters = sb.table("chapters").select("*").execute().data
+    sb.calls.clear()
+    db = Database(client=sb)
+    trees = asyncio.run(load_chapter_trees(db, chapters))
+    db.close()
+    return sb.calls, trees
+
+
+def test_load_chapter_trees_uses_constant_queries(fake_sb):
+    calls, trees = _count_load_queries(fake_sb, chapters=20, topics=10)
+
+    assert calls[0] == ("topics", "select")
+    assert sorted(calls[1:]) == [("annotations", "select"), ("hotspots", "select")]
+    assert len(trees) == 20
+    assert all(len(ch["topics"]) == 10 for ch in trees)
+
+
+def test_load_chapter_trees_query_count_independent_of_library_size():
+    small_calls, _ = _count_load_queries(FakeSupabase(), chapters=1, topics=1)
+    large_calls, _ = _count_load_queries(FakeSupabase(), chapters=20, topics=10)
+
+    assert len(small_calls) == len(large_calls) == 3
+
+
+def test_load_chapter_trees_chunks_large_id_lists(fake_sb, fake_db):
+    seed_library(fake_sb, chapters=IN_CHUNK_SIZE + 1, topics=1, hotspots=0, annotations=0)
+    chapters = fake_sb.table("chapters").select("*").execute().data
+    fake_sb.calls.clear()
+
+    asyncio.run(load_chapter_trees(fake_db, chapters))
+
+    assert fake_sb.calls.count(("topics", "select")) == 2
+    assert fake_sb.calls.count(("hotspots", "select")) == 2
+
+
+def test_load_chapter_trees_stitches_rows(fake_sb, fake_db):
+    seed_library(fake_sb, chapters=2, topics=3, hotspots=2, annotations=1)
+    chapters = fake_sb.table("chapters").select("*").execute().data
+
+    trees = asyncio.run(load_chapter_trees(fake_db, chapters))
+
+    topics = trees[0]["topics"]
+    assert [t["order_index"] for t in topics] == [0, 1, 2]
+    assert all(t["chapter_id"] == "ch-0" for t in topics)
+    assert [h["id"] for h in topics[0]["hotspots"]] == ["ch-0-t2-h0", "ch-0-t2-h1"]
+    assert [a["id"] for a in topics[0]["annotations"]] == ["ch-0-t2-a0"]
+
+
+def test_load_chapter_trees_empty(fake_sb, fake_db):
+    assert asyncio.run(load_chapter_trees(fake_db, [])) == []
+    assert fake_sb.calls == []
+
+
+def test_load_chapter_costs_four_queries(fake_sb, fake_db):
+    seed_library(fake_sb, chapters=2, topics=12)
+    fake_sb.calls.clear()
+
+    chapter = asyncio.run(load_chapter(fake_db, "ch-1"))
+
+    assert sorted(fake_sb.calls) == [
+        ("annotations", "select"), ("chapters", "select"), ("hotspots", "select"), ("topics", "select")
+    ]
+    assert chapter["id"] == "ch-1"
+    assert [t["order_index"] for t in chapter["topics"]] == list(range(12))
+    assert all(len(t["hotspots"]) == 2 for t in chapter["topics"])
+
+
+def test_load_chapter_missing(fake_sb, fake_db):
+    seed_library(fake_sb, chapters=1)
+
+    assert asyncio.run(load_chapter(fake_db, "nope")) is None
+
+
+def _chapter_tree(topics=3, hotspots=2):
+    chapter = {"id": "new", "title": "New", "subject": "science", "favorite": False}
+    topic_docs = [{"id": f"t{i}", "chapter_id": "new", "title": f"T{i}", "order_index": i} for i in range(topics)]
+    hotspot_docs = [
+        {"id": f"t{i}-h{j}", "topic_id": f"t{i}", "x": 1, "y": 1, "label": "L", "title": "T"}
+        for i in range(topics) for j in range(hotspots)
+    ]
+    return chapter, topic_docs, hotspot_docs
+
+
+def test_insert_chapter_tree_uses_single_rpc(fake_sb, fake_db, monkeypatch):
+    monkeypatch.setattr(chapter_store, "_chapter_tree_rpc_available", True)
+    fake_sb.functions["create_chapter_tree"] = fake_create_chapter_tree
+
+    asyncio.run(insert_chapter_tree(fake_db, *_chapter_tree(topics=20, hotspots=6)))
+
+    assert fake_sb.calls == [("create_chapter_tree", "rpc")]
+    assert len(fake_sb.tables["topics"]) == 20
+    assert len(fake_sb.tables["hotspots"]) == 120
+
+
+def test_insert_chapter_tree_falls_back_to_bulk_inserts(fake_sb, fake_db, monkeypatch):
+    monkeypatch.setattr(chapter_store, "_chapter_tree_rpc_available", True)
+
+    asyncio.run(insert_chapter_tree(fake_db, *_chapter_tree(topics=20, hotspots=6)))
+
+    assert fake_sb.calls == [
+        ("create_chapter_tree", "rpc"), ("chapters", "insert"), ("topics", "insert"), ("hotspots", "insert")
+    ]
+    assert len(fake_sb.tables["hotspots"]) == 120
+    assert chapter_store._chapter_tree_rpc_available is False
+
+
+def test_insert_chapter_tree_keeps_the_rpc_after_errors_raised_inside_it(fake_sb, fake_db, monkeypatch):
+    monkeypatch.setattr(chapter_store, "_chapter_tree_rpc_available", True)
+
+    def violates_constraint(client, params):
+        raise FakeAPIError('null value in column "title" violates not-null constraint (in create_chapter_tree)',
+                           code="23502")
+
+    fake_sb.functions["create_chapter_tree"] = violates_constraint
+
+    with pytest.raises(FakeAPIError):
+        asyncio.run(insert_chapter_tree(fake_db, *_chapter_tree()))
+
+    assert fake_sb.calls == [("create_chapter_tree", "rpc")]
+    assert chapter_store._chapter_tree_rpc_available is True
+
+
+def test_insert_chapter_tree_fallback_removes_partial_chapter(fake_sb, fake_db, monkeypatch):
+    monkeypatch.setattr(chapter_store, "_chapter_tree_rpc_available", False)
+    fake_sb.fail_on.add(("hotspots", "insert"))
+
+    with pytest.raises(FakeAPIError):
+        asyncio.run(insert_chapter_tree(fake_db, *_chapter_tree()))
+
+    assert fake_sb.calls[-1] == ("chapters", "delete")
+    assert fake_sb.tables["chapters"] == []
+
+
+def test_insert_chapter_trees_writes_a_batch_with_one_insert_per_table(fake_sb, fake_db):
+    chapters, topics, hotspots = [], [], []
+    for n in range(3):
+        chapter, topic_docs, hotspot_docs = _chapter_tree()
+        chapters.append({**chapter, "id": f"new-{n}"})
+        topics += topic_docs
+        hotspots += hotspot_docs
+
+    asyncio.run(insert_chapter_trees(fake_db, chapters, topics, hotspots))
+
+    assert fake_sb.calls == [("chapters", "insert"), ("topics", "insert"), ("hotspots", "insert")]
+    assert [row["id"] for row in fake_sb.tables["chapters"]] == ["new-0", "new-1", "new-2"]
+
+
+def test_insert_chapter_trees_removes_the_batch_on_failure(fake_sb, fake_db):
+    fake_sb.fail_on.add(("topics", "insert"))
+    chapter, topics, hotspots = _chapter_tree()
+
+    with pytest.raises(FakeAPIError):
+        asyncio.run(insert_chapter_trees(fake_db, [chapter], topics, hotspots))
+
+    assert fake_sb.calls[-1] == ("chapters", "delete")
+    assert fake_sb.tables["chapters"] == []
+
+
+def test_sync_topic_children_writes_only_the_diff(fake_sb, fake_db):
+    seed_library(fake_sb, chapters=1, topics=1, hotspots=4)
+    stored = [dict(row) for row in fake_sb.tables["hotspots"]]
+    stored[0]["x"] = 55
+    incoming = stored[:3] + [{**stored[0], "id": "brand-new"}]
+    fake_sb.calls.clear()
+
+    asyncio.run(sync_topic_children(fake_db, "hotspots", "ch-0-t0", incoming))
+
+    assert fake_sb.calls == [("hotspots", "select"), ("hotspots", "upsert"), ("hotspots", "delete")]
+    rows = {row["id"]: row for row in fake_sb.tables["hotspots"]}
+    assert set(rows) == {"ch-0-t0-h0", "ch-0-t0-h1", "ch-0-t0-h2", "brand-new"}
+    assert rows["ch-0-t0-h0"]["x"] == 55
+    assert rows["brand-new"]["topic_id"] == "ch-0-t0"
+
+
+def test_sync_topic_children_unchanged_list_only_reads(fake_sb, fake_db):
+    seed_library(fake_sb, chapters=1, topics=1, annotations=3)
+    incoming = [dict(row) for row in fake_sb.tables["annotations"]]
+    fake_sb.calls.clear()
+
+    asyncio.run(sync_topic_children(fake_db, "annotations", "ch-0-t0", incoming))
+
+    assert fake_sb.calls == [("annotations", "select")]
+
+
+def _uuid(n):
+    return f"00000000-0000-4000-8000-{n:012d}"
+
+
+def test_list_chapters_pages_with_keyset_cursor(fake_sb, fake_db):
+    seed_library(fake_sb, chapters=5, topics=0)
+    for n, chapter in enumerate(fake_sb.tables["chapters"]):
+        chapter["id"] = _uuid(n)
+    # Two chapters created in the same instant are ordered by id
+    fake_sb.tables["chapters"][1]["created_at"] = fake_sb.tables["chapters"][2]["created_at"]
+
+    pages, after = [], None
+    while True:
+        rows, cursor = asyncio.run(list_chapters(fake_db, ["title"], limit=2, after=after))
+        pages.append([row["id"] for row in rows])
+        if cursor is None:
+            break
+        after = decode_cursor(cursor)
+
+    assert pages == [[_uuid(4), _uuid(3)], [_uuid(2), _uuid(1)], [_uuid(0)]]
+    assert set(rows[0]) == {"id", "created_at", "title"}
+    assert fake_sb.calls == [("chapters", "select")] * 3
+
+
+def test_list_chapters_without_limit_returns_everything(fake_sb, fake_db):
+    seed_library(fake_sb, chapters=3, topics=1)
+
+    rows, cursor = asyncio.run(list_chapters(fake_db))
+
+    assert [row["id"] for row in rows] == ["ch-2", "ch-1", "ch-0"]
+    assert cursor is None
+    assert "topics" not in rows[0]
+
+
+def test_decode_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.parametrize("created_at, chapter_id", [
+    ("2026-01-01T00:00:00+00:00", "x),id.neq.0,and(id.eq.1"),
+    ('2026-01-01",title.eq."x', _uuid(1)),
+    ("yesterday", _uuid(1)),
+])
+def test_decode_cursor_rejects_values_that_are_not_a_timestamp_and_uuid(created_at, chapter_id):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(encode_cursor({"created_at": created_at, "id": chapter_id}))
+
+
+def test_decode_cursor_round_trips_stored_values():
+    row = {"created_at": "2026-01-01T00:00:00.123456+00:00", "id": _uuid(7)}
+
+    assert decode_cursor(encode_cursor(row)) == (row["created_at"], row["id"])
+
+
+def test_scan_rows_pages_by_id(fake_sb, fake_db):
+    seed_library(fake_sb, chapters=5, topics=1)
+
+    async def scan():
+        return [[row["id"] for row in page] async for page in scan_rows(fake_db, "topics", "id,content", page_size=2)]
+
+    assert asyncio.run(scan()) == [["ch-0-t0", "ch-1-t0"], ["ch-2-t0", "ch-3-t0"], ["ch-4-t0"]]
+    assert fake_sb.calls == [("topics", "select")] * 3
@@ -0,0 +1,85 @@
+import io
+import random
+
+import pytest
+
+from content_parser import Section, extract_keywords, iter_sections
+
+
+def reference_sections(content):
+    """The section logic of the original parse_content_to_topics"""
+    sections = content.split('\n## ')
+    if len(sections) == 1:
+        sections = content.split('\n\n')
+    result = []
+    for idx, section in enumerate(sections):
+        if not section.strip():
+            continue
+        lines = section.strip().split('\n')
+        title = lines[0].replace('#', '').strip() or f"Topic {idx + 1}"
+        content_text = '\n'.join(lines[1:]).strip() if len(lines) > 1 else section.strip()
+        result.append(Section(idx, title, content_text))
+    return result or [Section(0, "Introduction", content, introduction=True)]
+
+
+class Unseekable(io.StringIO):
+    def seekable(self):
+        return False
+
+
+SAMPLES = [
+    "",
+    "   \n\n  ",
+    "\n## ",
+    "Just one line",
+    "# Photosynthesis\nPlants make Food.\n## Light Reactions\nChlorophyll absorbs Light.\n\n## \n\n## #\nbody",
+    "First paragraph about The Sun.\n\nSecond one\nwith Two Lines\n\n\n\nThird",
+    "intro\n## A\n\n\n## B\n## C\nc body\n##D\n\n## E",
+    "\n\n\n\n",
+    "\n## \n## \n## x",
+]
+
+
+def random_document(rng):
+    parts = ["\n## ", "\n\n", "\n", "#", " ", "Word", "Alpha Beta", "the", "\t", "x" * 50]
+    return "".join(rng.choice(parts) for _ in range(rng.randint(0, 60)))
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("content", SAMPLES + [random_document(random.Random(seed)) for seed in range(200)])
+def test_sections_match_original_parser_for_every_source(content, tmp_path):
+    expected = reference_sections(content)
+
+    assert list(iter_sections(content)) == expected
+    assert list(iter_sections(io.StringIO(content))) == expected
+    assert list(iter_sections(Unseekable(content))) == expected
+    for size in (1, 2, 3, 5, 64):
+        assert list(iter_sections(chunked(content, size))) == expected
+
+    path = tmp_path / "content.md"
+    path.write_text(content, encoding="utf-8", newline="")
+    assert list(iter_sections(path)) == expected
+
+
+def test_sections_are_yielded_before_the_input_is_consumed():
+    consumed = []
+
+    def chunks():
+        for i in range(1000):
+            consumed.append(i)
+            yield f"\n## Section {i}\nBody {i}"
+
+    sections = iter_sections(chunks())
+    first = next(sections)
+
+    assert first.title == "Section 0"
+    assert len(consumed) < 5
+
+
+def test_extract_keywords():
+    text = "The Water Cycle moves Water. When Clouds form, Water Cycle repeats. This is Rain"
+
+    assert extract_keywords(text) == ["The Water Cycle", "Water", "When Clouds", "Water Cycle", "Rain"]
@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+import gzip
+import json
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+import http_cache
+from http_cache import RenderedBody, coded_etag, conditional_json_response, encode_json, etag_matches, negotiate_encoding
+
+
+def make_request(**headers):
+    raw = [(name.replace("_", "-").lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_list_etag_matches_the_joined_body():
+    parts = [RenderedBody.of({"id": "a"}), RenderedBody.of({"id": "b"})]
+
+    joined = RenderedBody.join(parts)
+
+    assert json.loads(joined.body) == [{"id": "a"}, {"id": "b"}]
+    assert joined.etag == RenderedBody.list_etag(parts)
+    assert RenderedBody.list_etag(parts[::-1]) != joined.etag
+
+
+def test_etag_matches():
+    assert etag_matches('"x"', '"x"')
+    assert etag_matches('"y", W/"x"', '"x"')
+    assert etag_matches("*", '"x"')
+    assert not etag_matches(None, '"x"')
+    assert not etag_matches('"y"', '"x"')
+
+
+def test_negotiate_encoding(monkeypatch):
+    monkeypatch.setattr(http_cache, "brotli", None)
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("gzip;q=0, deflate") is None
+    assert negotiate_encoding(None) is None
+
+
+def test_conditional_response_not_modified_skips_rendering():
+    rendered = RenderedBody.of({"id": "a"})
+    calls = []
+
+    def render():
+        calls.append(1)
+        return rendered
+
+    response = conditional_json_response(make_request(if_none_match=rendered.etag), rendered.etag, render)
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == rendered.etag
+    assert calls == []
+
+
+def test_conditional_response_compresses_large_bodies():
+    rendered = RenderedBody.of({"content": "photosynthesis " * 500})
+
+    response = conditional_json_response(make_request(accept_encoding="gzip"), rendered.etag, lambda: rendered)
+    small = RenderedBody.of({"id": "a"})
+    uncompressed = conditional_json_response(make_request(accept_encoding="gzip"), small.etag, lambda: small)
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body) == rendered.body
+    assert len(response.body) < len(rendered.body) / 10
+    assert "content-encoding" not in uncompressed.headers
+
+
+def test_conditional_response_etag_depends_on_the_coding():
+    rendered = RenderedBody.of({"content": "photosynthesis " * 500})
+
+    compressed = conditional_json_response(make_request(accept_encoding="gzip"), rendered.etag, lambda: rendered)
+    identity = conditional_json_response(make_request(), rendered.etag, lambda: rendered)
+    revalidated = conditional_json_response(
+        make_request(if_none_match=coded_etag(rendered.etag, "gzip")), rendered.etag, lambda: rendered
+    )
+
+    assert compressed.headers["etag"] == coded_etag(rendered.etag, "gzip") != rendered.etag
+    assert identity.headers["etag"] == rendered.etag
+    assert revalidated.status_code == 304 and revalidated.headers["etag"] == compressed.headers["etag"]
+
+
+def test_encode_json_matches_starlette_with_and_without_orjson(monkeypatch):
+    content = {"title": "Fotosíntesis", "n": [1, 2.5, None, True], "nested": {"a": "b"}}
+    expected = JSONResponse(content).body
+
+    assert encode_json(content) == expected
+    monkeypatch.setattr(http_cache, "orjson", None)
+    assert encode_json(content) == expected
+    assert encode_json({"at": datetime(2026, 1, 1, tzinfo=timezone.utc)}) == b'{"at":"2026-01-01T00:00:00+00:00"}'
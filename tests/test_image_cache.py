@@ -0,0 +1,78 @@
+import asyncio
+
+from image_cache import ImageResultCache, request_key
+
+
+def test_request_key_normalizes_whitespace_and_options():
+    assert request_key("A  red\napple ", "google/nano-banana", "16:9", "PNG") == \
+        request_key("A red apple", "google/nano-banana", "16:9", "png")
+    assert request_key("A red apple", "google/nano-banana", "16:9", "png") != \
+        request_key("A red apple", "google/nano-banana", "1:1", "png")
+
+
+def test_concurrent_identical_requests_share_one_task():
+    cache = ImageResultCache()
+    started = []
+
+    async def start():
+        started.append(1)
+        await asyncio.sleep(0.01)
+        return "task-1"
+
+    async def main():
+        first = await asyncio.gather(*(cache.attach("k", start) for _ in range(5)))
+        later = await cache.attach("k", start)
+        return first, later
+
+    first, later = asyncio.run(main())
+
+    assert started == [1]
+    assert set(first) == {"task-1"} and later == "task-1"
+
+
+def test_completed_result_is_served_from_memory_and_disk(tmp_path):
+    cache = ImageResultCache(cache_dir=tmp_path)
+
+    async def start():
+        return "task-1"
+
+    async def main():
+        await cache.attach("k", start)
+        await cache.finish("task-1", {"status": "completed", "image_url": "https://img/1.png"})
+        in_memory = await cache.lookup("k")
+        from_disk = await ImageResultCache(cache_dir=tmp_path).lookup("k")
+        return in_memory, from_disk
+
+    in_memory, from_disk = asyncio.run(main())
+
+    assert in_memory["image_url"] == from_disk["image_url"] == "https://img/1.png"
+    assert from_disk["task_id"] == "task-1"
+
+
+def test_failed_task_is_not_cached_and_can_be_retried():
+    cache = ImageResultCache()
+    ids = iter(["task-1", "task-2"])
+
+    async def start():
+        return next(ids)
+
+    async def main():
+        await cache.attach("k", start)
+        await cache.finish("task-1", {"status": "failed", "image_url": None})
+        return await cache.lookup("k"), await cache.attach("k", start)
+
+    assert asyncio.run(main()) == (None, "task-2")
+
+
+def test_start_failure_propagates_to_waiters():
+    cache = ImageResultCache()
+
+    async def start():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def main():
+        return await asyncio.gather(*(cache.attach("k", start) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+from image_store import ImageStore, parse_range, snap_width
+
+
+def png_bytes(width=1200, height=600):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 80, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_mirror_downloads_each_url_once(tmp_path):
+    data = png_bytes()
+    seen = []
+
+    async def handler(request):
+        seen.append(str(request.url))
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, content=data, headers={"Content-Type": "image/png"})
+
+    async def main():
+        store = ImageStore(tmp_path, transport=httpx.MockTransport(handler))
+        names = await asyncio.gather(*[store.mirror("https://cdn.test/a.png") for _ in range(5)])
+        again = await store.mirror("https://cdn.test/a.png")
+        await store.aclose()
+
+        # A fresh store finds the earlier download on disk
+        restarted = ImageStore(tmp_path, transport=httpx.MockTransport(handler))
+        reloaded = await restarted.mirror("https://cdn.test/a.png")
+        await restarted.aclose()
+        return names, again, reloaded
+
+    names, again, reloaded = asyncio.run(main())
+
+    expected = f"{hashlib.sha256(data).hexdigest()}.png"
+    assert set(names) == {expected} and again == expected and reloaded == expected
+    assert seen == ["https://cdn.test/a.png"]
+    assert (tmp_path / "originals" / expected[:2] / expected).read_bytes() == data
+
+
+def test_mirror_raises_on_upstream_error(tmp_path):
+    store = ImageStore(tmp_path, transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+
+    async def main():
+        try:
+            with pytest.raises(httpx.HTTPStatusError):
+                await store.mirror("https://cdn.test/missing.png")
+        finally:
+            await store.aclose()
+
+    asyncio.run(main())
+
+
+def test_variant_is_resized_webp_and_cached(tmp_path):
+    data = png_bytes()
+    store = ImageStore(tmp_path, resize_workers=1,
+                       transport=httpx.MockTransport(lambda request: httpx.Response(200, content=data, headers={"Content-Type": "image/png"})))
+
+    async def main():
+        name = await store.mirror("https://cdn.test/a.png")
+        first = await store.variant(name, 640)
+        modified = first.stat().st_mtime_ns
+        second = await store.variant(name, 640)
+        await store.aclose()
+        return first, second, modified
+
+    first, second, modified = asyncio.run(main())
+
+    assert first == second and second.stat().st_mtime_ns == modified
+    with Image.open(first) as image:
+        assert image.format == "WEBP"
+        assert image.size == (640, 320)
+
+
+def test_save_original_checks_name_against_digest(tmp_path):
+    data = png_bytes()
+    name = f"{hashlib.sha256(data).hexdigest()}.png"
+    store = ImageStore(tmp_path)
+
+    store.save_original(name, data)
+
+    assert store.original_path(name).read_bytes() == data
+    with pytest.raises(ValueError, match="does not match"):
+        store.save_original(name, data + b"x")
+    with pytest.raises(ValueError, match="does not match"):
+        store.save_original("../escape.png", data)
+
+
+def test_snap_width_rounds_up_to_known_sizes():
+    assert snap_width(1) == 160
+    assert snap_width(640) == 640
+    assert snap_width(641) == 800
+    assert snap_width(5000) == 1920
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
@@ -0,0 +1,92 @@
+import asyncio
+
+from image_tasks import ImageStatusCache, ImageTaskTracker
+
+
+def _scripted_fetcher(states):
+    calls = []
+
+    async def fetch(task_id):
+        calls.append(task_id)
+        state = states[min(len(calls), len(states)) - 1]
+        return {"task_id": task_id, "status": state, "image_url": "u" if state == "completed" else None, "message": ""}
+
+    return fetch, calls
+
+
+async def _collect(tracker, task_id):
+    return [status["status"] async for status in tracker.subscribe(task_id)]
+
+
+def test_subscribers_share_one_upstream_poller():
+    fetch, calls = _scripted_fetcher(["processing", "processing", "processing", "completed"])
+    tracker = ImageTaskTracker(fetch, min_interval=0.01, max_interval=0.02)
+
+    async def main():
+        return await asyncio.gather(*(_collect(tracker, "t1") for _ in range(10)))
+
+    results = asyncio.run(main())
+
+    assert len(calls) == 4
+    assert all(result[-1] == "completed" for result in results)
+    assert all(result.count("completed") == 1 for result in results)
+
+
+def test_finished_task_replays_final_status_without_polling():
+    fetch, calls = _scripted_fetcher(["completed"])
+    tracker = ImageTaskTracker(fetch, min_interval=0.01)
+
+    async def main():
+        await _collect(tracker, "t1")
+        return await _collect(tracker, "t1")
+
+    assert asyncio.run(main()) == ["completed"]
+    assert len(calls) == 1
+    assert tracker.latest("t1")["image_url"] == "u"
+
+
+def test_heartbeat_yields_none_while_waiting():
+    fetch, _ = _scripted_fetcher(["processing"] * 5 + ["completed"])
+    tracker = ImageTaskTracker(fetch, min_interval=0.05, max_interval=0.05, backoff=1.0)
+
+    async def main():
+        seen = []
+        async for status in tracker.subscribe("t1", heartbeat=0.01):
+            seen.append(status)
+        return seen
+
+    seen = asyncio.run(main())
+    assert None in seen
+    assert seen[-1]["status"] == "completed"
+
+
+def test_status_cache_coalesces_concurrent_lookups():
+    calls = []
+
+    async def fetch(task_id):
+        calls.append(task_id)
+        await asyncio.sleep(0.01)
+        return {"task_id": task_id, "status": "processing", "image_url": None, "message": ""}
+
+    statuses = ImageStatusCache(fetch, ttl=60)
+
+    async def main():
+        await asyncio.gather(*(statuses.get("t1") for _ in range(20)))
+        await statuses.get("t1")
+
+    asyncio.run(main())
+    assert calls == ["t1"]
+
+
+def test_status_cache_keeps_terminal_states_and_expires_others():
+    fetch, calls = _scripted_fetcher(["processing", "completed", "processing"])
+    statuses = ImageStatusCache(fetch, ttl=0)
+
+    async def main():
+        first = await statuses.get("t1")
+        second = await statuses.get("t1")
+        third = await statuses.refresh("t1")
+        return first["status"], second["status"], third["status"]
+
+    assert asyncio.run(main()) == ("processing", "completed", "completed")
+    assert len(calls) == 2
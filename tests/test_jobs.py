@@ -0,0 +1,107 @@
+import asyncio
+
+from jobs import JobRegistry
+from shared_cache import SQLiteSharedCache
+
+
+def test_job_reports_progress_and_result():
+    registry = JobRegistry()
+
+    async def work(job):
+        job.set_stage("generating", total=3)
+        job.advance()
+        job.advance(ok=False)
+        job.advance()
+        return {"done": True}
+
+    async def main():
+        job = registry.start("test", work)
+        assert registry.get(job.id).status in ("queued", "running")
+        await asyncio.sleep(0.01)
+        return registry.get(job.id).to_dict()
+
+    job = asyncio.run(main())
+    assert job["status"] == "completed"
+    assert (job["completed"], job["failed"], job["progress"]) == (2, 1, 1.0)
+    assert job["result"] == {"done": True}
+
+
+def test_job_failure_is_recorded():
+    registry = JobRegistry()
+
+    async def work(job):
+        raise RuntimeError("boom")
+
+    async def main():
+        job = registry.start("test", work)
+        await asyncio.sleep(0.01)
+        return job.to_dict()
+
+    job = asyncio.run(main())
+    assert job["status"] == "failed" and job["error"] == "boom"
+
+
+def test_job_advances_in_steps_of_any_size():
+    registry = JobRegistry()
+
+    async def work(job):
+        job.set_stage("parsing", total=10)
+        job.advance(count=4)
+        assert job.to_dict()["progress"] == 0.4
+        job.advance(count=6)
+
+    async def main():
+        job = registry.start("test", work)
+        await asyncio.sleep(0.01)
+        return job.to_dict()
+
+    job = asyncio.run(main())
+    assert (job["stage"], job["completed"], job["progress"]) == ("parsing", 10, 1.0)
+
+
+def test_jobs_can_be_polled_from_another_worker(tmp_path):
+    shared_a = SQLiteSharedCache(tmp_path / "cache.sqlite3")
+    shared_b = SQLiteSharedCache(tmp_path / "cache.sqlite3")
+    worker_a = JobRegistry(shared=shared_a, publish_interval=0.01)
+    worker_b = JobRegistry(shared=shared_b)
+    release = asyncio.Event()
+
+    async def work(job):
+        job.set_stage("generating", total=2)
+        job.advance()
+        await release.wait()
+        job.advance()
+        return {"done": True}
+
+    async def main():
+        job = await worker_a.submit("test", work)
+        submitted = await worker_b.lookup(job.id)
+        while (await worker_b.lookup(job.id))["completed"] < 1:
+            await asyncio.sleep(0.01)
+        release.set()
+        while (await worker_b.lookup(job.id))["status"] != "completed":
+            await asyncio.sleep(0.01)
+        finished = await worker_b.lookup(job.id)
+        missing = await worker_b.lookup("no-such-job")
+        await shared_a.aclose()
+        await shared_b.aclose()
+        return job, submitted, finished, missing
+
+    job, submitted, finished, missing = asyncio.run(asyncio.wait_for(main(), 5))
+
+    assert worker_b.get(job.id) is None
+    assert submitted["id"] == job.id and submitted["kind"] == "test"
+    assert finished["result"] == {"done": True} and finished["progress"] == 1.0
+    assert missing is None
+
+
+def test_jobs_without_a_shared_cache_stay_in_their_worker():
+    worker_a, worker_b = JobRegistry(), JobRegistry()
+
+    async def main():
+        job = await worker_a.submit("test", lambda job: asyncio.sleep(0))
+        return await worker_a.lookup(job.id), await worker_b.lookup(job.id)
+
+    own, other = asyncio.run(main())
+
+    assert own["kind"] == "test" and other is None
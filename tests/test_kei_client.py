@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+
+from kei_client import KeiClient
+
+
+def test_kei_client_reuses_one_connection_pool():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json={"code": 200, "data": {"taskId": "t1"}})
+
+    client = KeiClient("secret", base_url="https://kei.test/api/v1", transport=httpx.MockTransport(handler))
+
+    async def main():
+        first = client.http
+        await client.create_task({"model": "m"})
+        await client.record_info("t1")
+        assert client.http is first
+        await client.aclose()
+
+    asyncio.run(main())
+
+    assert [str(r.url) for r in seen] == [
+        "https://kei.test/api/v1/jobs/createTask",
+        "https://kei.test/api/v1/jobs/recordInfo?taskId=t1",
+    ]
+    assert all(r.headers["Authorization"] == "Bearer secret" for r in seen)
+    assert client._http is None
+
+
+def test_kei_client_records_latency_by_endpoint_and_status():
+    def handler(request):
+        if request.url.path.endswith("recordInfo"):
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(429, json={"code": 429})
+
+    client = KeiClient("secret", base_url="https://kei.test/api/v1", transport=httpx.MockTransport(handler))
+
+    async def main():
+        await client.create_task({"model": "m"})
+        try:
+            await client.record_info("t1")
+        except httpx.ConnectError:
+            pass
+        await client.aclose()
+
+    asyncio.run(main())
+
+    assert client.request_seconds.get("/jobs/createTask", "429") == 1
+    assert client.request_seconds.get("/jobs/recordInfo", "ConnectError") == 1
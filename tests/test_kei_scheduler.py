@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import httpx
+
+from kei_scheduler import KeiScheduler, TokenBucket, PRIORITY_BATCH, PRIORITY_INTERACTIVE, parse_model_limits
+
+
+def _ok(taskId="t"):
+    return httpx.Response(200, json={"code": 200, "data": {"taskId": taskId}})
+
+
+def test_interactive_jobs_run_before_queued_batch_jobs():
+    order = []
+
+    async def send(payload):
+        order.append(payload["name"])
+        await asyncio.sleep(0.01)
+        return _ok()
+
+    async def main():
+        scheduler = KeiScheduler(send, rate=1000, burst=1000, default_concurrency=1)
+        batch = [asyncio.create_task(scheduler.submit("m", {"name": f"b{i}"}, PRIORITY_BATCH)) for i in range(3)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(scheduler.submit("m", {"name": "i"}, PRIORITY_INTERACTIVE))
+        await asyncio.gather(*batch, interactive)
+
+    asyncio.run(main())
+    assert order == ["b0", "i", "b1", "b2"]
+
+
+def test_per_model_concurrency_cap():
+    running = {"m": 0, "peak": 0}
+
+    async def send(payload):
+        running["m"] += 1
+        running["peak"] = max(running["peak"], running["m"])
+        await asyncio.sleep(0.01)
+        running["m"] -= 1
+        return _ok()
+
+    async def main():
+        scheduler = KeiScheduler(send, rate=1000, burst=1000, model_concurrency={"m": 2})
+        await asyncio.gather(*(scheduler.submit("m", {}) for _ in range(6)))
+        return scheduler.metrics()
+
+    metrics = asyncio.run(main())
+    assert running["peak"] == 2
+    assert metrics["queue_depth"] == 0 and metrics["dispatched"] == 6
+
+
+def test_retries_rate_limited_responses():
+    responses = [httpx.Response(429), httpx.Response(200, json={"code": 429}), _ok("done")]
+
+    async def send(payload):
+        return responses.pop(0)
+
+    async def main():
+        scheduler = KeiScheduler(send, rate=1000, burst=1000, base_delay=0.001)
+        response = await scheduler.submit("m", {})
+        return response, scheduler.metrics()
+
+    response, metrics = asyncio.run(main())
+    assert response.json()["data"]["taskId"] == "done"
+    assert metrics["retries"] == 2
+
+
+def test_gives_up_after_max_retries():
+    async def send(payload):
+        return httpx.Response(503)
+
+    async def main():
+        scheduler = KeiScheduler(send, rate=1000, burst=1000, max_retries=2, base_delay=0.001)
+        return await scheduler.submit("m", {})
+
+    assert asyncio.run(main()).status_code == 503
+
+
+def test_json_bodies_that_are_not_objects_are_returned_as_is():
+    async def send(payload):
+        return httpx.Response(200, json=["unexpected"])
+
+    async def main():
+        scheduler = KeiScheduler(send, rate=1000, burst=1000, base_delay=0.001)
+        return await scheduler.submit("m", {}), scheduler.metrics()
+
+    response, metrics = asyncio.run(main())
+    assert response.json() == ["unexpected"]
+    assert metrics["retries"] == 0 and metrics["failures"] == 0
+
+
+def test_read_timeouts_are_not_retried():
+    attempts = []
+
+    async def send(payload):
+        attempts.append(payload)
+        raise httpx.ReadTimeout("no answer")
+
+    async def main():
+        scheduler = KeiScheduler(send, rate=1000, burst=1000, base_delay=0.001)
+        try:
+            await scheduler.submit("m", {})
+        except httpx.ReadTimeout:
+            return scheduler.metrics()
+
+    metrics = asyncio.run(main())
+    assert len(attempts) == 1
+    assert metrics["retries"] == 0 and metrics["failures"] == 1
+
+
+def test_retries_that_may_duplicate_a_task_are_logged_as_such(caplog):
+    responses = [httpx.ConnectError("refused"), httpx.Response(502), httpx.Response(429), _ok("done")]
+
+    async def send(payload):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def main():
+        scheduler = KeiScheduler(send, rate=1000, burst=1000, base_delay=0.001)
+        return await scheduler.submit("m", {})
+
+    with caplog.at_level("WARNING", logger="kei_scheduler"):
+        assert asyncio.run(main()).json()["data"]["taskId"] == "done"
+
+    duplicates = [record.message for record in caplog.records if "duplicate" in record.message]
+    assert len(caplog.records) == 3
+    assert duplicates == ["Kei.ai m answered 502, retrying; this may create a duplicate task"]
+
+
+def test_token_bucket_limits_rate():
+    async def main():
+        bucket = TokenBucket(rate=100, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.045
+
+
+def test_parse_model_limits():
+    assert parse_model_limits("google/nano-banana=8, flux-kontext-max=2,bad,x=") == {
+        "google/nano-banana": 8, "flux-kontext-max": 2
+    }
@@ -0,0 +1,53 @@
+from keyword_index import KeywordIndex
+
+
+def test_rank_prefers_terms_rare_in_the_library():
+    index = KeywordIndex()
+    for i in range(5):
+        index.set_topic(f"t{i}", "ch", f"Chapter {i} covers Figure drawings.")
+    index.set_topic("t5", "ch", "Photosynthesis happens in leaves.")
+
+    ranked = index.rank("Figure shows the Chapter on Photosynthesis and Chlorophyll.")
+
+    assert ranked == ["Chlorophyll", "Photosynthesis", "Figure", "Chapter"]
+
+
+def test_rank_on_empty_index_orders_by_frequency_then_position():
+    index = KeywordIndex()
+
+    assert index.rank("Ocean meets Land. Rain falls on Land and Land.") == ["Land", "Ocean", "Rain"]
+    assert index.rank("Sun and SUN and sun") == ["Sun"]
+
+
+def test_replacing_and_removing_topics_updates_document_frequencies():
+    index = KeywordIndex()
+    index.set_topic("t1", "ch1", "Water and Ice")
+    index.set_topic("t2", "ch1", "Water vapour")
+    index.set_topic("t3", "ch2", "Water cycle")
+    assert index.df["water"] == 3
+
+    index.set_topic("t2", "ch1", "Steam rises")
+    assert (index.df["water"], index.df["steam"]) == (2, 1)
+
+    index.remove_chapter("ch1")
+    assert dict(index.df) == {"water": 1}
+    assert index.stats()["topics"] == 1 and index.stats()["chapters"] == 1
+
+    index.remove_topic("t3")
+    assert not index.df and len(index) == 0
+
+
+def test_writes_during_the_initial_load_win_over_loaded_rows():
+    index = KeywordIndex()
+    index.begin_load()
+    index.set_topic("t1", "ch1", "Fresh Content")
+    index.remove_chapter("ch2")
+    index.load([
+        {"id": "t1", "chapter_id": "ch1", "content": "Stale Content"},
+        {"id": "t2", "chapter_id": "ch2", "content": "Deleted"},
+        {"id": "t3", "chapter_id": "ch3", "content": "Kept"}
+    ])
+    index.end_load()
+
+    assert set(index.df) == {"fresh content", "kept"}
+    assert index.ready
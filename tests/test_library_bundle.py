@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import zipfile
+
+import pytest
+
+from library_bundle import (
+    BundleWriter, MANIFEST_NAME, available_formats, export_bundle, is_bundle, iter_members, restore_bundle
+)
+
+IMAGE_DATA = b"\x89PNG fake image"
+IMAGE_NAME = f"{hashlib.sha256(IMAGE_DATA).hexdigest()}.png"
+
+
+def seed_library(sb, chapters=5):
+    for n in range(chapters):
+        chapter_id = f"c{n:03d}"
+        sb.tables.setdefault("chapters", []).append({"id": chapter_id, "title": f"Chapter {n}", "subject": "science"})
+        topic_id = f"t{n:03d}"
+        sb.tables.setdefault("topics", []).append({
+            "id": topic_id, "chapter_id": chapter_id, "title": f"Topic {n}", "order_index": 0,
+            "illustration": f"https://old.example/api/images/{IMAGE_NAME}" if n % 2 else None
+        })
+        sb.tables.setdefault("hotspots", []).append({"id": f"h{n:03d}", "topic_id": topic_id, "title": "Spot"})
+        sb.tables.setdefault("annotations", []).append({"id": f"a{n:03d}", "topic_id": topic_id, "type": "note"})
+
+
+def write_export(db, path, bundle_format, image_path=None, page_size=2):
+    async def run():
+        chunks = [chunk async for chunk in export_bundle(db, bundle_format, image_path, page_size=page_size)]
+        path.write_bytes(b"".join(chunks))
+        return chunks
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("bundle_format", available_formats())
+def test_export_then_restore_round_trips_rows_and_images(tmp_path, fake_sb, fake_db, bundle_format):
+    seed_library(fake_sb)
+    image_file = tmp_path / IMAGE_NAME
+    image_file.write_bytes(IMAGE_DATA)
+    path = tmp_path / f"library.{bundle_format}"
+
+    write_export(fake_db, path, bundle_format, lambda name: image_file if name == IMAGE_NAME else None)
+
+    assert is_bundle(path)
+    names = [name for name, _ in iter_members(path)]
+    assert names[0] == MANIFEST_NAME
+    assert names.count(f"images/{IMAGE_NAME}") == 1
+    assert [name.split("/")[0] for name in names[1:] if not name.startswith("images/")] == \
+        ["chapters"] * 3 + ["topics"] * 3 + ["hotspots"] * 3 + ["annotations"] * 3
+
+    original = {table: [dict(row) for row in rows] for table, rows in fake_sb.tables.items()}
+    fake_sb.tables.clear()
+    saved = {}
+    pages = []
+
+    async def on_rows(table, rows):
+        pages.append((table, len(rows)))
+
+    counts = asyncio.run(restore_bundle(
+        path, fake_db, save_image=saved.__setitem__, image_url=lambda name: f"/api/images/{name}", on_rows=on_rows
+    ))
+
+    assert counts == {"chapters": 5, "topics": 5, "hotspots": 5, "annotations": 5, "images": 1}
+    assert saved == {IMAGE_NAME: IMAGE_DATA}
+    assert pages[:3] == [("chapters", 2), ("chapters", 2), ("chapters", 1)]
+    for table in ("chapters", "hotspots", "annotations"):
+        assert fake_sb.tables[table] == original[table]
+    restored_topics = {row["id"]: row for row in fake_sb.tables["topics"]}
+    assert restored_topics["t001"]["illustration"] == f"/api/images/{IMAGE_NAME}"
+    assert restored_topics["t000"]["illustration"] is None
+
+
+def test_zip_export_is_yielded_page_by_page(tmp_path, fake_sb, fake_db):
+    seed_library(fake_sb)
+
+    chunks = write_export(fake_db, tmp_path / "library.zip", "zip")
+
+    # One chunk per table page plus the central directory, not one blob at the end
+    assert len(chunks) == 4 * 3 + 1
+    assert chunks[0].startswith(b"PK")
+
+
+def test_restore_keeps_image_urls_when_bundle_has_no_images(tmp_path, fake_sb, fake_db):
+    seed_library(fake_sb, chapters=2)
+    path = tmp_path / "library.zip"
+    write_export(fake_db, path, "zip")
+
+    counts = asyncio.run(restore_bundle(path, fake_db, save_image=lambda *_: None, image_url=lambda name: "local"))
+
+    assert counts["images"] == 0
+    assert fake_sb.tables["topics"][1]["illustration"] == f"https://old.example/api/images/{IMAGE_NAME}"
+    # Upserted by id, so restoring over the same library duplicates nothing
+    assert len(fake_sb.tables["chapters"]) == 2
+
+
+def test_export_of_empty_library_is_a_valid_bundle(tmp_path, fake_db):
+    path = tmp_path / "library.tar.gz"
+    write_export(fake_db, path, "tar.gz")
+
+    assert [name for name, _ in iter_members(path)] == [MANIFEST_NAME]
+    assert asyncio.run(restore_bundle(path, fake_db))["chapters"] == 0
+
+
+def test_restore_rejects_archives_without_manifest(tmp_path, fake_db):
+    path = tmp_path / "chapters.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("biology/cells.md", "## Cells")
+
+    assert not is_bundle(path)
+    with pytest.raises(ValueError, match="missing manifest.json"):
+        asyncio.run(restore_bundle(path, fake_db))
+
+
+def test_bundle_writer_rejects_unknown_formats():
+    with pytest.raises(ValueError, match="Unsupported bundle format"):
+        BundleWriter("rar")
@@ -0,0 +1,108 @@
+import asyncio
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from metrics import (
+    Counter, Gauge, Histogram, MetricsMiddleware, RequestMetrics, UNMATCHED_ROUTE, cache_metrics, note_storage_call,
+    render
+)
+
+
+def test_render_counters_and_gauges_with_escaped_labels():
+    counter = Counter("jobs_total", "Jobs run", ["kind"])
+    counter.inc("import")
+    counter.inc("import", amount=2)
+    counter.inc('say "hi"\n')
+    gauge = Gauge("queue_depth", "Jobs waiting")
+    gauge.set(3)
+    gauge.dec()
+
+    assert render([counter, gauge]) == (
+        "# HELP jobs_total Jobs run\n"
+        "# TYPE jobs_total counter\n"
+        'jobs_total{kind="import"} 3\n'
+        'jobs_total{kind="say \\"hi\\"\\n"} 1\n'
+        "# HELP queue_depth Jobs waiting\n"
+        "# TYPE queue_depth gauge\n"
+        "queue_depth 2\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "/a")
+
+    lines = render([histogram]).splitlines()[2:]
+
+    assert lines == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+    assert histogram.get("/a") == 4 and histogram.get("/b") == 0
+
+
+def test_cache_metrics_skip_missing_caches():
+    families = cache_metrics({
+        "chapters": {"size": 2, "hits": 3, "misses": 1, "evictions": 0, "hit_ratio": 0.75},
+        "shared": None
+    })
+    text = render(families)
+
+    assert 'cache_hit_ratio{cache="chapters"} 0.75' in text
+    assert 'cache_hits_total{cache="chapters"} 3' in text
+    assert "shared" not in text
+
+
+def _app(fake_db, request_metrics, seen_in_flight):
+    app = FastAPI()
+
+    @app.get("/api/chapters/{chapter_id}")
+    async def get_chapter(chapter_id: str):
+        seen_in_flight.append(request_metrics.in_flight.get("GET", "/api/chapters/{chapter_id}"))
+        await fake_db.execute(fake_db.table("chapters").select("*").eq("id", chapter_id))
+        for _ in range(2):
+            await fake_db.execute(fake_db.table("topics").select("*").eq("chapter_id", chapter_id))
+        if chapter_id == "missing":
+            raise HTTPException(status_code=404, detail="Chapter not found")
+        return {"id": chapter_id}
+
+    app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+    return app
+
+
+def test_middleware_records_route_templates_status_and_round_trips(fake_db):
+    request_metrics = RequestMetrics()
+    seen_in_flight = []
+    client = TestClient(_app(fake_db, request_metrics, seen_in_flight))
+
+    assert client.get("/api/chapters/c1").status_code == 200
+    assert client.get("/api/chapters/missing").status_code == 404
+    assert client.get("/wp-login.php").status_code == 404
+    assert client.post("/api/chapters/c1").status_code == 405
+
+    route = "/api/chapters/{chapter_id}"
+    assert seen_in_flight == [1, 1]
+    assert request_metrics.in_flight.get("GET", route) == 0
+    assert request_metrics.duration.get("GET", route, "200") == 1
+    assert request_metrics.duration.get("GET", route, "404") == 1
+    assert request_metrics.duration.get("GET", UNMATCHED_ROUTE, "404") == 1
+    assert request_metrics.duration.get("POST", route, "405") == 1
+    assert request_metrics.round_trips.get("GET", route) == 2
+    assert request_metrics.storage_queries.get("GET", route, "chapters", "select") == 2
+    assert request_metrics.storage_queries.get("GET", route, "topics", "select") == 4
+    text = render(request_metrics.metrics())
+    assert 'http_request_storage_round_trips_bucket{method="GET",route="/api/chapters/{chapter_id}",le="3"} 2' in text
+    assert fake_db.query_seconds.get("topics", "select") == 4
+
+
+def test_storage_calls_outside_requests_are_not_counted(fake_db):
+    note_storage_call("chapters", "select")
+
+    asyncio.run(fake_db.execute(fake_db.table("chapters").select("*")))
+
+    assert fake_db.query_seconds.get("chapters", "select") == 1
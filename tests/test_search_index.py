@@ -0,0 +1,96 @@
+import random
+
+from search_index import SearchIndex, snippet
+
+
+def make_index():
+    index = SearchIndex()
+    index.set_chapter({"id": "ch1", "title": "Plants", "description": "How plants make food"})
+    index.set_topic({"id": "t1", "title": "Photosynthesis", "content": "Leaves turn light into sugar."}, "ch1")
+    index.set_topic({"id": "t2", "title": "Roots", "content": "Roots take up water and minerals."}, "ch1")
+    index.set_hotspot({"id": "h1", "topic_id": "t1", "title": "Chlorophyll",
+                       "description": "The pigment that absorbs light", "fun_fact": None}, "ch1")
+    index.set_chapter({"id": "ch2", "title": "Weather", "description": "Rain, light and wind"})
+    return index
+
+
+def test_search_ranks_title_matches_and_reports_where_they_are():
+    results = make_index().search("light")
+
+    assert {(r["type"], r["id"]) for r in results} == {("topic", "t1"), ("hotspot", "h1"), ("chapter", "ch2")}
+    hotspot = next(r for r in results if r["type"] == "hotspot")
+    assert (hotspot["chapter_id"], hotspot["topic_id"], hotspot["title"]) == ("ch1", "t1", "Chlorophyll")
+    assert make_index().search("photosynthesis")[0]["id"] == "t1"
+
+
+def test_last_term_matches_as_a_prefix():
+    index = make_index()
+
+    assert [r["id"] for r in index.search("chloro")] == ["h1"]
+    assert index.search("chloro", prefix=False) == []
+    assert [r["id"] for r in index.search("water ro")][0] == "t2"
+
+
+def test_filters_by_kind_and_chapter():
+    index = make_index()
+
+    assert [r["id"] for r in index.search("light", kinds={"chapter"})] == ["ch2"]
+    assert {r["id"] for r in index.search("light", chapter_id="ch1")} == {"t1", "h1"}
+
+
+def test_writes_update_the_index_incrementally():
+    index = make_index()
+    index.set_topic({"id": "t2", "content": "Roots anchor the plant."}, "ch1")
+    index.replace_hotspots("t1", "ch1", [{"id": "h2", "title": "Stomata", "description": "Pores"}])
+
+    assert index.search("water") == []
+    assert index.search("roots")[0]["title"] == "Roots"  # title kept from the earlier write
+    assert [r["id"] for r in index.search("stomata")] == ["h2"]
+    assert index.search("chlorophyll") == []
+
+    index.remove_chapter("ch1")
+    assert {r["id"] for r in index.search("plants light roots stomata")} == {"ch2"}
+    assert index.stats()["documents"] == 1
+
+
+def test_top_k_matches_exhaustive_bm25_ranking():
+    rng = random.Random(1)
+    words = [f"w{i}" for i in range(30)]
+    index = SearchIndex()
+    for i in range(300):
+        index.set_topic({"id": f"t{i}", "title": rng.choice(words),
+                         "content": " ".join(rng.choices(words, k=rng.randint(1, 40)))}, f"ch{i % 7}")
+
+    for query in ("w1", "w2 w3", "w4 w5 w6 w7", "w1"):
+        everything = index.search(query, limit=1000, prefix=False)
+        top = index.search(query, limit=10, prefix=False)
+        assert [r["score"] for r in top] == [r["score"] for r in everything[:10]]
+        by_chapter = index.search(query, limit=1000, prefix=False, chapter_id="ch3")
+        assert [r["id"] for r in by_chapter] == [r["id"] for r in everything if r["chapter_id"] == "ch3"]
+
+
+def test_loaded_rows_do_not_override_writes_made_during_the_load():
+    index = SearchIndex()
+    index.begin_load()
+    index.set_topic({"id": "t1", "title": "Fresh"}, "ch1")
+    index.remove_chapter("ch2")
+    index.load_chapters([{"id": "ch1", "title": "Plants"}, {"id": "ch2", "title": "Gone"}])
+    index.load_topics([{"id": "t1", "chapter_id": "ch1", "title": "Stale"},
+                       {"id": "t2", "chapter_id": "ch2", "title": "Gone"}])
+    index.load_hotspots([{"id": "h1", "topic_id": "t2", "title": "Gone"}])
+    assert [r["id"] for r in index.search("fresh")] == ["t1"]
+    index.end_load()
+
+    assert index.search("stale") == [] and index.search("gone") == []
+    assert [r["id"] for r in index.search("plants")] == ["ch1"]
+    assert index.ready
+
+
+def test_snippet_centres_on_the_first_match():
+    text = "Intro words. " * 20 + "Here the Chlorophyll absorbs light. " + "Outro words. " * 20
+
+    cut = snippet(text, ["chlorophyll"], width=60)
+
+    assert cut.startswith("…") and cut.endswith("…")
+    assert "Chlorophyll" in cut and len(cut) <= 62
+    assert snippet("Short text", ["x"]) == "Short text"
@@ -0,0 +1,471 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import http_cache
+import server
+from chapter_store import encode_cursor
+from http_cache import coded_etag
+from tests.fakes import seed_library
+
+
+def _clear_caches():
+    for cache in (server.chapter_cache.docs, server.rendered_chapters, server.rendered_chapter_lists):
+        cache.clear()
+
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "get_database", lambda: fake_db)
+
+    async def no_index_load():
+        # The startup load would race the tests' own queries on fake_sb.calls
+        pass
+
+    monkeypatch.setattr(server, "build_library_indexes", no_index_load)
+    _clear_caches()
+    with TestClient(server.app) as client:
+        yield client
+    _clear_caches()
+
+
+def _wait_for_job(client, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def _topic(fake_sb, topic_id):
+    return next(row for row in fake_sb.tables["topics"] if row["id"] == topic_id)
+
+
+@pytest.fixture
+def illustrate(monkeypatch):
+    """Point the illustration job at a fake image generator that runs `during` before answering"""
+    monkeypatch.setattr(server, "KEI_API_KEY", "secret")
+    hooks = {"during": lambda: None}
+
+    async def request_image(request, priority=server.PRIORITY_INTERACTIVE):
+        hooks["during"]()
+        return server.ImageGenerationResponse(
+            task_id=f"task-{len(request.prompt)}", status="completed", message="ok",
+            image_url=f"https://img.test/{abs(hash(request.prompt))}.png"
+        )
+
+    monkeypatch.setattr(server, "request_image", request_image)
+    return hooks
+
+
+def test_illustrate_keeps_topic_edits_made_while_generating(client, fake_sb, illustrate):
+    seed_library(fake_sb, chapters=1, topics=2)
+    illustrate["during"] = lambda: _topic(fake_sb, "ch-0-t0").update(title="Edited", content="New text")
+
+    job = _wait_for_job(client, client.post("/api/chapters/ch-0/illustrate").json()["id"])
+
+    assert job["status"] == "completed"
+    assert sorted(job["result"]["illustrations"]) == ["ch-0-t0", "ch-0-t1"]
+    edited = _topic(fake_sb, "ch-0-t0")
+    assert edited["title"] == "Edited" and edited["content"] == "New text"
+    assert edited["illustration"].startswith("https://img.test/") and edited["illustration_prompt"]
+    topics = client.get("/api/chapters/ch-0").json()["topics"]
+    assert all(topic["illustration"] for topic in topics)
+
+
+def test_illustrate_does_not_restore_a_chapter_deleted_while_generating(client, fake_sb, illustrate):
+    seed_library(fake_sb, chapters=2, topics=2)
+
+    def delete_chapter():
+        # What the ON DELETE CASCADE of the chapter does to its topics
+        fake_sb.tables["chapters"] = [row for row in fake_sb.tables["chapters"] if row["id"] != "ch-0"]
+        fake_sb.tables["topics"] = [row for row in fake_sb.tables["topics"] if row["chapter_id"] != "ch-0"]
+
+    illustrate["during"] = delete_chapter
+
+    job = _wait_for_job(client, client.post("/api/chapters/ch-0/illustrate").json()["id"])
+
+    assert job["status"] == "completed"
+    assert job["result"]["illustrations"] == {}
+    assert sorted(job["result"]["deleted"]) == ["ch-0-t0", "ch-0-t1"]
+    assert all(row["chapter_id"] == "ch-1" for row in fake_sb.tables["topics"])
+    assert not any(row.get("illustration") for row in fake_sb.tables["topics"])
+    assert client.get("/api/chapters/ch-0").status_code == 404
+
+
+def test_illustrate_saves_a_bounded_number_of_topics_at_a_time(client, fake_sb, fake_db, illustrate, monkeypatch):
+    seed_library(fake_sb, chapters=1, topics=12)
+    execute = fake_db.execute
+    in_flight, peak = [0], [0]
+
+    async def counting_execute(query):
+        if getattr(query, "op", None) != "update":
+            return await execute(query)
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        try:
+            await asyncio.sleep(0.01)
+            return await execute(query)
+        finally:
+            in_flight[0] -= 1
+
+    monkeypatch.setattr(fake_db, "execute", counting_execute)
+
+    job = _wait_for_job(client, client.post("/api/chapters/ch-0/illustrate").json()["id"])
+
+    assert job["status"] == "completed" and len(job["result"]["illustrations"]) == 12
+    assert peak[0] == server.MAX_PARALLEL_CHUNKS
+
+
+def test_get_chapters_rejects_cursors_with_filter_syntax(client, fake_sb):
+    seed_library(fake_sb, chapters=1, topics=1)
+    forged = encode_cursor({"created_at": "2026-01-01T00:00:00+00:00", "id": "x),id.neq.0,and(id.eq.1"})
+
+    response = client.get("/api/chapters", params={"limit": 1, "cursor": forged})
+
+    assert response.status_code == 400
+    assert ("chapters", "select") not in fake_sb.calls
+
+
+def test_get_chapters_fields_topics_keeps_only_requested_fields(client, fake_sb):
+    seed_library(fake_sb, chapters=2, topics=2)
+
+    chapters = client.get("/api/chapters", params={"fields": "title,topics"}).json()
+
+    assert [set(chapter) for chapter in chapters] == [{"title", "topics"}] * 2
+    assert all(len(chapter["topics"]) == 2 for chapter in chapters)
+
+
+def test_search_index_follows_chapters_written_by_other_workers(client, fake_sb):
+    seed_library(fake_sb, chapters=1, topics=1)
+
+    async def deliver(key):
+        # What the shared cache's poller does with another worker's invalidation
+        server.on_shared_invalidation(key)
+        await server.index_refresh
+
+    fake_sb.tables["topics"][0]["title"] = "Quasars"
+    client.portal.call(deliver, "chapter:ch-0")
+    assert _search(client, "quasars") == ["ch-0-t0"]
+
+    fake_sb.tables["topics"][0]["title"] = "Pulsars"
+    client.portal.call(deliver, "chapter:ch-0")
+    assert _search(client, "quasars") == [] and _search(client, "pulsars") == ["ch-0-t0"]
+
+    fake_sb.tables["chapters"].clear()
+    client.portal.call(deliver, "chapter:ch-0")
+    assert _search(client, "pulsars") == []
+
+
+def _search(client, q):
+    return [hit["id"] for hit in client.get("/api/search", params={"q": q}).json()["results"]]
+
+
+def test_update_topic_during_the_index_load_indexes_the_whole_row(client, fake_sb):
+    seed_library(fake_sb, chapters=1, topics=1, hotspots=0)
+    _topic(fake_sb, "ch-0-t0")["content"] = "Chlorophyll absorbs light"
+    server.keyword_index.begin_load()
+    server.search_index.begin_load()
+    # Read by the load before the update lands
+    loaded = [dict(row) for row in fake_sb.tables["topics"]]
+
+    assert client.put("/api/chapters/ch-0/topics/ch-0-t0", json={"title": "Leaves"}).status_code == 200
+    assert client.put("/api/chapters/ch-0/topics/missing", json={"title": "Phantom"}).status_code == 200
+    server.keyword_index.load(loaded)
+    server.search_index.load_topics(loaded)
+    server.keyword_index.end_load()
+    server.search_index.end_load()
+
+    assert _search(client, "leaves") == ["ch-0-t0"]
+    assert _search(client, "chlorophyll") == ["ch-0-t0"]
+    assert _search(client, "phantom") == []
+
+
+def _chapter(client, chapter_id="ch-0"):
+    response = client.get(f"/api/chapters/{chapter_id}")
+    return response.json() if response.status_code == 200 else response.status_code
+
+
+def _first_topic(chapter):
+    return next(topic for topic in chapter["topics"] if topic["id"] == "ch-0-t0")
+
+
+def test_update_topic_invalidates_the_cached_chapter(client, fake_sb):
+    seed_library(fake_sb, chapters=1, topics=2)
+    assert _first_topic(_chapter(client))["title"] == "Topic 0"
+
+    response = client.put("/api/chapters/ch-0/topics/ch-0-t0", json={"title": "Renamed", "hotspots": []})
+
+    assert response.status_code == 200
+    topic = _first_topic(_chapter(client))
+    assert topic["title"] == "Renamed" and topic["hotspots"] == []
+
+
+def test_add_hotspot_and_annotation_invalidate_the_cached_chapter(client, fake_sb):
+    seed_library(fake_sb, chapters=1, topics=1, hotspots=1, annotations=1)
+    before = _first_topic(_chapter(client))
+
+    client.post("/api/chapters/ch-0/topics/ch-0-t0/hotspots",
+                json={"id": "h-new", "x": 5, "y": 5, "label": "N", "title": "New", "description": "D"})
+    after_hotspot = _first_topic(_chapter(client))
+    client.post("/api/chapters/ch-0/topics/ch-0-t0/annotations", json={"id": "a-new", "type": "box", "x": 1, "y": 1})
+    after_annotation = _first_topic(_chapter(client))
+
+    assert [h["id"] for h in before["hotspots"]] == ["ch-0-t0-h0"]
+    assert [h["id"] for h in after_hotspot["hotspots"]] == ["ch-0-t0-h0", "h-new"]
+    assert [a["id"] for a in after_annotation["annotations"]] == ["ch-0-t0-a0", "a-new"]
+
+
+def test_favorite_and_delete_invalidate_the_cached_chapter(client, fake_sb):
+    seed_library(fake_sb, chapters=1, topics=1)
+    assert _chapter(client)["favorite"] is False
+
+    client.put("/api/chapters/ch-0/favorite", json={"favorite": True})
+    assert _chapter(client)["favorite"] is True
+    assert client.get("/api/chapters").json()[0]["favorite"] is True
+
+    assert client.delete("/api/chapters/ch-0").status_code == 200
+    assert _chapter(client) == 404
+
+
+def test_illustrate_job_invalidates_the_cached_chapter(client, fake_sb, illustrate):
+    seed_library(fake_sb, chapters=1, topics=2)
+    assert not any(topic.get("illustration") for topic in _chapter(client)["topics"])
+
+    job = _wait_for_job(client, client.post("/api/chapters/ch-0/illustrate").json()["id"])
+
+    assert job["status"] == "completed"
+    assert all(topic["illustration"] for topic in _chapter(client)["topics"])
+
+
+def test_imported_batches_reach_cached_reads(client, fake_sb, monkeypatch):
+    seed_library(fake_sb, chapters=1, topics=1)
+    monkeypatch.setattr(server, "get_import_pool", lambda: ThreadPoolExecutor(max_workers=2))
+    assert [chapter["id"] for chapter in client.get("/api/chapters").json()] == ["ch-0"]
+    lines = [{"title": f"Imported {i}", "subject": "science", "content": f"## Part\nText {i}"} for i in range(3)]
+    body = "\n".join(json.dumps(line) for line in lines).encode()
+
+    job = _wait_for_job(client, client.post("/api/import", files={"file": ("lib.ndjson", body)}).json()["id"])
+
+    assert job["status"] == "completed" and job["result"]["imported"] == 3
+    chapters = client.get("/api/chapters").json()
+    assert sorted(chapter["title"] for chapter in chapters) == ["Chapter 0", "Imported 0", "Imported 1", "Imported 2"]
+    imported = next(chapter for chapter in chapters if chapter["title"] == "Imported 0")
+    assert _chapter(client, imported["id"])["topics"][0]["title"] == "Part"
+
+
+IMAGE_BYTES = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def stored_image():
+    name = f"{hashlib.sha256(IMAGE_BYTES).hexdigest()}.png"
+    server.image_store.save_original(name, IMAGE_BYTES)
+    return name
+
+
+def test_get_image_answers_if_none_match_with_304(client, stored_image):
+    first = client.get(f"/api/images/{stored_image}")
+
+    assert first.status_code == 200 and first.content == IMAGE_BYTES
+    assert first.headers["content-type"] == "image/png" and first.headers["accept-ranges"] == "bytes"
+    etag = first.headers["etag"]
+    revalidated = client.get(f"/api/images/{stored_image}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+
+
+def test_get_image_serves_a_single_range(client, stored_image):
+    response = client.get(f"/api/images/{stored_image}", headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.content == IMAGE_BYTES[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(IMAGE_BYTES)}"
+    assert response.headers["content-length"] == "100"
+
+
+def test_get_image_ignores_the_range_when_if_range_does_not_match(client, stored_image):
+    response = client.get(f"/api/images/{stored_image}", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+
+    assert response.status_code == 200 and response.content == IMAGE_BYTES
+
+
+def test_get_image_rejects_an_unsatisfiable_range(client, stored_image):
+    response = client.get(f"/api/images/{stored_image}", headers={"Range": f"bytes={len(IMAGE_BYTES)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(IMAGE_BYTES)}"
+
+
+def test_mirrored_image_urls_are_absolute(client, monkeypatch):
+    async def mirror(url):
+        return "ab" * 32 + ".png"
+
+    monkeypatch.setattr(server.image_store, "mirror", mirror)
+
+    url = client.portal.call(server.mirror_image_url, "https://cdn.test/a.png")
+
+    assert url == f"http://testserver/api/images/{'ab' * 32}.png"
+
+
+def test_startup_fails_without_an_absolute_public_base_url(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "get_database", lambda: fake_db)
+    monkeypatch.setattr(server, "PUBLIC_BASE_URL", "")
+
+    with pytest.raises(RuntimeError, match="PUBLIC_BASE_URL"):
+        with TestClient(server.app):
+            pass
+
+
+@pytest.fixture
+def ingest_gates(monkeypatch):
+    """Hold each stage of the ingest job until the test sets its event"""
+    gates = {stage: threading.Event() for stage in ("parsing", "generating", "saving")}
+    iter_sections, topic_from_section, save_chapter = server.iter_sections, server.topic_from_section, server.save_chapter
+
+    def gated_iter_sections(content):
+        gates["parsing"].wait(5)
+        return iter_sections(content)
+
+    def gated_topic_from_section(section):
+        gates["generating"].wait(5)
+        return topic_from_section(section)
+
+    async def gated_save_chapter(db, chapter_data, topics):
+        await asyncio.to_thread(gates["saving"].wait, 5)
+        return await save_chapter(db, chapter_data, topics)
+
+    monkeypatch.setattr(server, "iter_sections", gated_iter_sections)
+    monkeypatch.setattr(server, "topic_from_section", gated_topic_from_section)
+    monkeypatch.setattr(server, "save_chapter", gated_save_chapter)
+    return gates
+
+
+def _wait_for_stage(client, job_id, stage, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["stage"] == stage:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not reach {stage}")
+
+
+CHAPTER_BODY = {"title": "Plants", "subject": "biology", "content": "## Leaves\nChlorophyll.\n\n## Roots\nWater."}
+
+
+def test_async_create_chapter_reports_each_stage_until_the_chapter_is_saved(client, fake_sb, ingest_gates):
+    response = client.post("/api/chapters", params={"async": "true"}, json=CHAPTER_BODY)
+
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    for stage in ("parsing", "generating", "saving"):
+        job = _wait_for_stage(client, job_id, stage)
+        assert job["status"] == "running" and job["kind"] == "ingest"
+        ingest_gates[stage].set()
+    job = _wait_for_job(client, job_id)
+
+    assert job["status"] == "completed" and job["stage"] == "saving" and job["progress"] == 1.0
+    chapter = job["result"]
+    assert chapter["title"] == "Plants" and [topic["title"] for topic in chapter["topics"]] == ["Leaves", "Roots"]
+    stored = _chapter(client, chapter["id"])
+    assert [topic["title"] for topic in stored["topics"]] == ["Leaves", "Roots"]
+
+
+def test_async_create_chapter_fails_the_job_when_generation_raises(client, fake_sb, ingest_gates, monkeypatch):
+    def fail(section):
+        raise RuntimeError("hotspot generation unavailable")
+
+    monkeypatch.setattr(server, "topic_from_section", fail)
+    ingest_gates["parsing"].set()
+
+    job = _wait_for_job(client, client.post("/api/chapters", params={"async": "true"}, json=CHAPTER_BODY).json()["id"])
+
+    assert job["status"] == "failed" and job["stage"] == "generating"
+    assert job["error"] == "hotspot generation unavailable" and job["result"] is None
+    assert not fake_sb.tables.get("chapters")
+
+
+@pytest.fixture
+def large_library(fake_sb):
+    # Past COMPRESS_MIN_SIZE, so the chapter and the list are worth compressing
+    seed_library(fake_sb, chapters=2, topics=2, hotspots=0)
+    for row in fake_sb.tables["topics"]:
+        row["content"] = "Photosynthesis turns light into sugar. " * 40
+
+
+@pytest.mark.parametrize("path", ["/api/chapters", "/api/chapters/ch-0"])
+def test_chapter_reads_answer_if_none_match_with_304(client, large_library, path):
+    etag = client.get(path).headers["etag"]
+
+    response = client.get(path, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304 and response.content == b""
+    assert response.headers["etag"] == etag
+
+
+@pytest.mark.parametrize("path", ["/api/chapters", "/api/chapters/ch-0"])
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_chapter_reads_are_compressed_with_a_coding_specific_etag(client, large_library, monkeypatch, path, encoding):
+    if encoding == "br" and http_cache.brotli is None:
+        # Stands in for the optional package; without it the test client leaves br bodies as they are
+        monkeypatch.setattr(http_cache, "brotli", SimpleNamespace(compress=lambda body, quality: body))
+    identity = client.get(path, headers={"Accept-Encoding": "identity"})
+
+    response = client.get(path, headers={"Accept-Encoding": encoding})
+
+    assert response.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == identity.json()
+    assert response.headers["etag"] == coded_etag(identity.headers["etag"], encoding)
+    assert client.get(path, headers={"Accept-Encoding": encoding, "If-None-Match": response.headers["etag"]}).status_code == 304
+
+
+@pytest.mark.parametrize("path", ["/api/chapters", "/api/chapters/ch-0"])
+def test_chapter_read_etags_change_after_a_write(client, large_library, path):
+    before = client.get(path).headers["etag"]
+
+    client.put("/api/chapters/ch-0/favorite", json={"favorite": True})
+    response = client.get(path, headers={"If-None-Match": before})
+
+    assert response.status_code == 200 and response.headers["etag"] != before
+
+
+@pytest.mark.parametrize("params", [{}, {"view": "summary"}, {"fields": "title,topics"}])
+def test_ndjson_stream_matches_the_json_response_page_by_page(client, fake_sb, monkeypatch, params):
+    seed_library(fake_sb, chapters=5, topics=2)
+    # Cursors carry chapter ids, which must be UUIDs
+    ids = {row["id"]: f"00000000-0000-4000-8000-{n:012d}" for n, row in enumerate(fake_sb.tables["chapters"])}
+    for row in fake_sb.tables["chapters"]:
+        row["id"] = ids[row["id"]]
+    for row in fake_sb.tables["topics"]:
+        row["chapter_id"] = ids[row["chapter_id"]]
+    monkeypatch.setattr(server, "NDJSON_BATCH_SIZE", 2)
+    cursor = None
+    pages = 0
+    while True:
+        page = {**params, "limit": 3, **({"cursor": cursor} if cursor else {})}
+        expected = client.get("/api/chapters", params=page)
+
+        streamed = client.get("/api/chapters", params={**page, "stream": "ndjson"})
+
+        assert streamed.status_code == 200
+        assert streamed.headers["content-type"] == "application/x-ndjson"
+        lines = streamed.text.split("\n")
+        assert lines[-1] == ""
+        assert [json.loads(line) for line in lines[:-1]] == expected.json()
+        assert streamed.headers.get("x-next-cursor") == expected.headers.get("x-next-cursor")
+        pages += 1
+        cursor = streamed.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert pages == 2
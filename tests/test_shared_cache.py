@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from chapter_cache import ChapterCache
+from image_tasks import ImageStatusCache
+from shared_cache import LOOKUP_CHUNK_SIZE, SharedCache, SQLiteSharedCache
+
+
+def make_loader(calls):
+    async def load(rows):
+        calls.extend(row["id"] for row in rows)
+        return [{"id": row["id"], "version": len(calls)} for row in rows]
+    return load
+
+
+def test_store_lookup_and_expiry(tmp_path):
+    async def main():
+        shared = SQLiteSharedCache(tmp_path / "cache.sqlite3")
+        await shared.store({"a": {"x": 1}})
+        await shared.store({"b": {"x": 2}}, ttl=-1)
+        found, _ = await shared.lookup(["a", "b", "c"])
+        await shared.aclose()
+        return found
+
+    assert asyncio.run(main()) == {"a": {"x": 1}}
+
+
+def test_lookup_of_more_keys_than_sqlite_binds_at_once(tmp_path):
+    keys = [f"k{n}" for n in range(5 * LOOKUP_CHUNK_SIZE)]
+
+    async def main():
+        shared = SQLiteSharedCache(tmp_path / "cache.sqlite3")
+        await shared.store({key: n for n, key in enumerate(keys) if n % 2})
+        found, _ = await shared.lookup(keys)
+        await shared.aclose()
+        return found
+
+    found = asyncio.run(main())
+
+    assert len(found) == len(keys) // 2 and found["k1"] == 1
+
+
+def test_shared_cache_backends_must_implement_the_storage_methods():
+    class Incomplete(SharedCache):
+        async def lookup(self, keys):
+            return {}, 0
+
+    with pytest.raises(TypeError, match="invalidate"):
+        Incomplete()
+
+
+def test_store_since_skips_keys_invalidated_meanwhile(tmp_path):
+    async def main():
+        shared = SQLiteSharedCache(tmp_path / "cache.sqlite3")
+        _, position = await shared.lookup(["a", "b"])
+        await shared.invalidate(["a"])
+        stored = await shared.store({"a": 1, "b": 2}, since=position)
+        found, _ = await shared.lookup(["a", "b"])
+        await shared.aclose()
+        return stored, found
+
+    stored, found = asyncio.run(main())
+
+    assert stored == 1
+    assert found == {"b": 2}
+
+
+def test_chapter_cache_is_shared_and_invalidated_across_workers(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    calls = []
+
+    async def main():
+        # Two workers: separate connections and local tiers over one file
+        shared_a, shared_b = SQLiteSharedCache(path), SQLiteSharedCache(path)
+        await shared_a.start()
+        await shared_b.start()
+        worker_a = ChapterCache(shared=shared_a)
+        worker_b = ChapterCache(shared=shared_b)
+
+        await worker_a.get_many([{"id": "ch-1"}], make_loader(calls))
+        from_b = await worker_b.get_many([{"id": "ch-1"}], make_loader(calls))
+        assert calls == ["ch-1"] and from_b[0]["version"] == 1
+
+        await worker_a.invalidate("ch-1")
+        await shared_b.poll()
+        assert "ch-1" not in worker_b.docs
+
+        reloaded = await worker_b.get_many([{"id": "ch-1"}], make_loader(calls))
+        await shared_a.aclose()
+        await shared_b.aclose()
+        return reloaded, shared_b.stats()
+
+    reloaded, stats = asyncio.run(main())
+
+    assert reloaded[0]["version"] == 2
+    assert stats["invalidations_received"] == 1
+
+
+def test_image_status_fetched_once_across_workers(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    fetched = []
+
+    async def fetch_status(task_id):
+        fetched.append(task_id)
+        return {"task_id": task_id, "status": "completed", "image_url": "https://cdn.test/a.png"}
+
+    async def main():
+        shared_a, shared_b = SQLiteSharedCache(path), SQLiteSharedCache(path)
+        first = await ImageStatusCache(fetch_status, shared=shared_a).get("t1")
+        second = await ImageStatusCache(fetch_status, shared=shared_b).get("t1")
+        await shared_a.aclose()
+        await shared_b.aclose()
+        return first, second
+
+    first, second = asyncio.run(main())
+
+    assert first == second
+    assert fetched == ["t1"]
@@ -0,0 +1,172 @@
+import asyncio
+import re
+import sqlite3
+
+import pytest
+
+import chapter_store
+from chapter_store import (
+    decode_cursor, insert_chapter_tree, insert_chapter_trees, list_chapters, load_chapter, load_chapter_trees,
+    scan_rows, sync_topic_children
+)
+from sqlite_store import SQLiteDatabase, SQLiteError, TABLES
+from supabase_client import CREATE_TABLES_SQL
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    db = SQLiteDatabase(tmp_path / "library.db", pool_size=4)
+    yield db
+    db.close()
+
+
+def _tree(n, topics=2, hotspots=2):
+    chapter = {"id": f"ch-{n:03d}", "title": f"Chapter {n}", "subject": "science", "description": None}
+    topic_docs = [
+        {"id": f"ch-{n:03d}-t{t}", "chapter_id": chapter["id"], "title": f"Topic {t}", "content": "Text",
+         "order_index": t}
+        for t in reversed(range(topics))
+    ]
+    hotspot_docs = [
+        {"id": f"{topic['id']}-h{h}", "topic_id": topic["id"], "x": 10 * h, "y": 20, "label": "L", "title": "Spot"}
+        for topic in topic_docs for h in range(hotspots)
+    ]
+    return chapter, topic_docs, hotspot_docs
+
+
+def test_schema_has_the_columns_of_create_tables_sql(sqlite_db):
+    for table in TABLES:
+        body = re.search(rf"CREATE TABLE IF NOT EXISTS {table} \((.*?)\n\);", CREATE_TABLES_SQL, re.S).group(1)
+        expected = [line.split()[0] for line in body.strip().splitlines()]
+        assert list(sqlite_db.columns[table]) == expected
+
+
+def test_database_is_in_wal_mode_with_foreign_keys(sqlite_db):
+    conn = sqlite_db.connection()
+
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+
+def test_chapter_tree_round_trip_through_chapter_store(sqlite_db, monkeypatch):
+    monkeypatch.setattr(chapter_store, "_chapter_tree_rpc_available", True)
+    chapter, topics, hotspots = _tree(0)
+
+    async def main():
+        await insert_chapter_tree(sqlite_db, chapter, topics, hotspots)
+        await sqlite_db.execute(sqlite_db.table("annotations").insert(
+            {"id": "a1", "topic_id": topics[0]["id"], "type": "note", "x": 1, "y": 2}
+        ))
+        return await load_chapter(sqlite_db, chapter["id"]), await load_chapter(sqlite_db, "missing")
+
+    tree, missing = asyncio.run(main())
+
+    assert missing is None
+    assert tree["favorite"] is False and tree["created_at"].endswith("+00:00")
+    assert [t["order_index"] for t in tree["topics"]] == [0, 1]
+    assert [h["x"] for h in tree["topics"][0]["hotspots"]] == [0.0, 10.0]
+    assert tree["topics"][0]["hotspots"][0]["icon"] == "sparkles"
+    assert [a["id"] for a in tree["topics"][1]["annotations"]] == ["a1"]
+    assert chapter_store._chapter_tree_rpc_available is True
+
+
+def test_chapter_tree_rpc_is_all_or_nothing(sqlite_db):
+    chapter, topics, hotspots = _tree(0)
+    hotspots[-1] = {**hotspots[-1], "title": None}
+
+    with pytest.raises(sqlite3.IntegrityError):
+        sqlite_db.rpc(chapter_store.CHAPTER_TREE_RPC, {"chapter": chapter, "topics": topics, "hotspots": hotspots}).execute()
+
+    assert all(sqlite_db.table(table).select("id").execute().data == [] for table in TABLES)
+
+
+def test_unknown_function_looks_missing_to_chapter_store(sqlite_db):
+    with pytest.raises(SQLiteError) as error:
+        sqlite_db.rpc("no_such_function").execute()
+
+    assert chapter_store._is_missing_function(error.value)
+
+
+def test_unknown_columns_are_rejected(sqlite_db):
+    with pytest.raises(SQLiteError, match="column chapters.favourite does not exist"):
+        sqlite_db.table("chapters").select("id,favourite")
+    with pytest.raises(SQLiteError, match="does not exist"):
+        sqlite_db.table("chapters").insert({"id": "x", "title": "T", "subject": "s", "bogus": 1}).execute()
+
+
+def test_batched_writes_reads_and_cascades(sqlite_db):
+    trees = [_tree(n) for n in range(30)]
+
+    async def main():
+        await insert_chapter_trees(
+            sqlite_db, [t[0] for t in trees], [r for t in trees for r in t[1]], [r for t in trees for r in t[2]]
+        )
+        rows, _ = await list_chapters(sqlite_db)
+        loaded = await load_chapter_trees(sqlite_db, rows)
+        pages = [len(page) async for page in scan_rows(sqlite_db, "hotspots", "id", page_size=50)]
+        deleted = await sqlite_db.execute(sqlite_db.table("chapters").delete().in_("id", ["ch-000", "ch-001"]))
+        remaining = await sqlite_db.execute(sqlite_db.table("hotspots").select("id"))
+        return loaded, pages, deleted.data, remaining.data
+
+    loaded, pages, deleted, remaining = asyncio.run(main())
+
+    assert len(loaded) == 30 and all(len(ch["topics"]) == 2 for ch in loaded)
+    assert pages == [50, 50, 20]
+    assert sorted(row["id"] for row in deleted) == ["ch-000", "ch-001"]
+    assert len(remaining) == 120 - 8
+
+
+def test_list_chapters_keyset_pages_through_equal_timestamps(sqlite_db):
+    rows = [{"id": f"00000000-0000-4000-8000-{n:012d}", "title": "T", "subject": "s",
+             "created_at": "2026-01-01T00:00:00.000+00:00"}
+            for n in range(5)]
+    sqlite_db.table("chapters").insert(rows).execute()
+
+    async def main():
+        seen, after = [], None
+        while True:
+            page, cursor = await list_chapters(sqlite_db, columns=["title"], limit=2, after=after)
+            seen.extend(row["id"] for row in page)
+            if not cursor:
+                return seen
+            after = decode_cursor(cursor)
+
+    assert asyncio.run(main()) == [row["id"] for row in reversed(rows)]
+
+
+def test_upsert_update_and_sync_topic_children(sqlite_db):
+    chapter, topics, hotspots = _tree(0, topics=1, hotspots=3)
+    sqlite_db.rpc(chapter_store.CHAPTER_TREE_RPC, {"chapter": chapter, "topics": topics, "hotspots": hotspots}).execute()
+    topic_id = topics[0]["id"]
+
+    updated = sqlite_db.table("chapters").update({"favorite": True}).eq("id", chapter["id"]).execute()
+    upserted = sqlite_db.table("chapters").upsert([{**chapter, "title": "Renamed"}], on_conflict="id").execute()
+    kept = [{**hotspots[0], "label": "Moved"}, hotspots[1]]
+    asyncio.run(sync_topic_children(sqlite_db, "hotspots", topic_id, kept))
+
+    assert updated.data[0]["favorite"] is True
+    assert upserted.data[0]["title"] == "Renamed" and upserted.data[0]["favorite"] is True
+    stored = sqlite_db.table("hotspots").select("id,label").eq("topic_id", topic_id).order("id").execute().data
+    assert stored == [{"id": hotspots[0]["id"], "label": "Moved"}, {"id": hotspots[1]["id"], "label": "L"}]
+
+
+def test_insert_generates_missing_ids_and_keeps_payload_order(sqlite_db):
+    result = sqlite_db.table("chapters").insert([
+        {"id": "b", "title": "B", "subject": "s"},
+        {"title": "No id", "subject": "s", "favorite": True},
+        {"id": "a", "title": "A", "subject": "s"}
+    ]).execute()
+
+    assert [row["title"] for row in result.data] == ["B", "No id", "A"]
+    assert len(result.data[1]["id"]) == 36
+
+
+def test_two_databases_on_one_file_see_each_others_writes(tmp_path):
+    first = SQLiteDatabase(tmp_path / "shared.db")
+    second = SQLiteDatabase(tmp_path / "shared.db")
+    try:
+        first.table("chapters").insert({"id": "c", "title": "T", "subject": "s"}).execute()
+        assert second.table("chapters").select("id").execute().data == [{"id": "c"}]
+    finally:
+        first.close()
+        second.close()
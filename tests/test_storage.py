@@ -0,0 +1,48 @@
+import pytest
+
+import storage
+from sqlite_store import SQLiteDatabase
+from supabase_client import Database
+
+
+@pytest.fixture(autouse=True)
+def reset_database(monkeypatch):
+    monkeypatch.setattr(storage, "database", None)
+    yield
+    if storage.database is not None:
+        storage.database.close()
+
+
+def test_get_database_defaults_to_supabase(monkeypatch):
+    monkeypatch.delenv("STORAGE_BACKEND", raising=False)
+
+    db = storage.get_database()
+
+    assert isinstance(db, Database)
+    assert storage.get_database() is db
+
+
+def test_get_database_opens_sqlite(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_BACKEND", "SQLite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "data" / "library.db"))
+
+    db = storage.get_database()
+
+    assert isinstance(db, SQLiteDatabase)
+    assert (tmp_path / "data" / "library.db").exists()
+
+
+def test_get_database_rejects_unknown_backends(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "mongodb")
+
+    with pytest.raises(ValueError, match="Unknown STORAGE_BACKEND"):
+        storage.get_database()
+
+
+def test_backends_must_implement_table_and_rpc():
+    class TablesOnly(storage.StorageBackend):
+        def table(self, name):
+            return None
+
+    with pytest.raises(TypeError, match="rpc"):
+        TablesOnly()
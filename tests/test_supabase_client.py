@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+from supabase_client import Database
+
+
+class SlowQuery:
+    def __init__(self, delay, tracker):
+        self.delay = delay
+        self.tracker = tracker
+
+    def execute(self):
+        with self.tracker["lock"]:
+            self.tracker["active"] += 1
+            self.tracker["peak"] = max(self.tracker["peak"], self.tracker["active"])
+        time.sleep(self.delay)
+        with self.tracker["lock"]:
+            self.tracker["active"] -= 1
+        return threading.current_thread().name
+
+
+def _tracker():
+    return {"lock": threading.Lock(), "active": 0, "peak": 0}
+
+
+def test_execute_runs_off_the_event_loop():
+    db = Database(client=object(), pool_size=4)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        thread_name = await db.execute(SlowQuery(0.2, _tracker()))
+        task.cancel()
+        return thread_name, ticks
+
+    thread_name, ticks = asyncio.run(main())
+    db.close()
+
+    assert thread_name.startswith("supabase")
+    assert ticks >= 5
+
+
+def test_pool_size_bounds_concurrency():
+    db = Database(client=object(), pool_size=2)
+    tracker = _tracker()
+
+    async def main():
+        await asyncio.gather(*(db.execute(SlowQuery(0.05, tracker)) for _ in range(6)))
+
+    asyncio.run(main())
+    db.close()
+
+    assert tracker["peak"] == 2
+
+
+def test_describe_reads_table_and_operation_from_postgrest_builders():
+    from supabase import create_client
+
+    client = create_client("http://localhost:54321", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.c2ln")
+    db = Database(client=client, pool_size=1)
+
+    try:
+        assert db.describe(db.table("chapters").select("*").eq("id", "c")) == ("chapters", "select")
+        assert db.describe(db.table("topics").insert({"id": "t"})) == ("topics", "insert")
+        assert db.describe(db.table("topics").upsert({"id": "t"}, on_conflict="id")) == ("topics", "upsert")
+        assert db.describe(db.table("hotspots").update({"x": 1}).eq("id", "h")) == ("hotspots", "update")
+        assert db.describe(db.table("annotations").delete().eq("id", "a")) == ("annotations", "delete")
+        assert db.describe(db.rpc("create_chapter_tree", {})) == ("create_chapter_tree", "rpc")
+    finally:
+        db.close()